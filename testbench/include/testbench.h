@@ -16,14 +16,18 @@
 
 #pragma once
 
+#include <cstdio>
+#include <cstring>
 #include <iomanip>
 #include <iostream>
 #include <stdint.h>
 #include <string>
 #include <string_view>
 #include <type_traits>
+#include <unordered_map>
 
 #include "verilated.h"
+#include "verilated_save.h"
 #include "verilated_vcd_c.h"
 
 #include "colors.h"
@@ -53,6 +57,26 @@ static const std::string HEADER = std::string(
     "============================================================================================="
     "====================");
 
+// Buffer size of the binary results stream
+constexpr size_t RESULTS_BUFFER = 1 << 20;
+
+/**
+ *  @brief  Record of the binary results stream (+results=FILE), one per check, read by
+ *          utils/results.py. The cases and checks names are only written once, into the
+ *          FILE.names sidecar ("case <id> <name>" and "check <id> <name>" lines).
+ */
+struct TestbenchRecord
+{
+    uint64_t sim_time;
+    uint64_t cycle;
+    uint32_t case_id;
+    uint16_t check_id;
+    uint8_t failed;
+    uint8_t reserved;
+};
+
+static_assert(sizeof(TestbenchRecord) == 24, "The results records are read with a fixed size");
+
 /*
  * ===========================================================================================
  * HELPER CLASS
@@ -95,7 +119,7 @@ template <typename Enum> class EnumRange
 
 // ---------------- Optional: generic get_name overload template ----------------
 // Fallback for unknown enums
-template <typename Enum> constexpr std::string get_name(Enum)
+template <typename Enum> constexpr std::string_view get_name(Enum)
 {
     return "UNKNOWN";
 }
@@ -137,6 +161,12 @@ template <typename Enum> constexpr std::string get_name(Enum)
  *
  *                       tb.check_equality(&tb.dut->busy, 0, "busy");
  *
+ *          Two plusargs are handled, for the testbenchs running a lot of checks :
+ *
+ *              +results=FILE   Write a record per check into FILE (see TestbenchRecord), to be
+ *                              aggregated by utils/results.py rather than parsing the console.
+ *              +quiet          Don't print the passed checks, only the failed ones.
+ *
  *          And, if the testbench need some clocks cycles. Different options to performa single edge
  * (stick), a whole period (tick) or until a condition is valid (run_until).
  *
@@ -155,6 +185,7 @@ template <typename Enum> constexpr std::string get_name(Enum)
  *              #define _GENERATED_COMMANDS_H
  *
  *              #include <cstdint>
+ *              #include <string_view>
  *
  *              typedef enum {
  *                  c_ADD                = 0x00000000,
@@ -164,7 +195,7 @@ template <typename Enum> constexpr std::string get_name(Enum)
  *                  c_NONE               = 0x00000024
  *              } alu_commands_t;
  *
- *              static const std::string __alu_commands_t_names[37] = {
+ *              constexpr std::string_view __alu_commands_t_keys[37] = {
  *                  "ADD",
  *                  "SUB",
  *                  ...
@@ -172,10 +203,12 @@ template <typename Enum> constexpr std::string get_name(Enum)
  *                  "NONE"
  *              };
  *
- *              inline const std::string get_name(alu_commands_t op)
- *              {
- *                  return __alu_commands_t_names[static_cast<int>(op)];
- *              }
+ *              // Range-checked, returns "UNKNOWN" for the values out of the enum (which may
+ *              // be sparse : the names are then found by dichotomy)
+ *              inline constexpr std::string_view get_name(alu_commands_t op);
+ *
+ *              // Perfect hash lookup of a name, returns false if it isn't part of the enum
+ *              inline constexpr bool get_value(std::string_view text, alu_commands_t &op);
  *
  *              #endif // _GENERATED_COMMANDS_H
  *
@@ -238,6 +271,12 @@ template <class MODULE> class Testbench
     {
         final_print();
 
+        if (this->results != nullptr)
+        {
+            std::fclose(this->results);
+            std::fclose(this->names);
+        }
+
         this->tfp->close();
         delete this->dut;
         delete this->tfp;
@@ -322,6 +361,52 @@ template <class MODULE> class Testbench
         return;
     }
 
+    /**
+     *  @brief  Save the simulation state (the DUT and the simulation time) into a checkpoint file.
+     *          The DUT shall be verilated with --savable.
+     *
+     *  @param  path    The checkpoint file.
+     *
+     *  @return false if the file couldn't be opened.
+     */
+    bool save(const std::string &path)
+    {
+        VerilatedSave os;
+        os.open(path.c_str());
+        if (!os.isOpen())
+        {
+            return false;
+        }
+
+        os << this->sim_time;
+        os << *this->dut;
+        os.close();
+        return true;
+    }
+
+    /**
+     *  @brief  Restore a simulation state saved by save(), in place of a reset. The DUT shall be
+     *          the very same model as the one which saved it.
+     *
+     *  @param  path    The checkpoint file.
+     *
+     *  @return false if the file couldn't be opened.
+     */
+    bool restore(const std::string &path)
+    {
+        VerilatedRestore os;
+        os.open(path.c_str());
+        if (!os.isOpen())
+        {
+            return false;
+        }
+
+        os >> this->sim_time;
+        os >> *this->dut;
+        os.close();
+        return true;
+    }
+
     /**
      *  @brief  Perform the clear of the module.
      *
@@ -572,18 +657,27 @@ template <class MODULE> class Testbench
     template <typename TYPE1>
     int check_equality(TYPE1 signal, TYPE1 reference, std::string testname, bool print = true)
     {
+        bool passed = (signal == reference);
+        this->record(testname, passed);
+
+        // The passed checks are the most common, only format them if printed
+        if (passed && (!print || this->quiet))
+        {
+            this->pass += 1;
+            return 0;
+        }
+
         std::string tname = this->center_text(testname, NAME_WIDTH, NAME_FILL);
         std::string ttime =
             this->center_text(this->get_time(this->sim_time), TIME_WIDTH, TIME_FILL);
         std::string tcycle =
             this->center_text(std::to_string(this->cycle_count), NAME_WIDTH, NAME_FILL);
 
-        if (signal == reference)
+        if (passed)
         {
-            if (print)
-                std::cout << KGRN << "[" << this->center_text("PASS", NAME_WIDTH, NAME_FILL)
-                          << "] Cycle " << tcycle << "    [ " << tname << " ] @ " << ttime << RST
-                          << std::dec << std::endl;
+            std::cout << KGRN << "[" << this->center_text("PASS", NAME_WIDTH, NAME_FILL)
+                      << "] Cycle " << tcycle << "    [ " << tname << " ] @ " << ttime << RST
+                      << std::dec << std::endl;
             this->pass += 1;
         }
         else
@@ -615,6 +709,8 @@ template <class MODULE> class Testbench
     template <typename TYPE1>
     int check_equality_arg(TYPE1 signal, TYPE1 reference, std::string testname, bool print = true)
     {
+        this->record(testname, signal == reference);
+
         if (signal == reference)
         {
             this->pass += 1;
@@ -661,13 +757,14 @@ template <class MODULE> class Testbench
                   << HEADER << RST << std::endl;
 
         this->actual_case = cases;
+        this->case_id = this->intern(this->case_ids, "case", cases);
         return 0;
     }
 
     /**
      * @brief   Function to set the current case from an iterate name value
      */
-    template <typename Enum> void set_case_enum(Enum op) { set_case(get_name(op)); }
+    template <typename Enum> void set_case_enum(Enum op) { set_case(std::string(get_name(op))); }
 
     /**
      * @brief   Similar overload, but with some additional text to be added before
@@ -675,7 +772,8 @@ template <class MODULE> class Testbench
      */
     template <typename Enum> void set_case_enum(std::string text, Enum op)
     {
-        std::string out = text + " " + get_name(op);
+        std::string out = text + " ";
+        out.append(get_name(op));
         set_case(out);
     }
 
@@ -842,6 +940,14 @@ template <class MODULE> class Testbench
     uint64_t fail;
     std::string actual_case;
 
+    // Binary results stream (+results=FILE), and the ids of the names already written
+    FILE *results;
+    FILE *names;
+    bool quiet;
+    uint32_t case_id;
+    std::unordered_map<std::string, uint32_t> case_ids;
+    std::unordered_map<std::string, uint32_t> check_ids;
+
     uint64_t enabled_counters[16];
     uint64_t perf_counters[16];
 
@@ -861,6 +967,27 @@ template <class MODULE> class Testbench
         this->fail = 0;
         this->actual_case = std::string("default");
 
+        // Opening the results stream, if requested
+        this->results = nullptr;
+        this->names = nullptr;
+        this->quiet = Verilated::commandArgsPlusMatch("quiet")[0] != '\0';
+
+        const char *match = Verilated::commandArgsPlusMatch("results=");
+        if (match[0] != '\0')
+        {
+            std::string path = std::string(match + std::strlen("+results="));
+            this->results = std::fopen(path.c_str(), "wb");
+            this->names = std::fopen((path + ".names").c_str(), "w");
+
+            if ((this->results == nullptr) || (this->names == nullptr))
+            {
+                std::cerr << "Unable to open the results file " << path << std::endl;
+                std::exit(1);
+            }
+            std::setvbuf(this->results, nullptr, _IOFBF, RESULTS_BUFFER);
+        }
+        this->case_id = this->intern(this->case_ids, "case", this->actual_case);
+
         // Initializing performance counters
         for (int k = 0; k < 16; k++)
         {
@@ -888,6 +1015,50 @@ template <class MODULE> class Testbench
         return;
     }
 
+    /**
+     *  @brief  [PRIVATE] Return the id of a case or check name. New names are given the next id,
+     *          and written into the names sidecar of the results stream.
+     */
+    uint32_t intern(std::unordered_map<std::string, uint32_t> &ids, const char *kind,
+                    const std::string &name)
+    {
+        auto found = ids.find(name);
+        if (found != ids.end())
+        {
+            return found->second;
+        }
+
+        uint32_t id = ids.size();
+        ids.emplace(name, id);
+
+        if (this->names != nullptr)
+        {
+            std::fprintf(this->names, "%s %u %s\n", kind, id, name.c_str());
+            std::fflush(this->names);
+        }
+        return id;
+    }
+
+    /**
+     *  @brief  [PRIVATE] Append the result of a check to the results stream, if opened.
+     */
+    void record(const std::string &check, bool passed)
+    {
+        if (this->results == nullptr)
+        {
+            return;
+        }
+
+        TestbenchRecord record = {
+            this->sim_time,
+            this->cycle_count,
+            this->case_id,
+            static_cast<uint16_t>(this->intern(this->check_ids, "check", check)),
+            static_cast<uint8_t>(!passed),
+            0};
+        std::fwrite(&record, sizeof(record), 1, this->results);
+    }
+
     /**
      *  @brief  [PRIVATE] Helper function to center some text into a define width
      */
@@ -0,0 +1,325 @@
+/**
+ * @file    testbench/include/vectors.h
+ *
+ * @author  l.heywang <leonard.heywang@proton.me>
+ * @date    18/10/2026
+ *
+ * @brief   File-driven test vectors of the arithmetic units (booth, SRT and shift), generated by
+ * utils/vectors.py, and the binary mismatches file summarized by it.
+ */
+
+/*
+ * ===========================================================================================
+ * INCLUDES
+ * ===========================================================================================
+ */
+
+#pragma once
+
+#include <algorithm>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <iostream>
+#include <stdint.h>
+#include <string>
+#include <vector>
+
+#include "verilated.h"
+
+/*
+ * ===========================================================================================
+ * PARAMETERS
+ * ===========================================================================================
+ */
+
+// "RVTV", as read from the start of the files
+constexpr char VECTORS_MAGIC[4] = {'R', 'V', 'T', 'V'};
+constexpr uint16_t VECTORS_VERSION = 1;
+
+// Number of vectors read from the file at once
+constexpr size_t VECTORS_CHUNK = 1 << 16;
+
+// Units of the vectors files
+enum VectorUnit : uint16_t
+{
+    VECTORS_BOOTH = 0,
+    VECTORS_SRT = 1,
+    VECTORS_SHIFT = 2,
+};
+
+// Bits of MismatchRecord::fields, the results which differ
+constexpr uint16_t MISMATCH_RESULT0 = 1 << 0;
+constexpr uint16_t MISMATCH_RESULT1 = 1 << 1;
+constexpr uint16_t MISMATCH_RESULT2 = 1 << 2;
+constexpr uint16_t MISMATCH_LATENCY = 1 << 3;
+
+/**
+ *  @brief  Header of the vectors and mismatches files. The count of a mismatches file is written
+ *          when it's closed.
+ */
+struct VectorHeader
+{
+    char magic[4];
+    uint16_t version;
+    uint16_t unit;
+    uint64_t count;
+};
+
+/**
+ *  @brief  A vector : the operands, the mode of the unit, and its expected results.
+ *
+ *          booth   mode = X_signed | Y_signed << 1, results = low and high words of Z
+ *          srt     mode = dividend_signed | divisor_signed << 1, results = quotient, remainder
+ *                  and div_by_zero
+ *          shift   mode = arithmetic | shift_left << 1, b = shift amount, result = data_out
+ */
+struct VectorRecord
+{
+    uint32_t a;
+    uint32_t b;
+    uint16_t mode;
+    uint16_t reserved;
+    uint32_t expected[3];
+};
+
+/**
+ *  @brief  A failed vector : its index into the vectors file, the vector, the results of the
+ *          unit, and its latency (cycles until valid).
+ */
+struct MismatchRecord
+{
+    uint64_t index;
+    uint32_t a;
+    uint32_t b;
+    uint16_t mode;
+    uint16_t fields;
+    uint32_t expected[3];
+    uint32_t got[3];
+    uint32_t cycles;
+};
+
+static_assert(sizeof(VectorHeader) == 16, "The vectors files are read with a fixed size");
+static_assert(sizeof(VectorRecord) == 24, "The vectors are read with a fixed size");
+static_assert(sizeof(MismatchRecord) == 48, "The mismatches are read with a fixed size");
+
+/*
+ * ===========================================================================================
+ * MAIN CLASS
+ * ===========================================================================================
+ */
+
+/**
+ *  @class  VectorStream
+ *
+ *  @brief  Stream the vectors of a file through a testbench, and write the failed ones.
+ *
+ *  @details
+ *          Two plusargs are handled :
+ *
+ *              +vectors=FILE       The vectors file (utils/vectors.py generate), of the unit.
+ *              +mismatches=FILE    Write a MismatchRecord per failed vector into FILE, to be
+ *                                  summarized by utils/vectors.py summary.
+ *
+ *          Usage, when the stream is enabled (+vectors passed) :
+ *
+ *                      VectorStream vectors(VECTORS_BOOTH);
+ *                      VectorRecord vector;
+ *
+ *                      while (vectors.next(vector))
+ *                      {
+ *                          ...
+ *                          vectors.check(vector, got, 2, cycles, latency);
+ *                      }
+ *
+ *                      tb.check_equality(vectors.get_failed(), (uint64_t)0, "Vectors");
+ */
+class VectorStream
+{
+  public:
+    /**
+     *  @brief  Open the vectors file (if +vectors is passed), and the mismatches one.
+     *
+     *  @param  unit    The unit of the testbench, which shall match the one of the file.
+     */
+    VectorStream(VectorUnit unit)
+    {
+        this->unit = unit;
+        this->vectors = nullptr;
+        this->mismatches = nullptr;
+        this->count = 0;
+        this->index = 0;
+        this->failed = 0;
+        this->position = 0;
+
+        const char *match = Verilated::commandArgsPlusMatch("vectors=");
+        if (match[0] == '\0')
+        {
+            return;
+        }
+
+        std::string path = std::string(match + std::strlen("+vectors="));
+        this->vectors = std::fopen(path.c_str(), "rb");
+
+        VectorHeader header;
+        if ((this->vectors == nullptr) ||
+            (std::fread(&header, sizeof(header), 1, this->vectors) != 1) ||
+            (std::memcmp(header.magic, VECTORS_MAGIC, sizeof(VECTORS_MAGIC)) != 0) ||
+            (header.version != VECTORS_VERSION))
+        {
+            std::cerr << "Unable to read the vectors file " << path << std::endl;
+            std::exit(1);
+        }
+        if (header.unit != unit)
+        {
+            std::cerr << "The vectors file " << path << " targets another unit (" << header.unit
+                      << ")" << std::endl;
+            std::exit(1);
+        }
+        this->count = header.count;
+
+        match = Verilated::commandArgsPlusMatch("mismatches=");
+        if (match[0] != '\0')
+        {
+            path = std::string(match + std::strlen("+mismatches="));
+            this->mismatches = std::fopen(path.c_str(), "wb");
+            if (this->mismatches == nullptr)
+            {
+                std::cerr << "Unable to open the mismatches file " << path << std::endl;
+                std::exit(1);
+            }
+
+            // The count is only known at the end, see the destructor
+            header.count = 0;
+            std::fwrite(&header, sizeof(header), 1, this->mismatches);
+        }
+        return;
+    }
+
+    /**
+     *  @brief  Close the files, writing the mismatches count into its header.
+     */
+    ~VectorStream()
+    {
+        if (this->mismatches != nullptr)
+        {
+            VectorHeader header;
+            std::memcpy(header.magic, VECTORS_MAGIC, sizeof(VECTORS_MAGIC));
+            header.version = VECTORS_VERSION;
+            header.unit = this->unit;
+            header.count = this->failed;
+
+            std::fseek(this->mismatches, 0, SEEK_SET);
+            std::fwrite(&header, sizeof(header), 1, this->mismatches);
+            std::fclose(this->mismatches);
+        }
+
+        if (this->vectors != nullptr)
+        {
+            std::fclose(this->vectors);
+        }
+        return;
+    }
+
+    /**
+     *  @brief  Was a vectors file passed ? The testbench runs its own inputs otherwise.
+     */
+    bool enabled() const { return this->vectors != nullptr; }
+
+    /**
+     *  @brief  Read the next vector.
+     *
+     *  @return False once all of them were read (or the file is truncated).
+     */
+    bool next(VectorRecord &vector)
+    {
+        if (this->index == this->count)
+        {
+            return false;
+        }
+
+        if (this->position == this->buffer.size())
+        {
+            this->buffer.resize(std::min<uint64_t>(VECTORS_CHUNK, this->count - this->index));
+            this->buffer.resize(std::fread(this->buffer.data(), sizeof(VectorRecord),
+                                           this->buffer.size(), this->vectors));
+            this->position = 0;
+
+            if (this->buffer.empty())
+            {
+                return false;
+            }
+        }
+
+        vector = this->buffer[this->position];
+        this->position += 1;
+        this->index += 1;
+        return true;
+    }
+
+    /**
+     *  @brief  Compare the results of the unit to the expected ones, and record the vector if they
+     *          differ.
+     *
+     *  @param  vector          The vector, as returned by next.
+     *  @param  got             The results of the unit (only the used ones matter).
+     *  @param  used            Number of results of the unit (1 to 3).
+     *  @param  cycles          The cycles the unit took.
+     *  @param  latency         The expected cycles (0 to not check them).
+     *
+     *  @return True if the vector passed.
+     */
+    bool check(const VectorRecord &vector, const uint32_t got[3], int used, uint32_t cycles,
+               uint32_t latency = 0)
+    {
+        uint16_t fields = 0;
+        for (int k = 0; k < used; k++)
+        {
+            if (got[k] != vector.expected[k])
+            {
+                fields |= (MISMATCH_RESULT0 << k);
+            }
+        }
+        if ((latency != 0) && (cycles != latency))
+        {
+            fields |= MISMATCH_LATENCY;
+        }
+
+        if (fields == 0)
+        {
+            return true;
+        }
+
+        this->failed += 1;
+        if (this->mismatches != nullptr)
+        {
+            MismatchRecord record = {this->index - 1,
+                                     vector.a,
+                                     vector.b,
+                                     vector.mode,
+                                     fields,
+                                     {vector.expected[0], vector.expected[1], vector.expected[2]},
+                                     {got[0], got[1], got[2]},
+                                     cycles};
+            std::fwrite(&record, sizeof(record), 1, this->mismatches);
+        }
+        return false;
+    }
+
+    uint64_t get_count() const { return this->count; }
+    uint64_t get_failed() const { return this->failed; }
+
+  private:
+    VectorUnit unit;
+    FILE *vectors;
+    FILE *mismatches;
+
+    // Vectors of the file, already read, and the failed ones
+    uint64_t count;
+    uint64_t index;
+    uint64_t failed;
+
+    // Chunk of vectors read from the file
+    std::vector<VectorRecord> buffer;
+    size_t position;
+};
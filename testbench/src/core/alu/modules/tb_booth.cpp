@@ -2,19 +2,61 @@
 #include "verilated.h"
 
 #include "testbench.h"
+#include "vectors.h"
 
 unsigned int input1[10] = {10, 100, 1000, 0xFFFFFFFF, 0, 8, 2, 17, 29, 33};
 unsigned int input2[10] = {3, 5, 7, 9, 22, 0xFFFFFFFF, 21, 37, 49, 11345678};
 
+/**
+ *  @brief  Stream the vectors of +vectors=FILE through the multiplier, the low and high words of
+ *          each product being compared (MUL, MULH, MULHSU and MULHU).
+ */
+void run_vectors(Testbench<Vbooth> &tb, VectorStream &vectors)
+{
+    tb.set_case("Vectors");
+
+    VectorRecord vector;
+    while (vectors.next(vector))
+    {
+        tb.dut->X_signed = vector.mode & 1;
+        tb.dut->Y_signed = (vector.mode >> 1) & 1;
+        tb.dut->X = vector.a;
+        tb.dut->Y = vector.b;
+
+        tb.tick();
+        tb.dut->start = 1;
+        tb.tick();
+        tb.dut->start = 0;
+
+        uint32_t cycles = tb.run_until(&tb.dut->valid, 1);
+
+        uint32_t got[3] = {(uint32_t)tb.dut->Z, (uint32_t)(tb.dut->Z >> 32), 0};
+        vectors.check(vector, got, 2, cycles);
+
+        tb.tick();
+        tb.increment_cycles();
+    }
+
+    tb.check_equality(vectors.get_failed(), (uint64_t)0, "Vectors");
+    return;
+}
+
 // Main
 int main(int argc, char **argv)
 {
     Verilated::commandArgs(argc, argv);
     Testbench<Vbooth> tb("Booth-Multiplier");
+    VectorStream vectors(VECTORS_BOOTH);
     tb.reset();
 
     tb.tick();
 
+    if (vectors.enabled())
+    {
+        run_vectors(tb, vectors);
+        return tb.get_return();
+    }
+
     for (int op = 0; op < 4; op++)
     {
         switch (op)
@@ -2,17 +2,56 @@
 #include "verilated.h"
 
 #include "testbench.h"
+#include "vectors.h"
 
 unsigned int input[20] = {10, 100, 1000,      0xFFFFFFFF, 0,         8,  2,   17,  29,  33,
                           59, 87,  453610452, 452135,     125245454, 47, 123, 789, 456, 20};
 
+/**
+ *  @brief  Stream the vectors of +vectors=FILE through the shifter (SLL, SRL and SRA).
+ */
+void run_vectors(Testbench<Vshift> &tb, VectorStream &vectors)
+{
+    tb.set_case("Vectors");
+
+    VectorRecord vector;
+    while (vectors.next(vector))
+    {
+        tb.dut->arithmetic = vector.mode & 1;
+        tb.dut->shift_left = (vector.mode >> 1) & 1;
+        tb.dut->data_in = vector.a;
+        tb.dut->shift_amount = vector.b;
+
+        tb.dut->start = 1;
+        tb.tick();
+        tb.dut->start = 0;
+
+        uint32_t cycles = tb.run_until(&tb.dut->done, 1);
+
+        uint32_t got[3] = {(uint32_t)tb.dut->data_out, 0, 0};
+        vectors.check(vector, got, 1, cycles);
+
+        tb.increment_cycles();
+    }
+
+    tb.check_equality(vectors.get_failed(), (uint64_t)0, "Vectors");
+    return;
+}
+
 // Main
 int main(int argc, char **argv)
 {
     Verilated::commandArgs(argc, argv);
     Testbench<Vshift> tb("Shifter");
+    VectorStream vectors(VECTORS_SHIFT);
     tb.reset();
 
+    if (vectors.enabled())
+    {
+        run_vectors(tb, vectors);
+        return tb.get_return();
+    }
+
     for (int op = 0; op < 3; op++)
     {
         // select shift mode
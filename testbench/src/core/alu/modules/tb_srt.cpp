@@ -2,6 +2,7 @@
 #include "verilated.h"
 
 #include "testbench.h"
+#include "vectors.h"
 
 unsigned int input1[20] = {10, 100, 1000,      0xFFFFFFFF, 0,         8,  2,   17,  29,  33,
                            59, 87,  453610452, 452135,     125245454, 47, 123, 789, 456, 20};
@@ -9,13 +10,59 @@ unsigned int input2[20] = {3,   5,   7,        9,          22,         0xFFFFFFF
                            37,  49,  11345678, 0xAAAAAAAA, 0x55555555, 456,        123,
                            789, 741, 852,      963,        0,          123};
 
+// Cycles until valid, of a division and of a division by zero
+constexpr uint32_t DIV_CYCLES = 69;
+constexpr uint32_t DIV_BY_ZERO_CYCLES = 2;
+
+/**
+ *  @brief  Stream the vectors of +vectors=FILE through the divider, the quotient, remainder,
+ *          division by zero flag and latency being compared (DIV, DIVU, REM and REMU).
+ */
+void run_vectors(Testbench<Vsrt> &tb, VectorStream &vectors)
+{
+    tb.set_case("Vectors");
+
+    VectorRecord vector;
+    while (vectors.next(vector))
+    {
+        tb.dut->dividend_signed = vector.mode & 1;
+        tb.dut->divisor_signed = (vector.mode >> 1) & 1;
+        tb.dut->dividend = vector.a;
+        tb.dut->divisor = vector.b;
+
+        tb.tick();
+        tb.dut->start = 1;
+        tb.tick();
+        tb.dut->start = 0;
+
+        uint32_t cycles = tb.run_until(&tb.dut->valid, 1);
+
+        uint32_t got[3] = {(uint32_t)tb.dut->quotient, (uint32_t)tb.dut->remainder,
+                           (uint32_t)tb.dut->div_by_zero};
+        vectors.check(vector, got, 3, cycles, vector.b == 0 ? DIV_BY_ZERO_CYCLES : DIV_CYCLES);
+
+        tb.tick();
+        tb.increment_cycles();
+    }
+
+    tb.check_equality(vectors.get_failed(), (uint64_t)0, "Vectors");
+    return;
+}
+
 // Main
 int main(int argc, char **argv)
 {
     Verilated::commandArgs(argc, argv);
     Testbench<Vsrt> tb("SRT");
+    VectorStream vectors(VECTORS_SRT);
     tb.reset();
 
+    if (vectors.enabled())
+    {
+        run_vectors(tb, vectors);
+        return tb.get_return();
+    }
+
     for (int op = 0; op < 2; op++)
     {
         switch (op)
@@ -51,7 +98,7 @@ int main(int argc, char **argv)
 
                 if (tb.dut->divisor == 0)
                 {
-                    tb.check_equality(count, 2, "Cycle count");
+                    tb.check_equality(count, (int)DIV_BY_ZERO_CYCLES, "Cycle count");
 
                     tb.check_equality((unsigned int)tb.dut->div_by_zero, (unsigned int)1,
                                       "Div By Zero");
@@ -62,7 +109,7 @@ int main(int argc, char **argv)
                 }
                 else
                 {
-                    tb.check_equality(count, 69, "Cycle count");
+                    tb.check_equality(count, (int)DIV_CYCLES, "Cycle count");
 
                     tb.check_equality((unsigned int)tb.dut->div_by_zero, (unsigned int)0,
                                       "Div By Zero");
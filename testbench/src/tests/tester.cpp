@@ -1,16 +1,320 @@
 #include "Vrv32.h" // Generated by Verilator
+#include "Vrv32___024root.h"
 #include "verilated.h"
 
 #include "testbench.h"
 
+#include <cstdio>
+#include <cstdlib>
+#include <map>
+#include <vector>
+
+// Default number of simulated cycles, may be overriden with +cycles=N
+constexpr int DEFAULT_CYCLES = 1000;
+
+// Boot end of the checkpoints, when no +boot_end=ADDR is passed : the first memory access
+constexpr uint64_t FIRST_ACCESS = ~0ull;
+
+/**
+ *  @brief  Fetch an integer plusarg (+name=value) from the command line.
+ */
+static uint64_t plusarg(const char *name, uint64_t fallback)
+{
+    std::string prefix = std::string(name) + "=";
+    const char *match = Verilated::commandArgsPlusMatch(prefix.c_str());
+
+    if ((match == nullptr) || (match[0] == '\0'))
+    {
+        return fallback;
+    }
+
+    return std::strtoull(match + prefix.size() + 1, nullptr, 0);
+}
+
+/**
+ *  @brief  Fetch a string plusarg (+name=value) from the command line, empty if not passed.
+ */
+static std::string plusarg_string(const char *name)
+{
+    std::string prefix = std::string(name) + "=";
+    const char *match = Verilated::commandArgsPlusMatch(prefix.c_str());
+
+    if ((match == nullptr) || (match[0] == '\0'))
+    {
+        return std::string();
+    }
+
+    return std::string(match + prefix.size() + 1);
+}
+
+/**
+ *  @brief  Append the architectural writes of the current cycle to the commit trace, in the
+ *          utils/tracediff.py format : the CSR write first, then the register one (the order of
+ *          iss.py, for the CSR instructions writing both). The committed instruction address
+ *          isn't known here.
+ */
+static void trace_commits(Testbench<Vrv32> &tb, FILE *trace)
+{
+    auto *root = tb.dut->rootp;
+
+    // A CSR write last two cycles, it's only traced when registered by the CSR module
+    if (root->rv32__DOT__riscv__DOT__ALUS__DOT__csr_we &&
+        !root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__csr_regs__DOT__write_state)
+    {
+        std::fprintf(trace, "c %03x %08x --------\n",
+                     root->rv32__DOT__riscv__DOT__ALUS__DOT__csr_wa,
+                     root->rv32__DOT__riscv__DOT__ALUS__DOT__csr_wd);
+    }
+
+    if (root->rv32__DOT__riscv__DOT__ALUS__DOT__reg_we &&
+        (root->rv32__DOT__riscv__DOT__ALUS__DOT__reg_addr != 0))
+    {
+        std::fprintf(trace, "x %03x %08x --------\n",
+                     root->rv32__DOT__riscv__DOT__ALUS__DOT__reg_addr,
+                     root->rv32__DOT__riscv__DOT__ALUS__DOT__reg_data);
+    }
+}
+
+/**
+ *  @brief  A memory word, as written by the core : only the bytes set into the mask were written.
+ */
+struct StoredWord
+{
+    uint32_t value = 0;
+    uint32_t mask = 0;
+};
+
+/**
+ *  @brief  Record the data bus write of the current cycle, if any, merged per word address.
+ */
+static void track_stores(Testbench<Vrv32> &tb, std::map<uint32_t, StoredWord> &stores)
+{
+    auto *root = tb.dut->rootp;
+
+    if (!root->rv32__DOT__mem_we)
+    {
+        return;
+    }
+
+    uint32_t mask = 0;
+    for (int k = 0; k < 4; k++)
+    {
+        if (root->rv32__DOT__mem_byteen & (1 << k))
+        {
+            mask |= 0xFFu << (8 * k);
+        }
+    }
+
+    StoredWord &word = stores[root->rv32__DOT__mem_addr & ~3u];
+    word.value = (word.value & ~mask) | (root->rv32__DOT__mem_wdata & mask);
+    word.mask |= mask;
+}
+
+/**
+ *  @brief  Write the end-of-run state : the registers, then the memory words written by the core
+ *          (address, value and written bytes mask). Read back by utils/programs.py.
+ */
+static bool dump_state(Testbench<Vrv32> &tb, const std::map<uint32_t, StoredWord> &stores,
+                       const std::string &path)
+{
+    auto *root = tb.dut->rootp;
+
+    FILE *dump = std::fopen(path.c_str(), "w");
+    if (dump == nullptr)
+    {
+        std::perror(path.c_str());
+        return false;
+    }
+
+    for (int k = 0; k < 32; k++)
+    {
+        std::fprintf(dump, "x %02d %08x\n", k,
+                     (uint32_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__registers__DOT__regs[k]);
+    }
+
+    for (const auto &[address, word] : stores)
+    {
+        std::fprintf(dump, "m %08x %08x %08x\n", address, word.value, word.mask);
+    }
+
+    std::fclose(dump);
+    return true;
+}
+
+/**
+ *  @brief  Run from reset up to the end of the boot, and save the simulation state there. The boot
+ *          ends right before the first fetch of boot_end, or, by default, before the first memory
+ *          access : up to that point, nothing depends on the memories content, thus the
+ *          checkpoint fits any program. Read back with +restore (see utils/checkpoint.py).
+ */
+static int save_checkpoint(Testbench<Vrv32> &tb, const std::string &path, uint64_t boot_end,
+                           int cycles)
+{
+    auto *root = tb.dut->rootp;
+
+    for (int k = 0; k < cycles; k++)
+    {
+        bool reached = (boot_end == FIRST_ACCESS)
+                           ? (root->rv32__DOT__rom_rden || root->rv32__DOT__mem_req)
+                           : (root->rv32__DOT__rom_rden && (root->rv32__DOT__rom_addr == boot_end));
+
+        if (reached)
+        {
+            if (!tb.save(path))
+            {
+                std::perror(path.c_str());
+                return 1;
+            }
+
+            tb.set_info("Checkpoint saved after " + std::to_string(k) + " cycles");
+            return 0;
+        }
+
+        tb.tick();
+    }
+
+    std::fprintf(stderr, "Boot end not reached within %d cycles\n", cycles);
+    return 1;
+}
+
+/**
+ *  @brief  Load a raw memory image (little-endian words, see utils/bin2mif.py --format raw) into
+ *          a memory of the model. The words past the end of the image are cleared.
+ */
+template <typename MEMORY> static bool load_image(const std::string &path, MEMORY &memory)
+{
+    if (path.empty())
+    {
+        std::fprintf(stderr, "+restore needs the memory images (+rom=FILE and +ram=FILE)\n");
+        return false;
+    }
+
+    FILE *image = std::fopen(path.c_str(), "rb");
+    if (image == nullptr)
+    {
+        std::perror(path.c_str());
+        return false;
+    }
+
+    std::vector<uint32_t> words(memory.size(), 0);
+    std::fread(words.data(), sizeof(uint32_t), words.size(), image);
+    std::fclose(image);
+
+    for (size_t k = 0; k < words.size(); k++)
+    {
+        memory[k] = words[k];
+    }
+    return true;
+}
+
+/**
+ *  @brief  Print the performance counters of the core, as 64 bits values.
+ */
+static void print_counters(Testbench<Vrv32> &tb)
+{
+    auto *root = tb.dut->rootp;
+
+    const std::pair<const char *, uint64_t> counters[] = {
+        {"CYCLE", ((uint64_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__countH << 32) |
+                      root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__countL},
+        {"INSTR", ((uint64_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__commitH << 32) |
+                      root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__commitL},
+        {"FLUSH", ((uint64_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__flushH << 32) |
+                      root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__flushL},
+        {"WAIT", ((uint64_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__waitH << 32) |
+                     root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__waitL},
+        {"DECOD", ((uint64_t)root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__decodedH << 32) |
+                      root->rv32__DOT__riscv__DOT__ALUS__DOT__csrs__DOT__decodedL},
+    };
+
+    for (const auto &counter : counters)
+    {
+        tb.set_info(std::string("Counter ") + counter.first + " : " +
+                    std::to_string(counter.second));
+    }
+}
+
 // Main
 int main(int argc, char **argv)
 {
     Verilated::commandArgs(argc, argv);
     Testbench<Vrv32> tb("Run_case");
-    tb.reset();
+    auto *root = tb.dut->rootp;
+
+    int cycles = (int)plusarg("cycles", DEFAULT_CYCLES);
+    std::string checkpoint_file = plusarg_string("checkpoint");
+    std::string restore_file = plusarg_string("restore");
+
+    // A restored run starts at the end of the boot, with the memories of its own program
+    if (restore_file.empty())
+    {
+        tb.reset();
+    }
+    else if (!tb.restore(restore_file))
+    {
+        std::perror(restore_file.c_str());
+        return 1;
+    }
+    else if (!load_image(plusarg_string("rom"),
+                         root->rv32__DOT__ROM0__DOT__altsyncram_component__DOT__mem_data) ||
+             !load_image(plusarg_string("ram"),
+                         root->rv32__DOT__RAM0__DOT__altsyncram_component__DOT__mem_data))
+    {
+        return 1;
+    }
+
+    if (!checkpoint_file.empty())
+    {
+        return save_checkpoint(tb, checkpoint_file, plusarg("boot_end", FIRST_ACCESS), cycles);
+    }
+
+    std::string trace_file = plusarg_string("trace");
+    std::string dump_file = plusarg_string("dump");
+
+    FILE *trace = nullptr;
+    if (!trace_file.empty())
+    {
+        trace = std::fopen(trace_file.c_str(), "w");
+        if (trace == nullptr)
+        {
+            std::perror(trace_file.c_str());
+            return 1;
+        }
+    }
+
+    // The bus is only watched when needed, the plain run stays on the fast path
+    std::map<uint32_t, StoredWord> stores;
+    if ((trace == nullptr) && dump_file.empty())
+    {
+        tb.run_for(cycles);
+    }
+    else
+    {
+        for (int k = 0; k < cycles; k++)
+        {
+            if (trace != nullptr)
+            {
+                trace_commits(tb, trace);
+            }
+            if (!dump_file.empty())
+            {
+                track_stores(tb, stores);
+            }
+            tb.tick();
+        }
+    }
+
+    if (trace != nullptr)
+    {
+        std::fclose(trace);
+    }
+
+    print_counters(tb);
 
-    tb.run_for(1000);
+    if (!dump_file.empty() && !dump_state(tb, stores, dump_file))
+    {
+        return 1;
+    }
 
     return tb.get_return();
 }
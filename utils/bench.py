@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+"""
+Run the programs of tests/ on the rv32 model, and report the core throughput from its
+performance counters (cycles, retired instructions, flushes, waits and decoded instructions).
+
+Each program is built, loaded into the ROM, and run for a fixed number of cycles. The counters
+are then printed by the program runner (testbench/src/tests/tester.cpp) and parsed back here.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tomllib
+from pathlib import Path
+
+from generate_report import sanitize
+
+TESTS_DIR = Path("tests")
+BUILD_DIR = Path("build")
+
+# Counters, as printed by tester.cpp
+COUNTERS = ("CYCLE", "INSTR", "FLUSH", "WAIT", "DECOD")
+COUNTER = re.compile(r"Counter (\w+) : (\d+)")
+
+
+def discover(tests_dir=TESTS_DIR):
+    """
+    List the programs that can be built : with a test.toml, and all of its sources (a whitespace
+    separated list). Return them, and the skipped ones with the reason why (also printed).
+    """
+    programs = []
+    skipped = {}
+    for toml_file in sorted(Path(tests_dir).glob("*/test.toml"), key=natural_key):
+        with open(toml_file, "rb") as f:
+            config = tomllib.load(f).get("config", {})
+
+        sources = config.get("source", "").split()
+        missing = [source for source in sources if not (toml_file.parent / source).exists()]
+        if not sources:
+            skipped[toml_file.parent.name] = "no source declared"
+        elif missing:
+            skipped[toml_file.parent.name] = f"missing source {' '.join(missing)}"
+        else:
+            programs.append(toml_file.parent.name)
+
+    for program, reason in skipped.items():
+        print(f"⚠️ Skipping {program} : {reason}", flush=True)
+
+    return programs, skipped
+
+
+def natural_key(path):
+    """Sort test2 before test10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", str(path))]
+
+
+def run_program(program, cycles, make="make", cwd=".", make_args=(), jobserver=None):
+    """
+    Build and run a program, and return its raw counters (None if they're missing). The build
+    happens into the cwd tree, under the passed jobserver if any (see tests.py).
+    """
+
+    # The make rules only build the program and its memory images when they're missing (they
+    # don't track the program sources), thus the previous ones are always removed first
+    build_dir = Path(cwd) / BUILD_DIR
+    shutil.rmtree(build_dir / program, ignore_errors=True)
+    for image in ("rom.mif", "ram.mif"):
+        (build_dir / image).unlink(missing_ok=True)
+
+    process = subprocess.run(
+        [make, "run_case", f"TEST={program}", f"RUN_ARGS=+cycles={cycles}", *make_args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        cwd=cwd,
+        env=None if jobserver is None else jobserver.env(),
+        pass_fds=() if jobserver is None else jobserver.fds(),
+    )
+
+    counters = {}
+    for line in process.stdout.splitlines():
+        match = COUNTER.search(sanitize(line))
+        if match is not None:
+            counters[match.group(1)] = int(match.group(2))
+
+    if any(name not in counters for name in COUNTERS):
+        return None
+
+    return counters
+
+
+def metrics(counters):
+    """Derive the throughput metrics from the raw counters."""
+    cycles = counters["CYCLE"]
+    instret = counters["INSTR"]
+
+    return {
+        "cycles": cycles,
+        "instret": instret,
+        "cpi": cycles / instret if instret else None,
+        "flush_rate": counters["FLUSH"] / instret if instret else None,
+        "wait_share": counters["WAIT"] / cycles if cycles else None,
+        "decode_share": counters["DECOD"] / cycles if cycles else None,
+    }
+
+
+def compare(results, baseline, tolerance=0.0):
+    """
+    Compare the CPI of each program against a baseline. Return a list of
+    (program, baseline CPI, current CPI) for each slower program.
+    """
+    regressions = []
+    for program, current in results.items():
+        before = baseline.get(program, {}).get("cpi")
+        after = current.get("cpi")
+        if before is None or after is None:
+            continue
+
+        if after > before * (1 + tolerance):
+            regressions.append((program, before, after))
+
+    return regressions
+
+
+def fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def print_results(results, baseline=None):
+    print(
+        f"{'Program':10s} {'Cycles':>10s} {'Instret':>10s} {'CPI':>7s} "
+        f"{'Flush':>7s} {'Wait':>7s} {'Decode':>7s}"
+    )
+    for program, result in results.items():
+        if result is None:
+            print(f"{program:10s} {'No counters found, perhaps check for build errors ?':>50s}")
+            continue
+
+        line = (
+            f"{program:10s} {result['cycles']:10d} {result['instret']:10d} "
+            f"{fmt(result['cpi'], '7.3f')} {fmt(result['flush_rate'], '7.2%')} "
+            f"{fmt(result['wait_share'], '7.2%')} {fmt(result['decode_share'], '7.2%')}"
+        )
+
+        before = (baseline or {}).get(program, {}).get("cpi")
+        if before is not None and result["cpi"] is not None:
+            line += f"   ({(result['cpi'] - before) / before:+.2%} CPI)"
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the tests/ programs on the core, and report its performance counters",
+    )
+    parser.add_argument(
+        "programs",
+        nargs="*",
+        help="Programs to run (default: all of the buildable ones in tests/)",
+    )
+    parser.add_argument(
+        "-c",
+        "--cycles",
+        type=int,
+        default=1000,
+        help="Number of cycles to simulate per program (default: 1000)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to FILE")
+    parser.add_argument("-b", "--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="Relative CPI increase tolerated before flagging a program (default: 0.0)",
+    )
+    parser.add_argument("--make", default=os.environ.get("MAKE", "make"), help="Make command")
+    args = parser.parse_args()
+
+    programs = args.programs or discover()[0]
+
+    results = {}
+    for program in programs:
+        print(f"🔧 Running {program} ({args.cycles} cycles) ...", flush=True)
+        counters = run_program(program, args.cycles, args.make)
+        results[program] = None if counters is None else counters | metrics(counters)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print()
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\n📄 Results written to: {args.output}")
+
+    status = 0 if all(result is not None for result in results.values()) else 1
+
+    if baseline is not None:
+        measured = {program: result for program, result in results.items() if result is not None}
+        regressions = compare(measured, baseline, args.tolerance)
+        if regressions:
+            print(f"\nCPI regressions against {args.baseline} :")
+            for program, before, after in regressions:
+                print(f"    {program:10s} : {before:.3f} -> {after:.3f}")
+            status = 1
+        else:
+            print(f"\nNo CPI regression against {args.baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
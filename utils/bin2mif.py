@@ -1,48 +1,378 @@
 #!/usr/bin/env python3
+"""
+Convert a binary file, or an ELF executable, into Intel / Altera .mif memory images.
+The same images can also be written as $readmemh .hex files, or as raw little-endian binaries.
+
+The words are read from the input in memory order, MSB first (see to_words), and the raw images
+store them little-endian : each word of a raw image is thus byte-swapped relative to the input
+binary (unless --byte-swap). The program runner loads them as is (load_image of tester.cpp).
+
+When an ELF file is passed, the program headers are parsed and each PT_LOAD segment is
+placed directly into the ROM image (and, when requested, into the RAM image for the .data
+segments), using the memory windows defined into configs/core/instructions.toml.
+"""
+
 import argparse
+import array
+import mmap
+import struct
+import sys
+import tomllib
+from pathlib import Path
 
+import numpy as np
+
+ELF_MAGIC = b"\x7fELF"
+PT_LOAD = 1
+
+# Array typecodes used to handle a whole image as words
+WORD_TYPES = {8: "B", 16: "H", 32: "I", 64: "Q"}
+
+# Two hex digits of each byte value, to format the $readmemh images in bulk
+HEX_DIGITS = np.frombuffer(b"".join(b"%02X" % byte for byte in range(256)), np.uint8)
+HEX_DIGITS = HEX_DIGITS.reshape(256, 2)
+
+DEFAULT_CONFIG = Path(__file__).parent.parent / "configs" / "core" / "instructions.toml"
+
+
+def load_memory_map(config_file=DEFAULT_CONFIG):
+    """Return the ROM and RAM windows, as (base, max) tuples, from the instructions config."""
+    with open(config_file, "rb") as f:
+        memory = tomllib.load(f)["memory"]
+
+    rom = (memory["if_base_addr"], memory["if_max_addr"])
+    ram = (memory["ram_base_addr"], memory["ram_max_addr"])
+    return rom, ram
+
+
+def read_elf_segments(data):
+    """
+    Parse the ELF program headers, and return a list of (paddr, vaddr, memsz, view) for each
+    PT_LOAD segment. The view is a memoryview on the passed buffer, no data is copied.
+    """
+    if data[:4] != ELF_MAGIC:
+        raise ValueError("Not an ELF file")
+
+    ei_class = data[4]
+    ei_data = data[5]
+    if ei_class != 1:
+        raise ValueError("Only ELF32 files are supported")
+
+    endian = "<" if ei_data == 1 else ">"
+
+    # ELF32 header : e_phoff, then e_phentsize and e_phnum
+    (e_phoff,) = struct.unpack_from(f"{endian}I", data, 28)
+    e_phentsize, e_phnum = struct.unpack_from(f"{endian}HH", data, 42)
+
+    if e_phoff + e_phnum * e_phentsize > len(data):
+        raise ValueError("Truncated ELF file (program headers)")
+
+    headers = []
+    for index in range(e_phnum):
+        p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, _, _ = struct.unpack_from(
+            f"{endian}8I", data, e_phoff + index * e_phentsize
+        )
+
+        if p_type != PT_LOAD or p_memsz == 0:
+            continue
+
+        if p_offset + p_filesz > len(data):
+            raise ValueError(f"Truncated ELF file (segment at 0x{p_paddr:08X})")
+
+        headers.append((p_paddr, p_vaddr, p_memsz, p_offset, p_filesz))
+
+    # The views are only created once the headers are validated, to not leak them on errors.
+    view = memoryview(data)
+    return [
+        (paddr, vaddr, memsz, view[offset : offset + filesz])
+        for paddr, vaddr, memsz, offset, filesz in headers
+    ]
+
+
+def window_offset(address, window):
+    """
+    Return the offset of an address within a memory window, or None if it's outside.
+    Addresses lower than the window size are considered as already relative, since the
+    programs are linked at 0x0 (the upper address bits are ignored by the memories).
+    """
+    base, top = window
+    size = top - base + 1
+
+    if base <= address <= top:
+        return address - base
+    if address < size:
+        return address
+    return None
+
+
+def place(image, offset, chunk, name):
+    """Copy a segment into an image, and ensure it fits."""
+    if offset + len(chunk) > len(image):
+        raise ValueError(f"Segment at offset 0x{offset:X} does not fit into the {name} image")
+    image[offset : offset + len(chunk)] = chunk
 
-def bin_to_mif(bin_file, mif_file, width=32, depth=None, byte_swap=False):
-    with open(bin_file, "rb") as f:
-        data = f.read()
+
+def elf_to_images(elf_file, config_file=DEFAULT_CONFIG):
+    """
+    Load an ELF file and return the (rom, ram) images as bytearrays, sized after the config
+    memory windows. Each segment is placed at its load address into the ROM, and, if its
+    virtual address is located into the RAM window, into the RAM too (.data).
+    """
+    rom_window, ram_window = load_memory_map(config_file)
+
+    rom = bytearray(rom_window[1] - rom_window[0] + 1)
+    ram = bytearray(ram_window[1] - ram_window[0] + 1)
+
+    rom_used = 0
+    ram_used = 0
+
+    with open(elf_file, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            segments = read_elf_segments(mm)
+
+            # Every view is released, even when a segment is rejected, otherwise the mmap can't
+            # be closed (and its BufferError would replace the error)
+            try:
+                for paddr, vaddr, memsz, chunk in segments:
+                    ram_offset = None
+                    if ram_window[0] <= vaddr <= ram_window[1]:
+                        ram_offset = vaddr - ram_window[0]
+                        place(ram, ram_offset, chunk, "RAM")
+                        ram_used = max(ram_used, ram_offset + memsz)
+
+                    rom_offset = window_offset(paddr, rom_window)
+                    if rom_offset is not None:
+                        place(rom, rom_offset, chunk, "ROM")
+                        rom_used = max(rom_used, rom_offset + len(chunk))
+                    elif ram_offset is None:
+                        raise ValueError(f"Segment at 0x{paddr:08X} is outside of the memory map")
+            finally:
+                for *_, chunk in segments:
+                    chunk.release()
+
+    return rom[:rom_used], ram[:ram_used]
+
+
+def to_words(data, width=32, depth=None, byte_swap=False):
+    """
+    Convert a memory image into an array of words, in a single pass. The words values are
+    the bytes read in memory order (MSB first), or reversed if byte_swap is set.
+    """
+    if width not in WORD_TYPES:
+        raise ValueError(f"Unsupported word width : {width} (expected one of {list(WORD_TYPES)})")
 
     bytes_per_word = width // 8
     if len(data) % bytes_per_word != 0:
-        data += b"\x00" * (bytes_per_word - (len(data) % bytes_per_word))
+        data = bytes(data) + b"\x00" * (bytes_per_word - (len(data) % bytes_per_word))
+
+    words = array.array(WORD_TYPES[width])
+    words.frombytes(data)
+
+    if depth is not None and len(words) > depth:
+        raise ValueError(f"Image is {len(words)} words long, which does not fit into {depth} words")
+
+    # The native order is used by the array, thus, we swap all of the words at once if needed.
+    if (sys.byteorder == "little") != byte_swap:
+        words.byteswap()
+
+    return words
+
+
+def word_runs(words, depth):
+    """
+    Return the (start, stop, value) of each run of identical words, and of the zeroed tail. The
+    runs boundaries are found on the whole array at once, only their heads are converted.
+    """
+    values = np.asarray(words)
+    starts = np.flatnonzero(np.diff(values)) + 1
+    starts = np.concatenate(([0], starts)) if len(values) else starts
+    stops = np.append(starts[1:], len(values)) - 1
+
+    runs = list(zip(starts.tolist(), stops.tolist(), values[starts].tolist()))
+    if len(values) < depth:
+        runs.append((len(values), depth - 1, 0))
+
+    return runs
+
+
+def mif_content(words, width, depth):
+    """Return the MIF text, where any run of identical words is collapsed into a range."""
+    digits = width // 4
+    lines = [
+        f"WIDTH={width};",
+        f"DEPTH={depth};",
+        "",
+        "ADDRESS_RADIX=HEX;",
+        "DATA_RADIX=HEX;",
+        "",
+        "CONTENT BEGIN",
+    ]
+
+    # Merging the zeroed tail with a trailing zeroed run
+    runs = word_runs(words, depth)
+    if len(runs) > 1 and runs[-1][2] == 0 and runs[-2][2] == 0:
+        runs[-2:] = [(runs[-2][0], runs[-1][1], 0)]
+
+    for start, stop, value in runs:
+        if start == stop:
+            lines.append(f"    {start:04X} : {value:0{digits}X};")
+        else:
+            lines.append(f"    [{start:04X}..{stop:04X}] : {value:0{digits}X};")
+
+    lines.append("END;\n")
+    return "\n".join(lines)
+
+
+def hex_content(words, width, depth):
+    """
+    Return the $readmemh text, one word per line, padded with zeros up to the depth. The whole
+    image is converted at once : each byte (MSB first) indexes its two hex digits.
+    """
+    size = width // 8
+    values = np.zeros(max(depth, len(words)), dtype=f">u{size}")
+    values[: len(words)] = words
+
+    text = np.empty((len(values), 2 * size + 1), dtype=np.uint8)
+    text[:, :-1] = HEX_DIGITS[values.view(np.uint8).reshape(-1, size)].reshape(len(values), -1)
+    text[:, -1] = ord("\n")
+    return text.tobytes().decode("ascii")
+
+
+def raw_content(words, width, depth):
+    """
+    Return the raw little-endian image, padded with zeros up to the depth. The words being MSB
+    first, each of them is byte-swapped relative to the input binary.
+    """
+    words = array.array(words.typecode, words)
+    if sys.byteorder != "little":
+        words.byteswap()
 
-    nwords = len(data) // bytes_per_word
+    return words.tobytes() + bytes((depth - len(words)) * (width // 8))
+
+
+FORMATS = {
+    "mif": mif_content,
+    "hex": hex_content,
+    "raw": raw_content,
+}
+
+
+def output_format(file, fmt=None):
+    """Return the output format, either passed or deduced from the file extension."""
+    if fmt is not None:
+        return fmt
+
+    return {".hex": "hex", ".bin": "raw", ".raw": "raw"}.get(Path(file).suffix.lower(), "mif")
+
+
+def write_words(words, file, width=32, depth=None, fmt=None):
+    """Write an array of words into a MIF, HEX or raw file, with a single write."""
     if depth is None:
-        depth = nwords
+        depth = len(words)
+
+    content = FORMATS[output_format(file, fmt)](words, width, depth)
+
+    with open(file, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+    return
+
+
+def write_image(data, file, width=32, depth=None, byte_swap=False, fmt=None):
+    """Write a memory image into a MIF, HEX or raw file, with a single write."""
+    write_words(to_words(data, width, depth, byte_swap), file, width, depth, fmt)
+    return
+
+
+def memory_depth(memory, width=32, config=DEFAULT_CONFIG):
+    """Return the depth, in words, of the ROM or RAM, as defined into the config."""
+    rom, ram = load_memory_map(config)
+    base, top = rom if memory == "rom" else ram
+    return (top - base + 1) // (width // 8)
+
+
+def fill_image(file, depth, width=32, value=0, pattern="fill", preload=(), fmt=None):
+    """
+    Generate a memory image without any input file, for example to initialize the RAM.
+
+    The memory is filled with value (pattern = "fill"), or each word contain its own byte
+    address (pattern = "address"), which make any wrong access easy to spot. Then, the
+    preload list of (word address, value) is applied, to place some canaries.
+    """
+    if width not in WORD_TYPES:
+        raise ValueError(f"Unsupported word width : {width} (expected one of {list(WORD_TYPES)})")
+
+    mask = (1 << width) - 1
+    typecode = WORD_TYPES[width]
+
+    if pattern == "address":
+        step = width // 8
+        words = array.array(typecode, range(0, depth * step, step))
+    else:
+        words = array.array(typecode, [value & mask]) * depth
+
+    for address, word in preload:
+        if not 0 <= address < depth:
+            raise ValueError(f"Preloaded address 0x{address:X} is outside of the memory")
+        words[address] = word & mask
+
+    write_words(words, file, width, depth, fmt)
+    return
+
+
+def write_mif(data, mif_file, width=32, depth=None, byte_swap=False):
+    """Write a memory image into a MIF file."""
+    write_image(data, mif_file, width, depth, byte_swap, "mif")
+    return
+
 
-    with open(mif_file, "w") as f:
-        f.write(f"WIDTH={width};\n")
-        f.write(f"DEPTH={depth};\n\n")
-        f.write("ADDRESS_RADIX=HEX;\n")
-        f.write("DATA_RADIX=HEX;\n\n")
-        f.write("CONTENT BEGIN\n")
+def bin_to_mif(bin_file, mif_file, width=32, depth=None, byte_swap=False, fmt=None):
+    with open(bin_file, "rb") as f:
+        data = f.read()
 
-        for i in range(nwords):
-            word_bytes = data[i * bytes_per_word : (i + 1) * bytes_per_word]
+    write_image(data, mif_file, width, depth, byte_swap, fmt)
+    return
 
-            if byte_swap:
-                word_bytes = word_bytes[::-1]
 
-            word_hex = word_bytes.hex().upper()
-            f.write(f"    {i:04X} : {word_hex};\n")
+def elf_to_mif(
+    elf_file,
+    mif_file,
+    ram_file=None,
+    width=32,
+    depth=None,
+    byte_swap=False,
+    config=None,
+    fmt=None,
+    ram_fill=0,
+):
+    """
+    Write the ROM image of an ELF file, and its RAM one if ram_file is set, in a single pass : the
+    RAM is filled with ram_fill, then its .data is placed.
+    """
+    config = config or DEFAULT_CONFIG
+    rom, ram = elf_to_images(elf_file, config)
 
-        if nwords < depth:
-            f.write(f"    [{nwords:04X}..{depth-1:04X}] : " + "0" * (width // 4) + ";\n")
+    write_image(rom, mif_file, width, depth, byte_swap, fmt)
+    if ram_file is not None:
+        ram_depth = memory_depth("ram", width, config)
+        data = to_words(ram, width, ram_depth, byte_swap)
 
-        f.write("END;\n")
-        return
+        words = array.array(data.typecode, [ram_fill & ((1 << width) - 1)]) * ram_depth
+        words[: len(data)] = data
+        write_words(words, ram_file, width, ram_depth, fmt)
+    return
+
+
+def is_elf(file):
+    with open(file, "rb") as f:
+        return f.read(4) == ELF_MAGIC
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Convert a binary file to Intel/Altera .mif format"
+        description="Convert a binary (or ELF) file to Intel/Altera .mif format"
     )
-    parser.add_argument("input", help="Input .bin file")
-    parser.add_argument("output", help="Output .mif file")
+    parser.add_argument("input", nargs="?", help="Input .bin or .elf file (not needed with --fill)")
+    parser.add_argument("output", help="Output .mif file (ROM image for ELF inputs)")
     parser.add_argument("--width", type=int, default=32, help="Word width in bits (default: 32)")
     parser.add_argument(
         "--depth", type=int, default=None, help="Memory depth in words (default: auto)"
@@ -52,9 +382,87 @@ def main():
         action="store_true",
         help="Swap byte order inside each word (for endianness control)",
     )
+    parser.add_argument(
+        "--ram",
+        metavar="FILE",
+        default=None,
+        help="Output .mif file for the RAM (.data) image (only for ELF inputs)",
+    )
+    parser.add_argument(
+        "--fill",
+        metavar="VALUE",
+        type=lambda x: int(x, 0),
+        default=None,
+        help="Generate a memory image filled with VALUE (for example 0 or a 0xDEADBEEF poison). "
+        "With an ELF input, the value of the --ram words outside of its .data",
+    )
+    parser.add_argument(
+        "--pattern",
+        choices=["fill", "address"],
+        default="fill",
+        help="Fill pattern : the --fill value, or the word byte address (default: fill)",
+    )
+    parser.add_argument(
+        "--preload",
+        metavar="ADDR=VALUE",
+        action="append",
+        default=[],
+        help="Word address and value to place into a filled image (canaries), can be repeated",
+    )
+    parser.add_argument(
+        "--memory",
+        choices=["rom", "ram"],
+        default=None,
+        help="Use the depth of this memory, as defined into the config (default: --depth)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(FORMATS),
+        default=None,
+        help="Output format (default: deduced from the extension, .hex, .bin / .raw or .mif)",
+    )
+    parser.add_argument(
+        "--config",
+        metavar="FILE",
+        default=None,
+        help="Config file defining the memory map (default: configs/core/instructions.toml)",
+    )
 
     args = parser.parse_args()
-    bin_to_mif(args.input, args.output, args.width, args.depth, args.byte_swap)
+
+    depth = args.depth
+    if depth is None and args.memory is not None:
+        depth = memory_depth(args.memory, args.width, args.config or DEFAULT_CONFIG)
+
+    if args.input is not None and is_elf(args.input):
+        elf_to_mif(
+            args.input,
+            args.output,
+            args.ram,
+            args.width,
+            depth,
+            args.byte_swap,
+            args.config,
+            args.format,
+            args.fill or 0,
+        )
+
+    elif args.fill is not None:
+        if depth is None:
+            parser.error("--fill needs a --depth or a --memory")
+
+        preload = []
+        for elem in args.preload:
+            address, value = elem.split("=")
+            preload.append((int(address, 0), int(value, 0)))
+
+        fill_image(args.output, depth, args.width, args.fill, args.pattern, preload, args.format)
+
+    elif args.input is None:
+        parser.error("an input file is required (or use --fill)")
+
+    else:
+        bin_to_mif(args.input, args.output, args.width, depth, args.byte_swap, args.format)
     return
 
 
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+"""
+Offline branch predictor simulator, evaluating a whole grid of predictor configurations against
+branch traces (for example the ones of iss.py --branches), in a single pass over the traces.
+
+The modeled family is the one of rtl/core/prediction.sv, generalized : a table of 2^k saturating
+counters of n bits (reset to 0), indexed by the branch address xor the h last conditional
+outcomes (gshare). A branch is predicted taken if the MSB of its counter is set. The current
+RTL is the k = 0, h = 0 point (a single global counter), with the n bits of
+configs/core/branch-prediction.toml.
+
+Two update policies are available :
+
+    rtl         as prediction.sv, the counter is incremented on each correct prediction, and
+                decremented on each misprediction. Jumps (JAL) count as correct predictions,
+                and indirect jumps (JALR) as mispredictions.
+    outcome     the usual bimodal counter, incremented on taken branches, and decremented on
+                not taken ones. Jumps don't update it.
+
+The trace is made of packed records (pc, target, flags), see iss.py BRANCH. The counters of all
+of the configurations live in a single array, thus each branch is simulated for the whole grid
+at once, by a handful of NumPy operations.
+"""
+
+import argparse
+import json
+import sys
+import tomllib
+
+import numpy as np
+
+from iss import (
+    BRANCH,
+    BRANCH_CONDITIONAL,
+    BRANCH_INDIRECT,
+    BRANCH_TAKEN,
+    CONFIG_DIR,
+    INSTRUCTIONS_CONFIG,
+)
+
+BPU_CONFIG = CONFIG_DIR / "core" / "branch-prediction.toml"
+
+TRACE_DTYPE = np.dtype([("pc", "<u4"), ("target", "<u4"), ("flags", "u1")])
+assert TRACE_DTYPE.itemsize == BRANCH.size
+
+# Branches kinds, selecting the counters update
+NOT_TAKEN, TAKEN, JUMP, INDIRECT = range(4)
+
+POLICIES = ("rtl", "outcome")
+
+# Number of branches whose indexes are computed at once
+CHUNK = 4096
+
+
+def load_trace(path):
+    """Load a branch trace, as a structured array."""
+    return np.fromfile(path, dtype=TRACE_DTYPE)
+
+
+def load_bpu_bits(config_file=BPU_CONFIG):
+    with open(config_file, "rb") as f:
+        return tomllib.load(f)["bpu"]["bpu_bits_nb"]
+
+
+def default_penalty(config_file=INSTRUCTIONS_CONFIG):
+    """Estimated cycles lost per flush : the fetch latency, then the decode and issue stages."""
+    with open(config_file, "rb") as f:
+        return tomllib.load(f)["instructions"]["if_latency"] + 2
+
+
+def parse_range(text):
+    """Parse a list of integers, such as "0,2,4-8"."""
+    values = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        values.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(values))
+
+
+def make_grid(index_bits, history_bits, counter_bits):
+    """List the (k, h, n) configurations. A history longer than the index would be masked."""
+    return [(k, h, n) for n in counter_bits for k in index_bits for h in history_bits if h <= k]
+
+
+def next_value(value, bits, kind, policy):
+    """Counter value after a branch of the passed kind."""
+    top = (1 << bits) - 1
+    predicted = value >> (bits - 1)
+
+    if policy == "rtl":
+        correct = kind == JUMP or (kind != INDIRECT and predicted == (kind == TAKEN))
+    elif kind in (JUMP, INDIRECT):
+        return value
+    else:
+        correct = kind == TAKEN
+
+    return min(value + 1, top) if correct else max(value - 1, 0)
+
+
+def history(taken, bits):
+    """Global history before each conditional branch (and after the last), newest in bit 0."""
+    hist = np.zeros(len(taken) + 1, dtype=np.int64)
+    for d in range(1, bits + 1):
+        hist[d:] |= taken[: len(taken) + 1 - d].astype(np.int64) << (d - 1)
+    return hist
+
+
+def simulate(trace, grid, policy="rtl"):
+    """
+    Run a trace through every configuration of the grid, from reset. Return the number of
+    conditional mispredictions of each configuration.
+    """
+    flags = trace["flags"]
+    conditional = (flags & BRANCH_CONDITIONAL) != 0
+    taken = (flags & BRANCH_TAKEN) != 0
+
+    kinds = np.where(taken, TAKEN, NOT_TAKEN)
+    kinds[~conditional] = JUMP
+    kinds[(flags & BRANCH_INDIRECT) != 0] = INDIRECT
+
+    # Jumps only matter when they update the counters
+    keep = conditional if policy == "outcome" else np.ones(len(trace), dtype=bool)
+    pcs = trace["pc"][keep].astype(np.int64) >> 2
+    kinds, conditional, taken = kinds[keep], conditional[keep], taken[keep]
+
+    max_history = max(h for _, h, _ in grid)
+    hist = history(taken[conditional], max_history)
+    hist = hist[np.cumsum(conditional) - conditional]
+
+    # Each configuration owns 2^k entries of the table. The counters are stored encoded as
+    # state = c * states + value, so a single lookup table per branch kind updates them all.
+    states = 1 << max(n for _, _, n in grid)
+    sizes = np.array([1 << k for k, _, _ in grid], dtype=np.int64)
+    offsets = np.cumsum(sizes) - sizes
+    index_masks = sizes - 1
+    history_masks = np.array([(1 << h) - 1 for _, h, _ in grid], dtype=np.int64)
+    bases = np.arange(len(grid), dtype=np.int64) * states
+
+    table = np.repeat(bases, sizes)
+    updates = [np.arange(len(grid) * states, dtype=np.int64) for _ in range(4)]
+    predicted = np.zeros(len(grid) * states, dtype=bool)
+    for c, (_, _, n) in enumerate(grid):
+        for value in range(1 << n):
+            predicted[bases[c] + value] = value >> (n - 1)
+            for kind in range(4):
+                updates[kind][bases[c] + value] = bases[c] + next_value(value, n, kind, policy)
+
+    mispredicts = np.zeros(len(grid), dtype=np.int64)
+    for start in range(0, len(pcs), CHUNK):
+        stop = min(start + CHUNK, len(pcs))
+        index = offsets + (
+            (pcs[start:stop, None] ^ (hist[start:stop, None] & history_masks)) & index_masks
+        )
+
+        seen = np.empty_like(index)
+        for i, kind in enumerate(kinds[start:stop].tolist()):
+            entries = index[i]
+            state = table[entries]
+            seen[i] = state
+            table[entries] = updates[kind][state]
+
+        wrong = predicted[seen] != taken[start:stop, None]
+        mispredicts += (wrong & conditional[start:stop, None]).sum(axis=0)
+
+    return mispredicts
+
+
+def evaluate(traces, grid, policy, penalty):
+    """Simulate each trace from reset, and report the summed results of each configuration."""
+    branches = jumps = indirect = 0
+    mispredicts = np.zeros(len(grid), dtype=np.int64)
+
+    for trace in traces:
+        flags = trace["flags"]
+        conditional = (flags & BRANCH_CONDITIONAL) != 0
+        branches += int(conditional.sum())
+        jumps += int((~conditional).sum())
+        indirect += int(((flags & BRANCH_INDIRECT) != 0).sum())
+        mispredicts += simulate(trace, grid, policy)
+
+    results = []
+    for (k, h, n), missed in zip(grid, mispredicts.tolist()):
+        # Indirect jumps are never predicted, and always flush the pipeline
+        flushes = missed + indirect
+        results.append(
+            {
+                "entries": 1 << k,
+                "history": h,
+                "bits": n,
+                "storage": (1 << k) * n,
+                "branches": branches,
+                "jumps": jumps,
+                "mispredicts": missed,
+                "rate": missed / branches if branches else None,
+                "flushes": flushes,
+                "flush_cycles": flushes * penalty,
+            }
+        )
+
+    return results
+
+
+def print_results(results, current, top):
+    print(
+        f"  {'Entries':>8s} {'History':>8s} {'Bits':>5s} {'Storage':>8s} "
+        f"{'Mispredicts':>12s} {'Rate':>8s} {'Flush cycles':>13s}"
+    )
+
+    ranked = sorted(results, key=lambda r: (r["mispredicts"], r["storage"]))
+    shown = ranked[:top] if top else ranked
+    if current is not None and current not in shown:
+        shown.append(current)
+
+    for result in shown:
+        marker = "*" if result is current else " "
+        rate = "-" if result["rate"] is None else f"{result['rate']:8.2%}"
+        print(
+            f"{marker} {result['entries']:8d} {result['history']:8d} {result['bits']:5d} "
+            f"{result['storage']:8d} {result['mispredicts']:12d} {rate:>8s} "
+            f"{result['flush_cycles']:13d}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate a grid of branch predictor configurations against branch traces",
+    )
+    parser.add_argument("traces", nargs="+", help="Branch traces (iss.py --branches FILE)")
+    parser.add_argument(
+        "-k",
+        "--index-bits",
+        type=parse_range,
+        default=parse_range("0-10"),
+        help="Table sizes, as log2 of the entries count (default: 0-10)",
+    )
+    parser.add_argument(
+        "--history",
+        type=parse_range,
+        default=parse_range("0-10"),
+        help="Global history lengths, up to the index bits (default: 0-10)",
+    )
+    parser.add_argument(
+        "--bits",
+        type=parse_range,
+        default=None,
+        help="Counters widths (default: bpu_bits_nb of branch-prediction.toml)",
+    )
+    parser.add_argument(
+        "--policy",
+        choices=POLICIES,
+        default="rtl",
+        help="Counters update policy (default: rtl, as prediction.sv)",
+    )
+    parser.add_argument(
+        "--penalty",
+        type=int,
+        default=None,
+        help="Cycles lost per flush (default: the fetch latency, plus two stages)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of configurations printed, the best first (0 for all, default: 20)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to FILE")
+    parser.add_argument("--bpu-config", default=BPU_CONFIG, help="Branch prediction config file")
+    parser.add_argument("--config", default=INSTRUCTIONS_CONFIG, help="Instructions config file")
+    args = parser.parse_args()
+
+    rtl_bits = load_bpu_bits(args.bpu_config)
+    counter_bits = args.bits or [rtl_bits]
+    penalty = default_penalty(args.config) if args.penalty is None else args.penalty
+
+    if min(counter_bits) < 1:
+        parser.error("counters must be at least one bit wide")
+
+    grid = make_grid(args.index_bits, args.history, counter_bits)
+    if not grid:
+        parser.error("empty grid, the history lengths can't exceed the index bits")
+
+    traces = [load_trace(path) for path in args.traces]
+    results = evaluate(traces, grid, args.policy, penalty)
+
+    # The configuration of the current RTL, if part of the grid
+    current = None
+    if args.policy == "rtl" and (0, 0, rtl_bits) in grid:
+        current = results[grid.index((0, 0, rtl_bits))]
+
+    first = results[0]
+    print(
+        f"{first['branches']} conditional branches, {first['jumps']} jumps, "
+        f"{len(grid)} configurations ({args.policy} policy, {penalty} cycles per flush)"
+    )
+    print()
+    print_results(results, current, args.top)
+    if current is not None:
+        print("\n* current RTL configuration")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"policy": args.policy, "penalty": penalty, "results": results}, f, indent=4)
+        print(f"\n📄 Results written to: {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Post-boot checkpoints of the program runner (testbench/src/tests/tester.cpp), to start the
+programs runs at the end of the boot rather than from reset.
+
+    ./utils/checkpoint.py build/tester/Vrv32
+    ./utils/checkpoint.py build/tester/Vrv32 --boot build/boot.elf --boot-end 0x10001000
+
+The model runs from reset, and saves its state (+checkpoint=FILE) right before the first memory
+access, or before the first fetch of --boot-end, which then needs the boot microcode image. The
+programs runs then restore it (+restore=FILE), with their own memory images (+rom=FILE and
++ram=FILE, as raw words). The model shall be verilated with --savable (make tester).
+
+A checkpoint only fits the model which saved it, thus they're stored by the hash of the model
+binary (and of the boot parameters) : build/checkpoints/<key>.ckpt. A rebuilt model gets a new
+one, and --prune removes the others.
+"""
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from bin2mif import elf_to_images, fill_image, memory_depth, write_image
+
+CHECKPOINT_DIR = Path("build") / "checkpoints"
+
+# Maximal number of cycles simulated to reach the boot end
+BOOT_CYCLES = 10000
+
+
+def checkpoint_key(model, boot_end=None, boot=None):
+    """Hash the model binary, the boot end address, and the boot image if any."""
+    digest = hashlib.sha256()
+    with open(model, "rb") as f:
+        digest.update(hashlib.file_digest(f, "sha256").digest())
+
+    digest.update(f"{boot_end}".encode())
+    if boot is not None:
+        digest.update(Path(boot).read_bytes())
+
+    return digest.hexdigest()[:16]
+
+
+def save(model, path, boot_end=None, boot=None, cycles=BOOT_CYCLES):
+    """
+    Run the model from reset up to the boot end, and save its state into path. The run happens
+    into a scratch folder, holding the boot image (or an empty ROM) and an empty RAM.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=path.parent) as scratch:
+        scratch = Path(scratch)
+        (scratch / "build").mkdir()
+        (scratch / "simout").mkdir()
+
+        if boot is None:
+            fill_image(scratch / "build" / "rom.mif", memory_depth("rom"), fmt="mif")
+        else:
+            rom, _ = elf_to_images(boot)
+            write_image(rom, scratch / "build" / "rom.mif", 32, memory_depth("rom"), fmt="mif")
+        fill_image(scratch / "build" / "ram.mif", memory_depth("ram"), fmt="mif")
+
+        command = [Path(model).resolve(), f"+checkpoint={scratch / 'boot.ckpt'}"]
+        command += [f"+cycles={cycles}"]
+        if boot_end is not None:
+            command.append(f"+boot_end={boot_end:#x}")
+
+        process = subprocess.run(
+            command,
+            cwd=scratch,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+        )
+        if process.returncode != 0 or not (scratch / "boot.ckpt").exists():
+            raise RuntimeError(f"the checkpoint couldn't be saved :\n{process.stdout}")
+
+        # Atomically published, concurrent users only ever see complete checkpoints
+        os.replace(scratch / "boot.ckpt", path)
+
+    return path
+
+
+def ensure(model, boot_end=None, boot=None, checkpoint_dir=CHECKPOINT_DIR, cycles=BOOT_CYCLES):
+    """Return the checkpoint of a model, saved first if it doesn't exist yet."""
+    path = Path(checkpoint_dir) / f"{checkpoint_key(model, boot_end, boot)}.ckpt"
+    if not path.exists():
+        save(model, path, boot_end, boot, cycles)
+    return path
+
+
+def prune(keep, checkpoint_dir=CHECKPOINT_DIR):
+    """Remove the checkpoints of the other (older) models, and return their count."""
+    removed = 0
+    for path in Path(checkpoint_dir).glob("*.ckpt"):
+        if path.resolve() != Path(keep).resolve():
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Save the post-boot checkpoint of the program runner, once per model",
+    )
+    parser.add_argument("model", help="Program runner binary (build/tester/Vrv32, make tester)")
+    parser.add_argument(
+        "--boot-end",
+        type=lambda text: int(text, 0),
+        default=None,
+        metavar="ADDR",
+        help="Fetch address ending the boot (default: the first memory access)",
+    )
+    parser.add_argument("--boot", default=None, help="Boot microcode image (ELF), for --boot-end")
+    parser.add_argument(
+        "-c",
+        "--cycles",
+        type=int,
+        default=BOOT_CYCLES,
+        help=f"Maximal number of cycles to reach the boot end (default: {BOOT_CYCLES})",
+    )
+    parser.add_argument(
+        "-d",
+        "--dir",
+        default=CHECKPOINT_DIR,
+        help=f"Checkpoints folder (default: {CHECKPOINT_DIR})",
+    )
+    parser.add_argument(
+        "--prune", action="store_true", help="Remove the checkpoints of the other models"
+    )
+    args = parser.parse_args()
+
+    try:
+        path = ensure(args.model, args.boot_end, args.boot, args.dir, args.cycles)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(path)
+    if args.prune:
+        prune(path, args.dir)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
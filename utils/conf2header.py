@@ -4,28 +4,29 @@ Generate SystemVerilog and C++ enum definitions from a simple definition file.
 """
 
 import argparse
+import ast
 import importlib.util
-import datetime
+import io
+import re
 import tomllib
 from pathlib import Path
 
+from def2header import write_depfile, write_if_changed
+
 
 def generate_SV(keys: dict, includes: list[Path], outfile: Path):
 
-    with open(outfile, "w+") as f:
+    with io.StringIO() as f:
         # Append header
-        f.write(
-            f"""/*
+        f.write(f"""/*
  *  File :      {str(outfile)}
  *
  *  Author :    Generated by {__file__.split("/")[-1]}
- *  Date :      {datetime.datetime.now()}
  *  
  *  Brief :     This file define the {outfile.name.split(".")[0]} package, 
  *              which contain definitions from different configs/ files (.toml and .py)
  */
-"""
-        )
+""")
 
         # Append global syntax
         f.write(f"\n`timescale 1ns / 1ps\n")  # To make verilator happy
@@ -64,23 +65,22 @@ def generate_SV(keys: dict, includes: list[Path], outfile: Path):
         f.write("    /* verilator lint_on UNUSEDPARAM */\n")
         f.write("\nendpackage\n")
 
+        return write_if_changed(outfile, f.getvalue())
+
 
 def generate_C(keys: dict, includes: list[Path], outfile: Path):
 
-    with open(outfile, "w+") as f:
+    with io.StringIO() as f:
         # Append header
-        f.write(
-            f"""/*
+        f.write(f"""/*
  *  File :      {str(outfile)}
  *
  *  Author :    Generated by {__file__.split("/")[-1]}
- *  Date :      {datetime.datetime.now()}
  *  
  *  Brief :     This file define the {outfile.name.split(".")[0]} values as constexpr, 
  *              which contain definitions from different configs/ files (.toml and .py)
  */
-"""
-        )
+""")
 
         # Append global syntax
         f.write(f"\n#ifndef __DEF_{outfile.name.split(".")[0].upper()}_\n")  # To make gcc happy
@@ -115,67 +115,61 @@ def generate_C(keys: dict, includes: list[Path], outfile: Path):
         # Append the endmodule
         f.write(f"\n#endif")
 
+        return write_if_changed(outfile, f.getvalue())
 
-def generate_C_includes(includes: list[Path], outfile: Path):
 
+def read_includes(outfile: Path, pattern: str) -> set[str]:
+    """List the files already included by an aggregate file (written by other folders runs)."""
     if not outfile.exists():
+        return set()
+    return set(re.findall(pattern, outfile.read_text()))
+
 
-        with open(outfile, "w+") as f:
-            # Append header
-            f.write(
-                f"""/*
+def generate_C_includes(includes: list[Path], outfile: Path):
+
+    # The other config folders add their own files : keep the sorted union of all of them
+    names = read_includes(outfile, r'#include "(.+)"') | {include.name for include in includes}
+
+    with io.StringIO() as f:
+        # Append header
+        f.write(f"""/*
 *  File :      {str(outfile)}
 *
 *  Author :    Generated by {__file__.split("/")[-1]}
-*  Date :      {datetime.datetime.now()}
 *  
 *  Brief :     This file include any generated files into a single one, which can be hardcoded
 */\n
-"""
-            )
+""")
 
-            # Append includes
-            for include in includes:
-                f.write(f'#include "{include.name}"\n')
-
-    else:
-
-        with open(outfile, "a") as f:
+        # Append includes
+        for name in sorted(names):
+            f.write(f'#include "{name}"\n')
 
-            for include in includes:
-                f.write(f'#include "{include.name}"\n')
+        return write_if_changed(outfile, f.getvalue())
 
 
 def generate_SV_includes(includes: list[Path], outfile: Path):
 
-    if not outfile.exists():
+    # The other config folders add their own files : keep the sorted union of all of them
+    names = read_includes(outfile, r'`include "(.+)"') | {include.name for include in includes}
 
-        with open(outfile, "w+") as f:
-            # Append header
-            f.write(
-                f"""/*
+    with io.StringIO() as f:
+        # Append header
+        f.write(f"""/*
 *  File :      {str(outfile)}
 *
 *  Author :    Generated by {__file__.split("/")[-1]}
-*  Date :      {datetime.datetime.now()}
 *  
 *  Brief :     This file include any generated files into a single one, which can be hardcoded
 */\n
-"""
-            )
-            f.write(f"\n`timescale 1ns / 1ps\n\n")  # To make verilator happy
-
-            # Append includes
-            for include in includes:
-                f.write(f'`include "{include.name}"\n')
-
-    else:
+""")
+        f.write(f"\n`timescale 1ns / 1ps\n\n")  # To make verilator happy
 
-        with open(outfile, "a") as f:
+        # Append includes
+        for name in sorted(names):
+            f.write(f'`include "{name}"\n')
 
-            # Append includes
-            for include in includes:
-                f.write(f'`include "{include.name}"\n')
+        return write_if_changed(outfile, f.getvalue())
 
 
 def apply_script(config: dict, script_path: Path) -> dict:
@@ -191,40 +185,88 @@ def apply_script(config: dict, script_path: Path) -> dict:
         raise AttributeError(f"{script_path} has no 'apply(config)' function")
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Generate SystemVerilog and C++ enum definitions from a simple definition file (toml)",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-    )
-    parser.add_argument(
-        "config_folder",
-        metavar="FOLDER",
-        help="Location of the config file name and scripts. Any TOML files will be loaded all together",
-    )
-
-    parser.add_argument(
-        "-o",
-        "--output",
-        default="build/",
-        metavar="FILE",
-        help="Output files location",
-    )
-    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
-
-    args = parser.parse_args()
-
-    # List all sources and scripts files
-    p = Path(args.config_folder).glob("**/*.toml")
-    configs = [x for x in p if x.is_file()]
-
-    p = Path(args.config_folder).glob("**/*.py")
-    scripts = [x for x in p if x.is_file()]
-
-    p = Path(args.config_folder).glob("**/includes.toml")
-    includes = [x for x in p if x.is_file()]
+def script_keys(script_path: Path) -> tuple[set, set]:
+    """
+    List the keys read and written by a config script, from the config["key"] accesses (and
+    config.get("key") calls) of its apply function.
+    """
+    tree = ast.parse(script_path.read_text(), str(script_path))
+    reads, writes = set(), set()
+
+    for function in ast.walk(tree):
+        if not isinstance(function, ast.FunctionDef) or function.name != "apply":
+            continue
+        if not function.args.args:
+            continue
+        config = function.args.args[0].arg
+
+        for node in ast.walk(function):
+            if (
+                isinstance(node, ast.Subscript)
+                and isinstance(node.value, ast.Name)
+                and node.value.id == config
+                and isinstance(node.slice, ast.Constant)
+            ):
+                (writes if isinstance(node.ctx, ast.Store) else reads).add(node.slice.value)
+
+            elif (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and isinstance(node.func.value, ast.Name)
+                and node.func.value.id == config
+                and node.func.attr == "get"
+                and node.args
+                and isinstance(node.args[0], ast.Constant)
+            ):
+                reads.add(node.args[0].value)
+
+    return reads, writes
+
+
+def order_scripts(scripts: list[Path]) -> list[Path]:
+    """
+    Sort the config scripts in dependency order : a script writing a key runs before the ones
+    reading it. Independent scripts keep their (sorted) order.
+    """
+    accesses = {script: script_keys(script) for script in scripts}
+    depends = {
+        script: {
+            other
+            for other in scripts
+            if other != script and accesses[other][1] & accesses[script][0]
+        }
+        for script in scripts
+    }
+
+    ordered = []
+    while len(ordered) != len(scripts):
+        ready = [s for s in scripts if s not in ordered and depends[s] <= set(ordered)]
+        if not ready:
+            cycle = ", ".join(str(s) for s in scripts if s not in ordered)
+            raise ValueError(f"Circular dependency between the config scripts : {cycle}")
+        ordered.append(ready[0])
+
+    return ordered
+
+
+def load_folder(folder: Path) -> tuple[dict, list, list[Path]]:
+    """
+    Load a config folder : read all of its TOML files, then apply its scripts in dependency
+    order. Return the flattened keys, the included files, and every file read.
+    """
+
+    # List all sources and scripts files, sorted to get the same output on any file system
+    p = folder.glob("**/*.toml")
+    configs = sorted(x for x in p if x.is_file())
+
+    p = folder.glob("**/*.py")
+    scripts = order_scripts(sorted(x for x in p if x.is_file()))
+
+    p = folder.glob("**/includes.toml")
+    includes = sorted(x for x in p if x.is_file())
 
     # Removing the includes files from the config files
-    configs = list(set(configs) - set(includes))
+    configs = [config for config in configs if config not in includes]
 
     # Read all of the elements into the configs files, and flatten the dicts
     keys = dict()
@@ -241,29 +283,79 @@ def main():
             for key in tmp.keys():
                 inc = inc | tmp[key]
     inc = list(inc.keys())
-    # Generate C include files
-    incC = [val.split(".")[0] + ".h" for val in inc]
 
     # Then, call the different subscripts to generate the computed keys
     for script in scripts:
         apply_script(keys, script)
 
+    return keys, inc, configs + includes + scripts
+
+
+def generate_folder(
+    folder: Path, output: Path, depfile: Path | None = None, stamp: Path | None = None
+) -> tuple[Path, Path]:
+    """
+    Generate the SystemVerilog package and the C++ header of a config folder. Return both of the
+    files paths, to be added to the generated.sv and generated.h includes. The depfile targets the
+    stamp file if set, the generated files otherwise.
+    """
+    keys, inc, sources = load_folder(folder)
+
+    # Generate C include files
+    incC = [val.split(".")[0] + ".h" for val in inc]
+
     # Get the folder name
-    dirname = Path(args.config_folder).name
+    dirname = folder.name
 
     # Generate file names
-    SVfile = Path(args.output) / Path(f"{dirname}_config_pkg.svh")
-    Cfile = Path(args.output) / Path(f"generated_{dirname}_config_pkg.h")
-    incCfile = Path(args.output) / Path(f"generated.h")
-    incSVfile = Path(args.output) / Path(f"generated.sv")
+    SVfile = output / Path(f"{dirname}_config_pkg.svh")
+    Cfile = output / Path(f"generated_{dirname}_config_pkg.h")
 
     # Finally, generate the right files :
     generate_SV(keys, inc, SVfile)
     generate_C(keys, incC, Cfile)
 
+    if depfile is not None:
+        targets = [stamp] if stamp is not None else [SVfile, Cfile]
+        write_depfile(depfile, targets, sources + [Path(__file__)])
+
+    return SVfile, Cfile
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate SystemVerilog and C++ enum definitions from a simple definition file (toml)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "config_folder",
+        metavar="FOLDER",
+        help="Location of the config file name and scripts. Any TOML files will be loaded all together",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="build/",
+        metavar="FILE",
+        help="Output files location",
+    )
+    parser.add_argument(
+        "-d",
+        "--depfile",
+        default=None,
+        metavar="FILE",
+        help="Make dependency file to write, listing every TOML file and script read",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
+
+    args = parser.parse_args()
+
+    SVfile, Cfile = generate_folder(Path(args.config_folder), Path(args.output), args.depfile)
+
     # Generate the C include file
-    generate_C_includes([Cfile], incCfile)
-    generate_SV_includes([SVfile], incSVfile)
+    generate_C_includes([Cfile], Path(args.output) / Path(f"generated.h"))
+    generate_SV_includes([SVfile], Path(args.output) / Path(f"generated.sv"))
 
 
 if __name__ == "__main__":
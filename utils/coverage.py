@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+"""
+Coverage of the opcodes, ALU commands and CSRs (configs/def/*.def) exercised by the simulations,
+measured from their VCD files.
+
+    ./utils/coverage.py simout/*.vcd build/programs/*/simout/*.vcd -o logs/coverage.npz
+    ./utils/coverage.py logs/coverage.npz build/sweep/*/logs/coverage.npz
+
+Each probe samples an enum signal on the rising edges of the clock (its value before the edge,
+as a flip-flop would), when its strobes hold, and counts the hits into a histogram indexed by the
+enum entries, in the definition order. The last bin counts the values out of the enum.
+
+    opcodes     the opcode issued by the issuer (r_dec_opcode, when occupancy_exec)
+    commands    the ALU command it's issued as (next_alu_cmd)
+    pairs       the (opcode, command) combinations
+    csr_reads   the CSR read by the CSR unit (rid of csr.sv)
+    csr_writes  the CSR written (wid of csr.sv, on the first cycle of each write)
+
+Only the probed signals are streamed (see vcd.py), the clock edges being computed from its
+period. The files are processed in parallel, and their histograms summed, thus the results of
+several runs, or of several .npz files, merge.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from def2header import load_enums
+from vcd import VcdFile, clock_edges
+
+DEF_DIR = Path(__file__).resolve().parent.parent / "configs" / "def"
+
+# Enums of the probes, and their definition files
+ENUM_FILES = {
+    "opcodes_t": DEF_DIR / "opcodes.def",
+    "alu_commands_t": DEF_DIR / "commands.def",
+    "csr_t": DEF_DIR / "csr.def",
+}
+
+
+@dataclass
+class probe:
+    enum: str
+    signal: str
+    strobes: tuple = ()  # (glob pattern, value) which shall all hold for a sample to count
+
+
+ISSUE = ("*.issuer.occupancy_exec", 1)
+
+PROBES = {
+    "opcodes": probe("opcodes_t", "*.issuer.r_dec_opcode", (ISSUE,)),
+    "commands": probe("alu_commands_t", "*.issuer.next_alu_cmd", (ISSUE,)),
+    "csr_reads": probe("csr_t", "*.csr_regs.rid"),
+    "csr_writes": probe(
+        "csr_t", "*.csr_regs.wid", (("*.csr_regs.we", 1), ("*.csr_regs.write_state", 0))
+    ),
+}
+
+# Combinations histogram, of two probes sharing the same strobes
+PAIRS = ("opcodes", "commands")
+
+# Placeholders, which aren't expected to be exercised
+IGNORED = {"c_NONE", "r_NONE"}
+
+
+def load_tables(enum_files=ENUM_FILES):
+    """Return the {enum: (names, values)} of the probed enums, in the definition order."""
+    tables = {}
+    for name, def_file in enum_files.items():
+        for enum in load_enums(def_file):
+            if enum["name"] == name:
+                entries = enum["values"]
+                values = np.array([entry["value"] for entry in entries], dtype=np.int64)
+                tables[name] = ([entry["name"] for entry in entries], values)
+
+    return tables
+
+
+def empty(tables, probes=PROBES):
+    """Zeroed histograms, with the out of enum bin."""
+    hist = {
+        name: np.zeros(len(tables[p.enum][0]) + 1, dtype=np.int64) for name, p in probes.items()
+    }
+    first, second = (len(tables[probes[name].enum][0]) + 1 for name in PAIRS)
+    hist["pairs"] = np.zeros((first, second), dtype=np.int64)
+    return hist
+
+
+def bins(values, samples):
+    """Map sampled values to the enum entries positions (the last bin if out of the enum)."""
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    position = np.minimum(np.searchsorted(sorted_values, samples), len(values) - 1)
+    known = sorted_values[position] == samples
+    return np.where(known, order[position], len(values))
+
+
+def sample(times, values, edges):
+    """Value of a signal right before each edge (-1 if unknown, or not set yet)."""
+    if len(times) == 0:
+        return np.full(len(edges), -1, dtype=np.int64)
+
+    k = np.searchsorted(times, edges, side="left") - 1
+    return np.where(k >= 0, values[np.maximum(k, 0)], -1)
+
+
+def shallowest(vcd, pattern):
+    """
+    The matching signal closest to the top, as the clock selection of vcd.py. The vectors names
+    hold their range, such as "opcode[5:0]".
+    """
+    matches = vcd.select([pattern, f"{pattern}[[]*"])
+    return min(matches, key=lambda sig: sig.name.count(".")) if matches else None
+
+
+def collect(path, clock="*.clk", probes=PROBES):
+    """Histograms of a single VCD file. A probe whose signals aren't dumped stays empty."""
+    tables = load_tables()
+    hist = empty(tables, probes)
+
+    with VcdFile(path) as vcd:
+        clk = shallowest(vcd, clock)
+        first, period = clock_edges(vcd, clk) if clk is not None else (None, None)
+        if first is None:
+            return hist
+
+        patterns = {p.signal for p in probes.values()}
+        patterns |= {pattern for p in probes.values() for pattern, _ in p.strobes}
+        signals = {pattern: shallowest(vcd, pattern) for pattern in patterns}
+        found = [sig for sig in signals.values() if sig is not None]
+
+        series = {sig.code: ([], []) for sig in found}
+        for time, code, value in vcd.changes(found):
+            times, values = series[code]
+            times.append(time)
+            values.append(-1 if value is None else value)
+
+        edges = np.arange(first, vcd.end_time() + 1, period, dtype=np.int64)
+
+    samples = {}
+    for pattern, sig in signals.items():
+        if sig is not None:
+            times, values = series[sig.code]
+            samples[pattern] = sample(
+                np.array(times, dtype=np.int64), np.array(values, dtype=np.int64), edges
+            )
+
+    indexes = {}
+    for name, p in probes.items():
+        needed = [p.signal] + [pattern for pattern, _ in p.strobes]
+        if any(pattern not in samples for pattern in needed):
+            continue
+
+        mask = np.ones(len(edges), dtype=bool)
+        for pattern, value in p.strobes:
+            mask &= samples[pattern] == value
+
+        indexes[name] = bins(tables[p.enum][1], samples[p.signal][mask])
+        hist[name] += np.bincount(indexes[name], minlength=len(hist[name]))
+
+    if all(name in indexes for name in PAIRS):
+        first, second = (indexes[name] for name in PAIRS)
+        shape = hist["pairs"].shape
+        flat = np.bincount(first * shape[1] + second, minlength=shape[0] * shape[1])
+        hist["pairs"] += flat.reshape(shape)
+
+    return hist
+
+
+def load(path):
+    """Load the histograms of a .npz file (written by save)."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files if name != "runs"}, int(data["runs"])
+
+
+def save(hist, runs, path):
+    np.savez_compressed(path, runs=np.array(runs), **hist)
+
+
+def merge(total, hist):
+    """Sum two sets of histograms, which shall come from the same definitions."""
+    for name, counts in hist.items():
+        if total[name].shape != counts.shape:
+            raise ValueError(f"{name} : the histograms don't match, the definitions changed ?")
+        total[name] += counts
+    return total
+
+
+def summary(hist, tables, probes=PROBES):
+    """Return the {probe: (exercised, total, unexercised names)} of each probe."""
+    results = {}
+    for name, p in probes.items():
+        names = tables[p.enum][0]
+        counts = hist[name][: len(names)]
+        expected = [k for k, entry in enumerate(names) if entry not in IGNORED]
+        missing = [names[k] for k in expected if counts[k] == 0]
+        results[name] = (len(expected) - len(missing), len(expected), missing)
+    return results
+
+
+def print_report(hist, tables, runs, counts=False, probes=PROBES):
+    print(f"{runs} runs")
+    for name, (hit, total, missing) in summary(hist, tables, probes).items():
+        share = hit / total if total else 0.0
+        print(f"\n{name:12s} : {hit}/{total} exercised ({share:.1%})")
+        if hist[name][-1]:
+            print(f"    {hist[name][-1]} samples out of the enum")
+        if missing:
+            print(f"    unexercised : {', '.join(missing)}")
+
+        if counts:
+            names = tables[probes[name].enum][0]
+            for entry, count in zip(names, hist[name].tolist()):
+                if count:
+                    print(f"    {entry:16s} {count:12d}")
+
+    first, second = (tables[probes[name].enum][0] for name in PAIRS)
+    seen = np.argwhere(hist["pairs"][: len(first), : len(second)])
+    print(f"\npairs        : {len(seen)} (opcode, command) combinations")
+    if counts:
+        for a, b in seen.tolist():
+            print(f"    {first[a]:16s} {second[b]:16s} {hist['pairs'][a, b]:12d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the opcodes, ALU commands and CSRs exercised by the simulations",
+    )
+    parser.add_argument("files", nargs="+", help="VCD files, or .npz results to merge")
+    parser.add_argument("-o", "--output", default=None, help="Write the merged histograms (.npz)")
+    parser.add_argument("--json", default=None, help="Write the coverage summary as JSON to FILE")
+    parser.add_argument(
+        "-c",
+        "--clock",
+        default="*.clk",
+        help="Glob pattern of the clock, the shallowest match is used (default: *.clk)",
+    )
+    parser.add_argument("--counts", action="store_true", help="Print the hits of each entry")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes used to read the VCD files (default: cpu count)",
+    )
+    args = parser.parse_args()
+
+    tables = load_tables()
+    total, runs = empty(tables), 0
+
+    vcds = [path for path in args.files if not path.endswith(".npz")]
+    for path in args.files:
+        if path.endswith(".npz"):
+            hist, count = load(path)
+            total, runs = merge(total, hist), runs + count
+
+    if vcds:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(vcds)))) as executor:
+            for hist in executor.map(collect, vcds, [args.clock] * len(vcds)):
+                total, runs = merge(total, hist), runs + 1
+
+    print_report(total, tables, runs, args.counts)
+
+    if args.output is not None:
+        save(total, runs, args.output)
+        print(f"\n📄 Histograms written to: {args.output}")
+
+    if args.json is not None:
+        results = {
+            name: {"exercised": hit, "total": count, "unexercised": missing}
+            for name, (hit, count, missing) in summary(total, tables).items()
+        }
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "coverage": results}, f, indent=4)
+        print(f"📄 Summary written to: {args.json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,11 +19,45 @@ Definition file format:
 """
 
 import argparse
+import hashlib
+import json
+import os
 import re
 import sys
 from pathlib import Path
 
 
+def write_if_changed(path, content):
+    """
+    Write a generated file, only if its content changed. Unchanged outputs keep their timestamp,
+    thus nothing depending on them gets rebuilt. The file is written aside then renamed, so a
+    concurrent reader never sees it partially written. Return True if the file was written.
+    """
+    path = Path(path)
+    if path.exists() and path.read_text() == content:
+        return False
+
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        temporary.write_text(content)
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return True
+
+
+def write_depfile(depfile, targets, dependencies):
+    """
+    Write a make dependency file, listing every file read to generate the targets. As gcc -MP,
+    each dependency also gets an empty rule, so removing one doesn't break the build.
+    """
+    dependencies = sorted({os.path.relpath(dependency) for dependency in dependencies})
+
+    lines = [f"{' '.join(str(target) for target in targets)} : {' '.join(dependencies)}", ""]
+    lines += [f"{dependency} :" for dependency in dependencies]
+    return write_if_changed(depfile, "\n".join(lines) + "\n")
+
+
 def parse_value(value_str, auto_value):
     """Parse a value string (binary, hex, decimal) or return auto-incremented value."""
     if value_str is None or value_str.strip() == "":
@@ -119,6 +153,47 @@ def parse_enum_file(filepath):
     return enums
 
 
+# Parsed definitions cache, shared by all of the generators and tools. The entries are keyed by
+# the hash of the definition file content and of the parser version (to bump when the IR changes).
+CACHE_DIR = Path(__file__).resolve().parent.parent / "build" / "cache"
+IR_VERSION = 1
+
+
+def load_enums(filepath, cache_dir=CACHE_DIR):
+    """
+    Return the enums of a definition file (see parse_enum_file), from the cache if this content
+    was already parsed. A None cache_dir disables the cache.
+    """
+    if cache_dir is None:
+        return parse_enum_file(filepath)
+
+    content = Path(filepath).read_bytes()
+    digest = hashlib.sha256(b"%d\n" % IR_VERSION + content).hexdigest()
+    entry = Path(cache_dir) / f"{Path(filepath).stem}-{digest[:16]}.json"
+
+    try:
+        return json.loads(entry.read_text())
+    except (OSError, ValueError):
+        pass
+
+    enums = parse_enum_file(filepath)
+
+    # Written aside then renamed, thus the parallel generators never read a partial entry. The
+    # cache is optional : a build folder which can't be written only disables it.
+    temporary = entry.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temporary.write_text(json.dumps(enums, indent=1))
+        os.replace(temporary, entry)
+    except OSError:
+        try:
+            temporary.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    return enums
+
+
 def extract_bit_width(sv_type):
     """Extract bit width from SystemVerilog type like 'logic [6:0]'."""
     match = re.search(r"\[(\d+):(\d+)\]", sv_type)
@@ -168,8 +243,105 @@ def generate_systemverilog(enums, output_path):
         lines.append(f"}} {enum['name']};")
         lines.append("")
 
-    with open(output_path, "w") as f:
-        f.write("\n".join(lines))
+    return write_if_changed(output_path, "\n".join(lines))
+
+
+# FNV-1a hash of the names, then a multiplicative mix with the seed of their bucket (see CPP_HASH)
+FNV_OFFSET = 0x811C9DC5
+FNV_PRIME = 0x01000193
+MIX_FACTOR = 0x9E3779B1
+
+CPP_HASH = """#ifndef _DEF2HEADER_HASH
+#define _DEF2HEADER_HASH
+
+// FNV-1a hash, shared by the generated name lookups
+constexpr uint32_t __def2header_hash(std::string_view text)
+{
+    uint32_t hash = 0x811C9DC5u;
+    for (char c : text)
+    {
+        hash ^= static_cast<uint8_t>(c);
+        hash *= 0x01000193u;
+    }
+    return hash;
+}
+
+// Slot of a hash, from the seed of its bucket (the top bits of a multiplicative hash)
+constexpr uint32_t __def2header_slot(uint32_t hash, uint32_t seed, uint32_t bits)
+{
+    return ((hash ^ seed) * 0x9E3779B1u) >> (32 - bits);
+}
+
+#endif // _DEF2HEADER_HASH
+"""
+
+# Value to name tables are indexed by value when the values are dense enough, and searched
+# (by dichotomy) otherwise
+DENSE_SLACK = 16
+
+
+def fnv1a(text):
+    value = FNV_OFFSET
+    for byte in text.encode():
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def mix(value, seed, bits):
+    return (((value ^ seed) * MIX_FACTOR) & 0xFFFFFFFF) >> (32 - bits)
+
+
+def perfect_hash(names):
+    """
+    Build a perfect hash of the names (hash and displace) : the names are spread into buckets by
+    their hash, then each bucket gets the seed mixed with the hash of its names, which sends all
+    of them into free slots. Return (bits, seeds, slots), where slots hold the name index + 1.
+    """
+    if len(set(names)) != len(names):
+        raise ValueError("duplicated names can't be hashed")
+
+    hashes = [fnv1a(name) for name in names]
+    bits = max(len(names) - 1, 1).bit_length()
+    while True:
+        size = 1 << bits
+        buckets = [[] for _ in range(size)]
+        for index, value in enumerate(hashes):
+            buckets[value & (size - 1)].append(index)
+
+        seeds = [0] * size
+        slots = [0] * size
+
+        # The largest buckets are placed first, while most of the slots are free
+        for bucket in sorted(range(size), key=lambda b: -len(buckets[b])):
+            indexes = buckets[bucket]
+            if not indexes:
+                continue
+
+            for seed in range(1 << 16):
+                placed = {mix(hashes[i], seed, bits) for i in indexes}
+                if len(placed) == len(indexes) and not any(slots[slot] for slot in placed):
+                    break
+            else:
+                break
+
+            seeds[bucket] = seed
+            for i in indexes:
+                slots[mix(hashes[i], seed, bits)] = i + 1
+        else:
+            return bits, seeds, slots
+
+        # Some bucket couldn't be placed, retry with more room
+        bits += 1
+
+
+def format_array(values, per_line=16):
+    """Format integers as the lines of a C++ array initializer."""
+    lines = []
+    for k in range(0, len(values), per_line):
+        chunk = values[k : k + per_line]
+        comma = "," if k + per_line < len(values) else ""
+        lines.append("    " + ", ".join(str(value) for value in chunk) + comma)
+    return lines
 
 
 def generate_cpp(enums, output_path):
@@ -182,39 +354,250 @@ def generate_cpp(enums, output_path):
         f"#define _{output_path.split("/")[-1].split(".")[0].upper()}_H",
         "",
         "#include <cstdint>",
+        "#include <string_view>",
         "",
+        CPP_HASH,
     ]
 
     for enum in enums:
+        name = enum["name"]
+        values = enum["values"]
+        count = len(values)
+
         # Creating the whole opcode enum
         lines.append(f"typedef enum {{")
 
-        for i, val in enumerate(enum["values"]):
-            comma = "," if i < len(enum["values"]) - 1 else ""
+        for i, val in enumerate(values):
+            comma = "," if i < count - 1 else ""
             cpp_val = format_cpp_value(val["value"])
             lines.append(f"    {val['name']: <20} = {cpp_val}{comma}")
 
-        lines.append(f"}} {enum['name']};")
+        lines.append(f"}} {name};")
         lines.append("")
 
-        # Appending a function to make a lookup-table function
-        lines.append(f"static const std::string __{enum['name']}_names[{len(enum["values"])}] = {{")
+        # Names and values, in declaration order
+        keys = [val["name"][2:] for val in values]
+        lines.append(f"constexpr std::string_view __{name}_keys[{count}] = {{")
+        for i, key in enumerate(keys):
+            comma = "," if i < count - 1 else ""
+            lines.append(f'    "{key}"{comma}')
+        lines.append("};\n")
 
-        for i, val in enumerate(enum["values"]):
-            comma = "," if i < len(enum["values"]) - 1 else ""
-            lines.append(f"    \"{val['name'][2:]}\"{comma}")
+        lines.append(f"constexpr uint32_t __{name}_values[{count}] = {{")
+        lines += format_array([format_cpp_value(val["value"]) for val in values], per_line=8)
         lines.append("};\n")
 
-        # Appending the function that'll make the lookup
-        lines.append(f"inline const std::string get_name({enum["name"]} op)")
+        # Value to name : a table indexed by value if dense, else the indexes sorted by value
+        low = min(val["value"] for val in values)
+        high = max(val["value"] for val in values)
+        span = high - low + 1
+
+        if span <= 2 * count + DENSE_SLACK:
+            table = [-1] * span
+            for i, val in enumerate(values):
+                if table[val["value"] - low] < 0:
+                    table[val["value"] - low] = i
+
+            lines.append(f"constexpr int16_t __{name}_indexes[{span}] = {{")
+            lines += format_array(table)
+            lines.append("};\n")
+            lines.append(f"inline constexpr std::string_view get_name({name} op)")
+            lines.append("{")
+            lines.append(f"    const uint32_t offset = static_cast<uint32_t>(op) - {low}u;")
+            lines.append(f"    if (offset >= {span}u || __{name}_indexes[offset] < 0)")
+            lines.append("    {")
+            lines.append('        return "UNKNOWN";')
+            lines.append("    }")
+            lines.append(f"    return __{name}_keys[__{name}_indexes[offset]];")
+
+        else:
+            order = sorted(range(count), key=lambda i: (values[i]["value"], i))
+
+            lines.append(f"constexpr uint16_t __{name}_sorted[{count}] = {{")
+            lines += format_array(order)
+            lines.append("};\n")
+            lines.append(f"inline constexpr std::string_view get_name({name} op)")
+            lines.append("{")
+            lines.append("    const uint32_t value = static_cast<uint32_t>(op);")
+            lines.append(f"    uint32_t first = 0, last = {count};")
+            lines.append("    while (first < last)")
+            lines.append("    {")
+            lines.append("        const uint32_t middle = (first + last) / 2;")
+            lines.append(f"        if (__{name}_values[__{name}_sorted[middle]] < value)")
+            lines.append("        {")
+            lines.append("            first = middle + 1;")
+            lines.append("        }")
+            lines.append("        else")
+            lines.append("        {")
+            lines.append("            last = middle;")
+            lines.append("        }")
+            lines.append("    }")
+            lines.append(
+                f"    if (first == {count} || __{name}_values[__{name}_sorted[first]] != value)"
+            )
+            lines.append("    {")
+            lines.append('        return "UNKNOWN";')
+            lines.append("    }")
+            lines.append(f"    return __{name}_keys[__{name}_sorted[first]];")
+
+        lines.append("}")
+        lines.append("")
+
+        # Name to value : perfect hash of the names, then a single comparison
+        bits, seeds, slots = perfect_hash(keys)
+        size = len(slots)
+
+        lines.append(f"constexpr uint16_t __{name}_seeds[{size}] = {{")
+        lines += format_array(seeds)
+        lines.append("};\n")
+        lines.append(f"constexpr uint16_t __{name}_slots[{size}] = {{")
+        lines += format_array(slots)
+        lines.append("};\n")
+
+        lines.append(f"inline constexpr bool get_value(std::string_view text, {name} &op)")
         lines.append("{")
-        lines.append(f"    return __{enum['name']}_names[static_cast<int>(op)];")
+        lines.append("    const uint32_t hash = __def2header_hash(text);")
+        lines.append(f"    const uint32_t seed = __{name}_seeds[hash & {size - 1}u];")
+        lines.append(
+            f"    const uint16_t slot = __{name}_slots[__def2header_slot(hash, seed, {bits})];"
+        )
+        lines.append(f"    if (slot == 0 || __{name}_keys[slot - 1] != text)")
+        lines.append("    {")
+        lines.append("        return false;")
+        lines.append("    }")
+        lines.append(f"    op = static_cast<{name}>(__{name}_values[slot - 1]);")
+        lines.append("    return true;")
         lines.append("}")
+        lines.append("")
+
+    lines.append(f"#endif // _{output_path.split("/")[-1].split(".")[0].upper()}_H")
+
+    return write_if_changed(output_path, "\n".join(lines))
+
+
+PY_LOOKUP = """
+
+def names(enum, values):
+    \"\"\"
+    Names (without prefix) of an array of values of an enum, by a single vectorized lookup. The
+    values out of the enum are named UNKNOWN.
+    \"\"\"
+    values = np.asarray(values, dtype=np.int64)
+    keys, table = _LOOKUPS[enum]
+
+    # Dense enums : the table is indexed by value, from the lowest one
+    if isinstance(keys, int):
+        index = values - keys
+        return table[np.where((index < 0) | (index >= len(table) - 1), len(table) - 1, index)]
+
+    # Sparse enums : the values are sorted, and searched
+    index = np.searchsorted(keys, values)
+    found = keys[np.minimum(index, len(keys) - 1)] == values
+    return table[np.where(found, index, len(keys))]
+"""
+
 
-    lines.append(f"\n#endif // _{output_path.split("/")[-1].split(".")[0].upper()}_H")
+def python_names(name, table):
+    """Format the names array of an enum, one name per line."""
+    return (
+        [f"{name}_NAMES = np.array(", "    ["]
+        + [f'        "{key}",' for key in table]
+        + ["    ]", ")"]
+    )
+
+
+def generate_python(enums, output_path):
+    """Generate Python module : an IntEnum per enum, and its NumPy value to name lookup arrays."""
+    lines = [
+        "# AUTO-GENERATED FILE - DO NOT EDIT",
+        f"# Generated by {__file__.split("/")[-1]}",
+        "",
+        "from enum import IntEnum",
+        "",
+        "import numpy as np",
+        "",
+        'UNKNOWN = "UNKNOWN"',
+        "",
+    ]
+
+    lookups = []
+    for enum in enums:
+        name = enum["name"]
+        values = enum["values"]
 
-    with open(output_path, "w") as f:
-        f.write("\n".join(lines))
+        lines.append("")
+        lines.append(f"class {name}(IntEnum):")
+        for val in values:
+            lines.append(f"    {val['name']} = {format_cpp_value(val['value'])}")
+        lines.append("")
+        lines.append("")
+
+        # The last entry of the names is UNKNOWN, for the values out of the enum
+        low = min(val["value"] for val in values)
+        span = max(val["value"] for val in values) - low + 1
+
+        if span <= 2 * len(values) + DENSE_SLACK:
+            table = ["UNKNOWN"] * (span + 1)
+            for val in reversed(values):
+                table[val["value"] - low] = val["name"][2:]
+
+            lines.append(f"# Names of the values, indexed by value - {name}_LOW")
+            lines.append(f"{name}_LOW = {low}")
+            lines += python_names(name, table)
+            lookups.append(f"    {name}: ({name}_LOW, {name}_NAMES),")
+
+        else:
+            # As get_name(), a value defined twice gets its first name
+            first = {}
+            for val in values:
+                first.setdefault(val["value"], val["name"][2:])
+
+            keys = [format_cpp_value(value) for value in sorted(first)]
+            table = [first[value] for value in sorted(first)] + ["UNKNOWN"]
+
+            lines.append("# Sorted values, and their names")
+            lines += [f"{name}_VALUES = np.array(", "    ["] + [f"        {key}," for key in keys]
+            lines += ["    ],", "    dtype=np.int64,", ")"]
+            lines += python_names(name, table)
+            lookups.append(f"    {name}: ({name}_VALUES, {name}_NAMES),")
+
+        lines.append("")
+
+    lines.append("")
+    lines.append("_LOOKUPS = {")
+    lines += lookups
+    lines.append("}")
+    lines.append(PY_LOOKUP)
+
+    return write_if_changed(output_path, "\n".join(lines))
+
+
+def generate(
+    definition_file, sv_file, cpp_file, depfile=None, verbose=False, python_file=None, stamp=None
+):
+    """
+    Generate the SystemVerilog and C++ headers of a definition file, its Python module if
+    python_file is set, and its depfile (targeting the stamp file if set, the outputs otherwise).
+    """
+    enums = load_enums(definition_file)
+
+    if verbose:
+        print(f"Parsed {len(enums)} enum(s) from {definition_file}")
+        for enum in enums:
+            print(f"  - {enum['name']}: {len(enum['values'])} values")
+
+    generate_systemverilog(enums, sv_file)
+    generate_cpp(enums, cpp_file)
+    outputs = [sv_file, cpp_file]
+
+    if python_file is not None:
+        generate_python(enums, python_file)
+        outputs.append(python_file)
+
+    if depfile is not None:
+        write_depfile(depfile, [stamp] if stamp else outputs, [definition_file, __file__])
+
+    return enums
 
 
 def main():
@@ -240,7 +623,7 @@ Example definition file format:
   ITEM4           # Auto = 6
 
 Usage example:
-  %(prog)s opcodes.def -s opcodes.svh -c opcodes.h
+  %(prog)s opcodes.def -s opcodes.svh -c opcodes.h -p opcodes.py
         """,
     )
 
@@ -259,20 +642,33 @@ Usage example:
         metavar="FILE",
         help="C++ output file (default: generated_enums.h)",
     )
+    parser.add_argument(
+        "-p",
+        "--python",
+        default=None,
+        metavar="FILE",
+        help="Python module output file, with IntEnum classes and NumPy name lookups",
+    )
+    parser.add_argument(
+        "-d",
+        "--depfile",
+        default=None,
+        metavar="FILE",
+        help="Make dependency file to write, listing the definition file and this script",
+    )
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
 
     args = parser.parse_args()
 
     try:
-        enums = parse_enum_file(args.definition_file)
-
-        if args.verbose:
-            print(f"Parsed {len(enums)} enum(s) from {args.definition_file}")
-            for enum in enums:
-                print(f"  - {enum['name']}: {len(enum['values'])} values")
-
-        generate_systemverilog(enums, args.systemverilog)
-        generate_cpp(enums, args.cpp)
+        generate(
+            args.definition_file,
+            args.systemverilog,
+            args.cpp,
+            args.depfile,
+            args.verbose,
+            args.python,
+        )
 
     except FileNotFoundError:
         print(f"Error: File not found: {args.definition_file}", file=sys.stderr)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Generate every config package (conf2header.py) and enum header (def2header.py) of the configs/
+tree, in a single process.
+
+Each config folder (a folder holding TOML files, such as configs/core/ or
+configs/peripherals/gpio/) gets its SystemVerilog package and C++ header, and each .def file its
+enums headers and Python module. The generated.sv and generated.h aggregates are written once, at
+the end.
+
+Every TOML and definition file is parsed once, and the derivation scripts are evaluated once
+per folder. The outputs are only rewritten if changed, each with a make depfile. With --jobs,
+the folders and definition files are spread over a pool of worker processes.
+
+As unchanged outputs keep their timestamp, they can't tell make that the generation is up to
+date : with --stamp, the depfiles target this stamp file instead, touched by the Makefile once
+everything is generated.
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from conf2header import generate_C_includes, generate_folder, generate_SV_includes
+from def2header import generate as generate_enums
+
+
+def find_folders(config_dir: Path) -> list[Path]:
+    """List the config folders : the first folders holding TOML files, in each branch."""
+    if any(config_dir.glob("*.toml")):
+        return [config_dir]
+
+    folders = []
+    for child in sorted(config_dir.iterdir()):
+        if child.is_dir():
+            folders += find_folders(child)
+    return folders
+
+
+def folder_task(folder: Path, output: Path, stamp: Path | None = None):
+    depfile = output / f"{folder.name}_config_pkg.d"
+    return generate_folder(folder, output, depfile, stamp)
+
+
+def definition_task(definition: Path, output: Path, stamp: Path | None = None):
+    stem = output / f"generated_{definition.stem}"
+    generate_enums(
+        str(definition),
+        f"{stem}.svh",
+        f"{stem}.h",
+        f"{stem}.d",
+        python_file=f"{stem}.py",
+        stamp=stamp,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate all of the config packages and enums headers of a configs/ tree",
+    )
+    parser.add_argument(
+        "config_dir",
+        nargs="?",
+        default="configs/",
+        metavar="FOLDER",
+        help="Root of the configs tree (default: configs/)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="build/",
+        metavar="FOLDER",
+        help="Output files location (default: build/)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1, everything in this process)",
+    )
+    parser.add_argument(
+        "--stamp",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Make target of the depfiles (default: the generated files themselves)",
+    )
+    args = parser.parse_args()
+
+    config_dir = Path(args.config_dir)
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    folders = find_folders(config_dir)
+    definitions = sorted(config_dir.glob("**/*.def"))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            enums = [pool.submit(definition_task, d, output, args.stamp) for d in definitions]
+            count = len(folders)
+            packages = list(pool.map(folder_task, folders, [output] * count, [args.stamp] * count))
+            for future in enums:
+                future.result()
+    else:
+        for definition in definitions:
+            definition_task(definition, output, args.stamp)
+        packages = [folder_task(folder, output, args.stamp) for folder in folders]
+
+    # The aggregates are only written once, with all of the packages
+    generate_SV_includes([sv for sv, _ in packages], output / "generated.sv")
+    generate_C_includes([c for _, c in packages], output / "generated.h")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,19 +3,40 @@
 """
 Generate a testbench report, which count the errors and pass per test,
 to make easier the debuging !
+
+The logs are parsed as streams (a single pass, line by line), and only the counts per check
+are kept in memory. Many logs can be parsed in parallel, across a process pool.
 """
 
 import argparse
 import sys
 import os
-from dataclasses import dataclass
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
 import datetime
 
+# Any ANSI escape sequence (colors, bold, underline...)
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+# Elapsed cycles, as printed by Testbench::run_until / run_while
+CYCLES = re.compile(r"needed (\d+) cycles")
+
 
 @dataclass
 class test_case:
-    name = str
-    data = dict
+    name: str = "default"
+    data: dict = field(default_factory=dict)
+
+    # Latency of the case operations : [count, min, max, total] cycles
+    cycles: list = field(default_factory=lambda: [0, 0, 0, 0])
+
+
+def percent(passed, failed):
+    """Return the success rate, in percents. An empty set is considered as failed (0 %)."""
+    total = passed + failed
+    return (passed / total) * 100 if total else 0.0
 
 
 def print_report(parsed):
@@ -26,18 +47,18 @@ def print_report(parsed):
             print("CASE : ", test.name)
             print("============================")
 
-            for key in test.data.keys():
+            keys = list(test.data.keys())
+            for key in keys:
 
-                total = sum(test.data[key])
-                percent = ((total - test.data[key][1]) / total) * 100
+                passed, failed = test.data[key]
 
                 print(f"    {key:12}")
-                print(f"        PASSED : {test.data[key][0]}")
-                print(f"        FAILED : {test.data[key][1]}")
+                print(f"        PASSED : {passed}")
+                print(f"        FAILED : {failed}")
                 print("       ---------")
-                print(f"                 {percent:02.1f}", "%")
+                print(f"                 {percent(passed, failed):02.1f}", "%")
 
-                if key != list(test.data.keys())[-1]:
+                if key != keys[-1]:
                     print("----------------------------")
 
 
@@ -54,43 +75,35 @@ def write_report(parsed, file):
                 fout.write("|     Test name    | Passed | Failed | Percents |\n")
                 fout.write("| ---------------- | ------ | ------ | -------- |\n")
 
-                for key in test.data.keys():
-                    total = sum(test.data[key])
-                    percent = ((total - test.data[key][1]) / total) * 100
-
+                for key, (passed, failed) in test.data.items():
                     fout.write(
-                        f"| {key:16} | {test.data[key][0]:6} | {test.data[key][1]:6} | {percent:.3f}  |\n"
+                        f"| {key:16} | {passed:6} | {failed:6} | {percent(passed, failed):.3f}  |\n"
                     )
 
                 fout.write("\n\n")
 
+        # Then, the latencies measured per case
+        timed = [test for test in parsed if test.cycles[0] > 0]
+        if timed:
+            fout.write("# Latency\n\n")
+            fout.write("|     Case name    | Count  |  Min   |  Max   |  Mean   |\n")
+            fout.write("| ---------------- | ------ | ------ | ------ | ------- |\n")
+
+            for test in timed:
+                count, low, high, total = test.cycles
+                fout.write(
+                    f"| {test.name:16} | {count:6} | {low:6} | {high:6} | {total / count:7.2f} |\n"
+                )
+
+            fout.write("\n\n")
+
         fout.write(
             f"*This report was generated automatically from a log file on the {datetime.datetime.now()}.*"
         )
 
 
 def sanitize(line):
-    to_delete = [
-        "\x1b[0m",
-        "\x1b[0m",
-        "\x1b[31m",
-        "\x1b[32m",
-        "\x1b[33m",
-        "\x1b[34m",
-        "\x1b[35m",
-        "\x1b[36m",
-        "\x1b[37m",
-        "\x1b[1m",
-        "\x1b[4m",
-    ]
-
-    tmp = line.strip()
-
-    for elem in to_delete:
-        tmp = tmp.replace(elem, "")
-
-    tmp = tmp.strip()
-    return tmp
+    return ANSI_ESCAPE.sub("", line).strip()
 
 
 def extract_name(line):
@@ -99,44 +112,80 @@ def extract_name(line):
     return tmp[0].strip().lower()
 
 
-def parse(lines):
+class report_parser:
+    """
+    Incremental parser, the lines are fed one by one (for example while the simulation is
+    running), and the counts are updated on the fly.
+    """
 
-    test_cases = []
-    case_id = 0
+    def __init__(self):
+        self.test_cases = [test_case()]
+        self.current = self.test_cases[0]
+        self.totals = [0, 0]
 
-    totals = [0, 0]
+    def feed(self, line):
+        """Parse a single line, and return "PASS", "FAIL" or None depending on its content."""
 
-    test_cases.append(test_case())
-    test_cases[case_id].name = "default"
-    test_cases[case_id].data = dict()
+        # Fast path : most of the lines aren't of any interest, skip them before any processing
+        if "Case" in line:
+            self.current = test_case(name=sanitize(line).split(":")[-1].strip().lower())
+            self.test_cases.append(self.current)
+            return None
+        elif "PASS" in line:
+            index = 0
+        elif "FAIL" in line:
+            index = 1
+        elif "cycles" in line:
+            self.feed_cycles(line)
+            return None
+        else:
+            return None
 
-    sanitized_lines = [sanitize(elem) for elem in lines]
+        name = extract_name(sanitize(line))
+        counts = self.current.data.get(name)
+        if counts is None:
+            counts = self.current.data[name] = [0, 0]
 
-    for line in sanitized_lines:
-        if "Case" in line:
+        counts[index] += 1
+        self.totals[index] += 1
+        return "FAIL" if index else "PASS"
 
-            test_cases.append(test_case())
-            case_id += 1
-            test_cases[case_id].name = line.split(":")[-1].strip().lower()
-            test_cases[case_id].data = dict()
+    def feed_cycles(self, line):
+        """Accumulate the elapsed cycles of an operation into the current case."""
+        match = CYCLES.search(line)
+        if match is None:
+            return
 
-        elif "PASS" in line:
+        value = int(match.group(1))
+        stats = self.current.cycles
 
-            name = extract_name(line)
-            if not name in test_cases[case_id].data.keys():
-                test_cases[case_id].data[name] = [0, 0]
-            test_cases[case_id].data[name][0] += 1
-            totals[0] += 1
+        stats[1] = value if stats[0] == 0 else min(stats[1], value)
+        stats[2] = max(stats[2], value)
+        stats[0] += 1
+        stats[3] += value
 
-        elif "FAIL" in line:
 
-            name = extract_name(line)
-            if not name in test_cases[case_id].data.keys():
-                test_cases[case_id].data[name] = [0, 0]
-            test_cases[case_id].data[name][1] += 1
-            totals[1] += 1
+def parse(lines):
+    """Parse any iterable of lines (a file object is streamed, never fully loaded)."""
+
+    parser = report_parser()
+    for line in lines:
+        parser.feed(line)
+
+    return parser.test_cases, parser.totals
 
-    return test_cases, totals
+
+def parse_file(file):
+    """Parse a log file. Defined at the module level to be usable from a process pool."""
+    with open(file, "r", errors="replace") as f:
+        return parse(f)
+
+
+def write_stat(totals, stat_file):
+    with open(stat_file, "w") as f:
+        f.write(f"pass={totals[0]}\n")
+        f.write(f"fail={totals[1]}\n")
+        f.write(f"percent={percent(*totals):.3f}\n")
 
 
 if __name__ == "__main__":
@@ -157,39 +206,46 @@ if __name__ == "__main__":
         "-f",
         "--file",
         metavar="FILE",
-        help="Select the file used as input (only of FILE mode)",
+        nargs="+",
+        help="Select the file(s) used as input (only of FILE mode). Several files are parsed in parallel",
     )
     parser.add_argument(
         "-o",
         "--output",
         metavar="FILE",
         default="CONSOLE",
-        help="Select the file used for output (Default to CONSOLE, which redirect output to the stdio). Set to a file to get a markdown written report !",
+        help="Select the file used for output (Default to CONSOLE, which redirect output to the stdio). Set to a file to get a markdown written report ! With several input files, this is a folder.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes used to parse several files (default: cpu count)",
     )
 
     args = parser.parse_args()
 
     # Source the data from STDIN or FILE
-    lines = None
     if args.mode == "FILE":
-        with open(args.file, "r") as f:
-            lines = f.readlines()
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(args.file)))) as executor:
+            results = list(executor.map(parse_file, args.file))
+        outputs = args.file
 
     else:
-        lines = sys.stdin.readlines()
+        results = [parse(sys.stdin)]
+        outputs = ["stdin"]
 
-    # Call the tool
-    parsed, totals = parse(lines)
+    for source, (parsed, totals) in zip(outputs, results):
 
-    if args.output == "CONSOLE":
-        print_report(parsed)
+        if args.output == "CONSOLE":
+            print_report(parsed)
+            continue
 
-    else:
-        write_report(parsed, args.output)
+        output = args.output
+        if len(results) > 1:
+            os.makedirs(args.output, exist_ok=True)
+            output = os.path.join(args.output, Path(source).stem + ".md")
 
-    stat_file = os.path.splitext(args.output)[0] + ".stat"
-    percent = ((sum(totals) - totals[1]) / sum(totals)) * 100
-    with open(stat_file, "w") as f:
-        f.write(f"pass={totals[0]}\n")
-        f.write(f"fail={totals[1]}\n")
-        f.write(f"percent={percent:.3f}\n")
+        write_report(parsed, output)
+        write_stat(totals, os.path.splitext(output)[0] + ".stat")
@@ -0,0 +1,854 @@
+#!/usr/bin/env python3
+
+"""
+RV32IM + Zicsr instruction-set simulator, used as a golden reference for the core.
+
+The executable opcodes are the ones of configs/def/opcodes.def, and the instruction fields
+are extracted at the positions defined into configs/core/instructions.toml. The CSRs are
+the ones of configs/def/csr.def, with the write masks of configs/core/csr.toml.
+
+The instructions are decoded once, by basic blocks (up to the next control transfer). Each
+block is translated into a small Python function, cached by its start address, so the hot
+loops run without any decoding, nor any per-instruction dispatch.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+import tomllib
+from pathlib import Path
+
+from bin2mif import elf_to_images, is_elf, load_memory_map, window_offset
+from def2header import load_enums
+from tracediff import RECORD
+
+CONFIG_DIR = Path(__file__).parent.parent / "configs"
+INSTRUCTIONS_CONFIG = CONFIG_DIR / "core" / "instructions.toml"
+
+# Maximal number of instructions per translated block
+BLOCK_SIZE = 64
+
+# Branch trace records (see bpsim.py) : pc, target, and flags
+BRANCH = struct.Struct("<IIB")
+BRANCH_TAKEN = 1
+BRANCH_CONDITIONAL = 2
+BRANCH_INDIRECT = 4
+
+# CSR addresses, as decoded by rtl/core/csr.sv
+CSR_ADDRESSES = {
+    0x300: "r_MSTATUS",
+    0x304: "r_MIE",
+    0x305: "r_MTVEC",
+    0x340: "r_MSCRATCH",
+    0x341: "r_MEPC",
+    0x342: "r_MCAUSE",
+    0x343: "r_MTVAL",
+    0x344: "r_MIP",
+    0xB00: "r_CYCLE",
+    0xB02: "r_INSTR",
+    0xB03: "r_FLUSH",
+    0xB04: "r_WAIT",
+    0xB05: "r_DECOD",
+    0xB80: "r_CYCLEH",
+    0xB82: "r_INSTRH",
+    0xB83: "r_FLUSHH",
+    0xB84: "r_WAITH",
+    0xB85: "r_DECODH",
+    0xF10: "r_MISA",
+    0xF11: "r_MVENDORID",
+    0xF12: "r_MARCHID",
+    0xF13: "r_MIMPID",
+    0xF14: "r_MHARTID",
+}
+
+# Exceptions causes (mcause)
+TRAPS = {
+    0: "instruction address misaligned",
+    1: "instruction access fault",
+    2: "illegal instruction",
+    3: "breakpoint",
+    4: "load address misaligned",
+    5: "load access fault",
+    6: "store address misaligned",
+    7: "store access fault",
+    11: "environment call",
+}
+
+# mstatus bits
+MSTATUS_MIE = 1 << 3
+MSTATUS_MPIE = 1 << 7
+MSTATUS_MPP = 3 << 11
+
+# === Decoding ===
+
+# Major opcode, funct3 and funct7 to opcodes.def names. None match any value.
+DECODE = {
+    (0b0110111, None, None): "i_LUI",
+    (0b0010111, None, None): "i_AUIPC",
+    (0b1101111, None, None): "i_JAL",
+    (0b1100111, 0b000, None): "i_JALR",
+    (0b1100011, 0b000, None): "i_BEQ",
+    (0b1100011, 0b001, None): "i_BNE",
+    (0b1100011, 0b100, None): "i_BLT",
+    (0b1100011, 0b101, None): "i_BGE",
+    (0b1100011, 0b110, None): "i_BLTU",
+    (0b1100011, 0b111, None): "i_BGEU",
+    (0b0000011, 0b000, None): "i_LB",
+    (0b0000011, 0b001, None): "i_LH",
+    (0b0000011, 0b010, None): "i_LW",
+    (0b0000011, 0b100, None): "i_LBU",
+    (0b0000011, 0b101, None): "i_LHU",
+    (0b0100011, 0b000, None): "i_SB",
+    (0b0100011, 0b001, None): "i_SH",
+    (0b0100011, 0b010, None): "i_SW",
+    (0b0010011, 0b000, None): "i_ADDI",
+    (0b0010011, 0b010, None): "i_SLTI",
+    (0b0010011, 0b011, None): "i_SLTIU",
+    (0b0010011, 0b100, None): "i_XORI",
+    (0b0010011, 0b110, None): "i_ORI",
+    (0b0010011, 0b111, None): "i_ANDI",
+    (0b0010011, 0b001, 0b0000000): "i_SLLI",
+    (0b0010011, 0b101, 0b0000000): "i_SRLI",
+    (0b0010011, 0b101, 0b0100000): "i_SRAI",
+    (0b0110011, 0b000, 0b0000000): "i_ADD",
+    (0b0110011, 0b000, 0b0100000): "i_SUB",
+    (0b0110011, 0b001, 0b0000000): "i_SLL",
+    (0b0110011, 0b010, 0b0000000): "i_SLT",
+    (0b0110011, 0b011, 0b0000000): "i_SLTU",
+    (0b0110011, 0b100, 0b0000000): "i_XOR",
+    (0b0110011, 0b101, 0b0000000): "i_SRL",
+    (0b0110011, 0b101, 0b0100000): "i_SRA",
+    (0b0110011, 0b110, 0b0000000): "i_OR",
+    (0b0110011, 0b111, 0b0000000): "i_AND",
+    (0b0110011, 0b000, 0b0000001): "i_MUL",
+    (0b0110011, 0b001, 0b0000001): "i_MULH",
+    (0b0110011, 0b010, 0b0000001): "i_MULHSU",
+    (0b0110011, 0b011, 0b0000001): "i_MULHU",
+    (0b0110011, 0b100, 0b0000001): "i_DIV",
+    (0b0110011, 0b101, 0b0000001): "i_DIVU",
+    (0b0110011, 0b110, 0b0000001): "i_REM",
+    (0b0110011, 0b111, 0b0000001): "i_REMU",
+    (0b0001111, None, None): "i_FENCE",
+    (0b1110011, 0b001, None): "i_CSRRW",
+    (0b1110011, 0b010, None): "i_CSRRS",
+    (0b1110011, 0b011, None): "i_CSRRC",
+    (0b1110011, 0b101, None): "i_CSRRWI",
+    (0b1110011, 0b110, None): "i_CSRRSI",
+    (0b1110011, 0b111, None): "i_CSRRCI",
+}
+
+# SYSTEM instructions without operands
+SYSTEM = {
+    0x00000073: "i_ECALL",
+    0x00100073: "i_EBREAK",
+    0x30200073: "i_MRET",
+}
+
+# === Translation templates ===
+# {a} and {b} are the rs1 and rs2 registers, {i} the unsigned immediate, {s} the immediate
+# with its sign bit flipped (for signed comparisons), {shamt} the shift amount, {pc} the
+# instruction address and {pc_i} the instruction address plus the immediate.
+
+# Instructions writing an expression into rd
+WRITES = {
+    "i_LUI": "{i}",
+    "i_AUIPC": "{pc_i}",
+    "i_ADDI": "({a} + {i}) & 0xFFFFFFFF",
+    "i_SLTI": "int(({a} ^ 0x80000000) < {s})",
+    "i_SLTIU": "int({a} < {i})",
+    "i_XORI": "{a} ^ {i}",
+    "i_ORI": "{a} | {i}",
+    "i_ANDI": "{a} & {i}",
+    "i_SLLI": "({a} << {shamt}) & 0xFFFFFFFF",
+    "i_SRLI": "{a} >> {shamt}",
+    "i_SRAI": "((({a} ^ 0x80000000) - 0x80000000) >> {shamt}) & 0xFFFFFFFF",
+    "i_ADD": "({a} + {b}) & 0xFFFFFFFF",
+    "i_SUB": "({a} - {b}) & 0xFFFFFFFF",
+    "i_SLL": "({a} << ({b} & 31)) & 0xFFFFFFFF",
+    "i_SLT": "int(({a} ^ 0x80000000) < ({b} ^ 0x80000000))",
+    "i_SLTU": "int({a} < {b})",
+    "i_XOR": "{a} ^ {b}",
+    "i_SRL": "{a} >> ({b} & 31)",
+    "i_SRA": "((({a} ^ 0x80000000) - 0x80000000) >> ({b} & 31)) & 0xFFFFFFFF",
+    "i_OR": "{a} | {b}",
+    "i_AND": "{a} & {b}",
+    "i_MUL": "({a} * {b}) & 0xFFFFFFFF",
+    "i_MULH": "(((({a} ^ 0x80000000) - 0x80000000) * (({b} ^ 0x80000000) - 0x80000000)) >> 32) & 0xFFFFFFFF",
+    "i_MULHSU": "(((({a} ^ 0x80000000) - 0x80000000) * {b}) >> 32) & 0xFFFFFFFF",
+    "i_MULHU": "({a} * {b}) >> 32",
+    "i_DIV": "div({a}, {b})",
+    "i_DIVU": "divu({a}, {b})",
+    "i_REM": "rem({a}, {b})",
+    "i_REMU": "remu({a}, {b})",
+}
+
+# Loads, evaluated even when rd is x0 (they may fault)
+LOADS = {
+    "i_LB": "m.lb(({a} + {i}) & 0xFFFFFFFF, {pc})",
+    "i_LH": "m.lh(({a} + {i}) & 0xFFFFFFFF, {pc})",
+    "i_LW": "m.lw(({a} + {i}) & 0xFFFFFFFF, {pc})",
+    "i_LBU": "m.lbu(({a} + {i}) & 0xFFFFFFFF, {pc})",
+    "i_LHU": "m.lhu(({a} + {i}) & 0xFFFFFFFF, {pc})",
+}
+
+STORES = {
+    "i_SB": "m.sb(({a} + {i}) & 0xFFFFFFFF, {b}, {pc})",
+    "i_SH": "m.sh(({a} + {i}) & 0xFFFFFFFF, {b}, {pc})",
+    "i_SW": "m.sw(({a} + {i}) & 0xFFFFFFFF, {b}, {pc})",
+}
+
+# Branches conditions
+BRANCHES = {
+    "i_BEQ": "{a} == {b}",
+    "i_BNE": "{a} != {b}",
+    "i_BLT": "({a} ^ 0x80000000) < ({b} ^ 0x80000000)",
+    "i_BGE": "({a} ^ 0x80000000) >= ({b} ^ 0x80000000)",
+    "i_BLTU": "{a} < {b}",
+    "i_BGEU": "{a} >= {b}",
+}
+
+# CSR accesses : new CSR value from the old one (v) and the source (t)
+CSRS = {
+    "i_CSRRW": "t",
+    "i_CSRRS": "v | t",
+    "i_CSRRC": "v & ~t & 0xFFFFFFFF",
+    "i_CSRRWI": "t",
+    "i_CSRRSI": "v | t",
+    "i_CSRRCI": "v & ~t & 0xFFFFFFFF",
+}
+
+# Instructions without any effect on the architectural state
+NOPS = {"i_NOP", "i_FENCE"}
+
+# Instructions ending a block, handled one by one by the translator
+CONTROL = {"i_JAL", "i_JALR", "i_ECALL", "i_EBREAK", "i_MRET"}
+
+
+class Trap(Exception):
+    """Synchronous exception, raised by an instruction."""
+
+    def __init__(self, cause, tval, pc):
+        super().__init__(cause, tval, pc)
+        self.cause = cause
+        self.tval = tval
+        self.pc = pc
+
+
+class Halt(Exception):
+    """Stop of the simulation, at the instruction pc (not executed)."""
+
+    def __init__(self, reason, pc):
+        super().__init__(reason, pc)
+        self.reason = reason
+        self.pc = pc
+
+
+def div(a, b):
+    if b == 0:
+        return 0xFFFFFFFF
+    a, b = (a ^ 0x80000000) - 0x80000000, (b ^ 0x80000000) - 0x80000000
+    if a == -0x80000000 and b == -1:
+        return 0x80000000
+    q = abs(a) // abs(b)
+    return (-q if (a < 0) != (b < 0) else q) & 0xFFFFFFFF
+
+
+def divu(a, b):
+    return a // b if b else 0xFFFFFFFF
+
+
+def rem(a, b):
+    if b == 0:
+        return a
+    a, b = (a ^ 0x80000000) - 0x80000000, (b ^ 0x80000000) - 0x80000000
+    if a == -0x80000000 and b == -1:
+        return 0
+    r = abs(a) % abs(b)
+    return (-r if a < 0 else r) & 0xFFFFFFFF
+
+
+def remu(a, b):
+    return a % b if b else a
+
+
+def load_fields(config_file=INSTRUCTIONS_CONFIG):
+    """Return the {field: (lsb, mask)} positions of the instruction fields."""
+    with open(config_file, "rb") as f:
+        opcodes = tomllib.load(f)["opcodes"]
+
+    fields = {}
+    for key, msb in opcodes.items():
+        if key.endswith("_msb"):
+            name = key[: -len("_msb")]
+            lsb = opcodes[f"{name}_lsb"]
+            fields[name] = (lsb, (1 << (msb - lsb + 1)) - 1)
+
+    return fields
+
+
+def load_opcodes(def_file=CONFIG_DIR / "def" / "opcodes.def"):
+    """
+    Return the opcodes names of the definition file. Each of them shall have a translation,
+    and each decoded instruction shall be defined there.
+    """
+    names = [value["name"] for enum in load_enums(def_file) for value in enum["values"]]
+
+    translated = set(WRITES) | set(LOADS) | set(STORES) | set(BRANCHES) | set(CSRS)
+    translated |= NOPS | CONTROL
+
+    missing = [name for name in names if name not in translated]
+    if missing:
+        raise ValueError(f"No translation for the opcodes : {', '.join(missing)}")
+
+    unknown = [name for name in set(DECODE.values()) | set(SYSTEM.values()) if name not in names]
+    if unknown:
+        raise ValueError(f"Opcodes not defined into the definition file : {', '.join(unknown)}")
+
+    return names
+
+
+def load_csrs(
+    def_file=CONFIG_DIR / "def" / "csr.def", config_file=CONFIG_DIR / "core" / "csr.toml"
+):
+    """Return the {name: write mask} of the CSRs, in the definition file order."""
+    names = [value["name"] for enum in load_enums(def_file) for value in enum["values"]]
+    names = [name for name in names if name != "r_NONE"]
+
+    with open(config_file, "rb") as f:
+        masks = tomllib.load(f)["csrs"]["csr_wmask"]
+
+    if len(masks) != len(names):
+        raise ValueError(f"{len(names)} CSRs are defined, but {len(masks)} write masks")
+
+    return dict(zip(names, masks))
+
+
+def sext(value, bits):
+    """Sign-extend a value, and return it as an unsigned 32 bits integer."""
+    sign = 1 << (bits - 1)
+    return ((value ^ sign) - sign) & 0xFFFFFFFF
+
+
+class Decoder:
+    """Split the instructions into their fields, at the configured positions."""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def field(self, instr, name):
+        lsb, mask = self.fields[name]
+        return (instr >> lsb) & mask
+
+    def decode(self, instr):
+        """Return (name, rd, rs1, rs2, imm) for an instruction, name is None if illegal."""
+        opcode = self.field(instr, "opcode")
+        funct3 = self.field(instr, "funct3")
+        funct7 = self.field(instr, "funct7")
+        rd = self.field(instr, "rd")
+        rs1 = self.field(instr, "rs1")
+        rs2 = self.field(instr, "rs2")
+
+        name = SYSTEM.get(instr)
+        if name is None:
+            name = (
+                DECODE.get((opcode, funct3, funct7))
+                or DECODE.get((opcode, funct3, None))
+                or DECODE.get((opcode, None, None))
+            )
+        if name is None:
+            return None, rd, rs1, rs2, 0
+
+        # Immediates, per instruction format
+        if opcode in (0b0110111, 0b0010111):
+            imm = instr & 0xFFFFF000
+        elif opcode == 0b1101111:
+            imm = sext(
+                ((instr >> 31) & 1) << 20
+                | ((instr >> 12) & 0xFF) << 12
+                | ((instr >> 20) & 1) << 11
+                | ((instr >> 21) & 0x3FF) << 1,
+                21,
+            )
+        elif opcode == 0b1100011:
+            imm = sext(
+                ((instr >> 31) & 1) << 12
+                | ((instr >> 7) & 1) << 11
+                | ((instr >> 25) & 0x3F) << 5
+                | ((instr >> 8) & 0xF) << 1,
+                13,
+            )
+        elif opcode == 0b0100011:
+            imm = sext(((instr >> 25) << 5) | ((instr >> 7) & 0x1F), 12)
+        elif opcode == 0b1110011:
+            imm = instr >> 20
+        else:
+            imm = sext(instr >> 20, 12)
+
+        return name, rd, rs1, rs2, imm
+
+
+class Memory:
+    """ROM and RAM windows of the memory map. The ROM is read-only."""
+
+    def __init__(self, rom, ram, rom_window, ram_window):
+        self.rom_window = rom_window
+        self.rom_base = rom_window[0]
+        self.rom_size = rom_window[1] - rom_window[0] + 1
+        self.ram_base = ram_window[0]
+        self.ram_size = ram_window[1] - ram_window[0] + 1
+
+        self.rom = bytearray(self.rom_size)
+        self.rom[: len(rom)] = rom
+        self.ram = bytearray(self.ram_size)
+        self.ram[: len(ram)] = ram
+
+        # RAM range holding translated code, any store into it flush the translations
+        self.code_lo = self.ram_size
+        self.code_hi = 0
+        self.on_code_write = None
+
+    def locate(self, addr, size, pc, cause):
+        """Return the (buffer, offset) of an access, or raise an access fault."""
+        offset = addr - self.ram_base
+        if 0 <= offset <= self.ram_size - size:
+            return self.ram, offset
+
+        offset = window_offset(addr, self.rom_window)
+        if offset is not None and offset <= self.rom_size - size:
+            return self.rom, offset
+
+        raise Trap(cause, addr, pc)
+
+    def fetch(self, pc):
+        if pc & 3:
+            raise Trap(0, pc, pc)
+        buffer, offset = self.locate(pc, 4, pc, 1)
+
+        if buffer is self.ram:
+            self.code_lo = min(self.code_lo, offset)
+            self.code_hi = max(self.code_hi, offset + 4)
+        return U32.unpack_from(buffer, offset)[0]
+
+    def lw(self, addr, pc):
+        if addr & 3:
+            raise Trap(4, addr, pc)
+        return U32.unpack_from(*self.locate(addr, 4, pc, 5))[0]
+
+    def lh(self, addr, pc):
+        if addr & 1:
+            raise Trap(4, addr, pc)
+        return I16.unpack_from(*self.locate(addr, 2, pc, 5))[0] & 0xFFFFFFFF
+
+    def lhu(self, addr, pc):
+        if addr & 1:
+            raise Trap(4, addr, pc)
+        return U16.unpack_from(*self.locate(addr, 2, pc, 5))[0]
+
+    def lb(self, addr, pc):
+        buffer, offset = self.locate(addr, 1, pc, 5)
+        return sext(buffer[offset], 8)
+
+    def lbu(self, addr, pc):
+        buffer, offset = self.locate(addr, 1, pc, 5)
+        return buffer[offset]
+
+    def store(self, addr, size, pc):
+        """Return the RAM offset of a store, or raise a store fault."""
+        if addr & (size - 1):
+            raise Trap(6, addr, pc)
+
+        offset = addr - self.ram_base
+        if not 0 <= offset <= self.ram_size - size:
+            raise Trap(7, addr, pc)
+
+        if self.code_lo < offset + size and offset < self.code_hi:
+            self.on_code_write()
+        return offset
+
+    def sw(self, addr, value, pc):
+        U32.pack_into(self.ram, self.store(addr, 4, pc), value)
+
+    def sh(self, addr, value, pc):
+        U16.pack_into(self.ram, self.store(addr, 2, pc), value & 0xFFFF)
+
+    def sb(self, addr, value, pc):
+        self.ram[self.store(addr, 1, pc)] = value & 0xFF
+
+
+U32 = struct.Struct("<I")
+U16 = struct.Struct("<H")
+I16 = struct.Struct("<h")
+
+
+class Iss:
+    """
+    The simulator itself. run() executes the program until a halt condition : an exception
+    without any handler (mtvec is 0), an idle loop (a jump to itself), or the end of the
+    instructions budget.
+    """
+
+    def __init__(
+        self, rom, ram, config_file=INSTRUCTIONS_CONFIG, reset_pc=None, trace=None, branches=None
+    ):
+        rom_window, ram_window = load_memory_map(config_file)
+
+        self.opcodes = load_opcodes()
+        self.decoder = Decoder(load_fields(config_file))
+        self.memory = Memory(rom, ram, rom_window, ram_window)
+        self.memory.on_code_write = self.flush
+
+        self.masks = load_csrs()
+        self.csrs = dict.fromkeys(self.masks, 0)
+
+        self.regs = [0] * 32
+        self.pc = rom_window[0] if reset_pc is None else reset_pc
+        self.retired = 0
+        self.block_pc = self.pc
+
+        # Translated blocks : {pc: (function, instructions count, idle)}
+        self.blocks = {}
+        self.namespace = {"div": div, "divu": divu, "rem": rem, "remu": remu, "Trap": Trap}
+
+        # Commit trace (see tracediff.py), written by the translated blocks
+        self.trace = trace
+        if trace is not None:
+            self.namespace |= {"w": trace.write, "R": RECORD}
+
+        # Branch trace (see bpsim.py), written by the translated blocks
+        self.branches = branches
+        if branches is not None:
+            self.namespace |= {"b": branches.write, "B": BRANCH.pack}
+
+    @classmethod
+    def from_file(cls, program, config_file=INSTRUCTIONS_CONFIG, trace=None, branches=None):
+        """Load an ELF file, or a raw binary placed at the start of the ROM."""
+        if is_elf(program):
+            rom, ram = elf_to_images(program, config_file)
+        else:
+            rom, ram = Path(program).read_bytes(), b""
+        return cls(rom, ram, config_file, trace=trace, branches=branches)
+
+    def flush(self):
+        """Drop the translated blocks (the code has been overwritten)."""
+        self.blocks.clear()
+        self.memory.code_lo = self.memory.ram_size
+        self.memory.code_hi = 0
+
+    # === CSRs ===
+
+    def instret(self, pc):
+        """Retired instructions count, while running the current block."""
+        return self.retired + ((pc - self.block_pc) >> 2)
+
+    def csr_read(self, address, pc):
+        name = CSR_ADDRESSES.get(address)
+        if name is None:
+            raise Trap(2, 0, pc)
+
+        if name == "r_MIP":
+            return 0
+
+        # The simulator retire an instruction per cycle, and never flush nor wait
+        if name in ("r_CYCLE", "r_INSTR", "r_DECOD"):
+            return self.instret(pc) & 0xFFFFFFFF
+        if name in ("r_CYCLEH", "r_INSTRH", "r_DECODH"):
+            return self.instret(pc) >> 32
+        if name in ("r_FLUSH", "r_FLUSHH", "r_WAIT", "r_WAITH"):
+            return 0
+
+        return self.csrs[name]
+
+    def csr_write(self, address, value, pc):
+        name = CSR_ADDRESSES.get(address)
+        if name is None:
+            raise Trap(2, 0, pc)
+
+        mask = self.masks[name]
+        self.csrs[name] = (value & mask) | (self.csrs[name] & ~mask)
+
+    # === Traps ===
+
+    def trap(self, trap):
+        """Enter the trap handler, and return its address."""
+        handler = self.csrs["r_MTVEC"] & ~3
+        if handler == 0:
+            raise Halt(f"{TRAPS.get(trap.cause, 'exception')} at 0x{trap.pc:08X}", trap.pc)
+
+        mstatus = self.csrs["r_MSTATUS"]
+        mpie = MSTATUS_MPIE if mstatus & MSTATUS_MIE else 0
+        self.csrs["r_MSTATUS"] = (mstatus & ~(MSTATUS_MIE | MSTATUS_MPIE)) | mpie | MSTATUS_MPP
+        self.csrs["r_MEPC"] = trap.pc & ~1
+        self.csrs["r_MCAUSE"] = trap.cause
+        self.csrs["r_MTVAL"] = trap.tval & 0xFFFFFFFF
+        return handler
+
+    def mret(self):
+        mstatus = self.csrs["r_MSTATUS"]
+        mie = MSTATUS_MIE if mstatus & MSTATUS_MPIE else 0
+        self.csrs["r_MSTATUS"] = (mstatus & ~MSTATUS_MIE) | mie | MSTATUS_MPIE
+        return self.csrs["r_MEPC"]
+
+    # === Translation ===
+
+    def translate(self, start):
+        """Translate the basic block starting at pc, into a Python function."""
+        lines = []
+        pc = start
+        end = None
+        idle = False
+
+        def traced(kind, target, value):
+            if self.trace is not None:
+                lines.append(f"w(R % ({ord(kind)}, {target}, {value}, {pc}))")
+
+        def branch(target, flags):
+            if self.branches is not None:
+                lines.append(f"b(B({pc}, {target}, {flags}))")
+
+        while True:
+            try:
+                instr = self.memory.fetch(pc)
+            except Trap:
+                # Only fault if this instruction is reached
+                if pc == start:
+                    raise
+                lines.append(f"return {pc}")
+                end = pc
+                break
+
+            name, rd, rs1, rs2, imm = self.decoder.decode(instr)
+            ops = {
+                "a": f"x[{rs1}]",
+                "b": f"x[{rs2}]",
+                "i": imm,
+                "s": imm ^ 0x80000000,
+                "shamt": rs2,
+                "pc": pc,
+                "pc_i": (pc + imm) & 0xFFFFFFFF,
+            }
+            nxt = (pc + 4) & 0xFFFFFFFF
+
+            if name is None:
+                lines.append(f"raise Trap(2, {instr}, {pc})")
+                break
+
+            elif name in WRITES:
+                if rd != 0:
+                    lines.append(f"x[{rd}] = " + WRITES[name].format(**ops))
+                    traced("x", rd, f"x[{rd}]")
+
+            elif name in LOADS:
+                load = LOADS[name].format(**ops)
+                lines.append(f"x[{rd}] = {load}" if rd != 0 else load)
+                if rd != 0:
+                    traced("x", rd, f"x[{rd}]")
+
+            elif name in STORES:
+                lines.append(STORES[name].format(**ops))
+
+            elif name in CSRS:
+                lines.append(f"t = {rs1}" if name.endswith("I") else f"t = x[{rs1}]")
+                lines.append(f"v = c.csr_read({imm}, {pc})")
+                # CSRRS(I) and CSRRC(I) don't write with a null source
+                if name in ("i_CSRRW", "i_CSRRWI") or rs1 != 0:
+                    lines.append(f"n = {CSRS[name]}")
+                    lines.append(f"c.csr_write({imm}, n, {pc})")
+                    traced("c", imm, "n")
+                # The CSR record comes before the register one (see tracediff.RECORD)
+                if rd != 0:
+                    lines.append(f"x[{rd}] = v")
+                    traced("x", rd, "v")
+
+            elif name in BRANCHES:
+                target = (pc + imm) & 0xFFFFFFFF
+                taken = f"c.misaligned({target}, {pc})" if target & 3 else target
+                if self.branches is not None:
+                    lines.append(f"t = {BRANCHES[name].format(**ops)}")
+                    branch(target, f"{BRANCH_CONDITIONAL} | t")
+                    lines.append(f"return {taken} if t else {nxt}")
+                else:
+                    lines.append(f"return {taken} if {BRANCHES[name].format(**ops)} else {nxt}")
+                break
+
+            elif name == "i_JAL":
+                target = (pc + imm) & 0xFFFFFFFF
+                if target & 3:
+                    lines.append(f"raise Trap(0, {target}, {pc})")
+                    break
+                if rd != 0:
+                    lines.append(f"x[{rd}] = {nxt}")
+                    traced("x", rd, nxt)
+                branch(target, BRANCH_TAKEN)
+                lines.append(f"return {target}")
+                idle = target == start == pc
+                break
+
+            elif name == "i_JALR":
+                lines.append(f"t = ({ops['a']} + {imm}) & 0xFFFFFFFE")
+                lines.append(f"if t & 3: raise Trap(0, t, {pc})")
+                if rd != 0:
+                    lines.append(f"x[{rd}] = {nxt}")
+                    traced("x", rd, nxt)
+                branch("t", BRANCH_TAKEN | BRANCH_INDIRECT)
+                lines.append("return t")
+                break
+
+            elif name == "i_ECALL":
+                lines.append(f"raise Trap(11, 0, {pc})")
+                break
+
+            elif name == "i_EBREAK":
+                lines.append(f"raise Trap(3, {pc}, {pc})")
+                break
+
+            elif name == "i_MRET":
+                lines.append("return c.mret()")
+                break
+
+            pc = nxt
+            if (pc - start) >> 2 >= BLOCK_SIZE:
+                lines.append(f"return {pc}")
+                end = pc
+                break
+
+        # Blocks ending on a control transfer include it, the others stop before pc
+        end = (pc + 4) & 0xFFFFFFFF if end is None else end
+
+        source = "def block(x, m, c):\n    " + "\n    ".join(lines) + "\n"
+        exec(compile(source, f"<block 0x{start:08X}>", "exec"), self.namespace)
+        return self.namespace["block"], (end - start) >> 2, idle
+
+    def misaligned(self, target, pc):
+        raise Trap(0, target, pc)
+
+    # === Execution ===
+
+    def run(self, max_instructions=1_000_000):
+        """
+        Run until a halt condition, and return its reason. The instructions budget is checked
+        between blocks, thus it may be exceeded by up to a block.
+        """
+        blocks = self.blocks
+        regs = self.regs
+        memory = self.memory
+        pc = self.pc
+
+        try:
+            while self.retired < max_instructions:
+                self.block_pc = pc
+                try:
+                    block = blocks.get(pc)
+                    if block is None:
+                        block = blocks[pc] = self.translate(pc)
+
+                    function, size, idle = block
+                    if idle:
+                        raise Halt(f"idle loop at 0x{pc:08X}", pc)
+
+                    pc = function(regs, memory, self)
+                    self.retired += size
+
+                except Trap as trap:
+                    self.retired += (trap.pc - self.block_pc) >> 2
+                    self.block_pc = trap.pc
+                    pc = self.trap(trap)
+
+            return "instructions budget reached"
+
+        except Halt as halt:
+            self.retired += (halt.pc - self.block_pc) >> 2
+            pc = halt.pc
+            return halt.reason
+
+        finally:
+            self.pc = self.block_pc = pc
+
+    def state(self):
+        """Return the architectural state : registers, CSRs, and the non-null RAM words."""
+        ram = self.memory.ram
+        words = {
+            f"0x{self.memory.ram_base + offset:08X}": value
+            for offset, (value,) in zip(range(0, len(ram), 4), U32.iter_unpack(ram))
+            if value != 0
+        }
+
+        return {
+            "pc": self.pc,
+            "instructions": self.retired,
+            "registers": list(self.regs),
+            "csrs": {
+                name[2:]: self.csr_read(address, self.pc) for address, name in CSR_ADDRESSES.items()
+            },
+            "ram": words,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a program (ELF or raw binary) on the RV32IM + Zicsr reference simulator",
+    )
+    parser.add_argument("program", help="ELF file, or raw binary loaded at the start of the ROM")
+    parser.add_argument(
+        "-n",
+        "--instructions",
+        type=lambda x: int(x, 0),
+        default=1_000_000,
+        help="Maximal number of instructions to execute (default: 1000000)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the final state as JSON")
+    parser.add_argument("--ram-dump", default=None, help="Write the final RAM as a raw binary")
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="Write the commit trace (registers and CSRs writes) to FILE, see tracediff.py",
+    )
+    parser.add_argument(
+        "--branches",
+        default=None,
+        help="Write the branch trace (conditional branches and jumps) to FILE, see bpsim.py",
+    )
+    parser.add_argument(
+        "--config",
+        default=INSTRUCTIONS_CONFIG,
+        help="Config file of the memory map and instructions fields",
+    )
+    args = parser.parse_args()
+
+    trace = open(args.trace, "wb", buffering=1 << 20) if args.trace is not None else None
+    branches = open(args.branches, "wb", buffering=1 << 20) if args.branches is not None else None
+    iss = Iss.from_file(args.program, args.config, trace, branches)
+
+    start = time.perf_counter()
+    try:
+        reason = iss.run(args.instructions)
+    finally:
+        for output in (trace, branches):
+            if output is not None:
+                output.close()
+    elapsed = time.perf_counter() - start
+
+    state = {"program": args.program, "halt": reason} | iss.state()
+
+    print(
+        f"Halted ({reason}) after {iss.retired} instructions, in {elapsed:.3f} s "
+        f"({iss.retired / elapsed / 1e6 if elapsed else 0:.2f} MIPS)",
+        file=sys.stderr,
+    )
+
+    if args.ram_dump is not None:
+        Path(args.ram_dump).write_bytes(iss.memory.ram)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(state, f, indent=4)
+    else:
+        json.dump(state, sys.stdout, indent=4)
+        print()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""
+Store the cycle counts measured by the testbenches into a local SQLite database, keyed by
+commit and configuration, and compare them against a baseline to catch latency regressions.
+
+The cycle counts are extracted from the logs by generate_report.py (the "This operation needed
+N cycles" messages), and aggregated per case (count, min, max, total).
+"""
+
+import argparse
+import datetime
+import hashlib
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+from generate_report import parse_file
+
+DEFAULT_DB = Path("logs") / "results.db"
+CONFIG_DIR = Path(__file__).parent.parent / "configs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS latency (
+    commit_id   TEXT NOT NULL,
+    config      TEXT NOT NULL,
+    target      TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    count       INTEGER NOT NULL,
+    min         INTEGER NOT NULL,
+    max         INTEGER NOT NULL,
+    total       INTEGER NOT NULL,
+    date        TEXT NOT NULL,
+    PRIMARY KEY (commit_id, config, target, name)
+)
+"""
+
+
+def open_db(path=DEFAULT_DB):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute(SCHEMA)
+    return db
+
+
+def current_commit():
+    """Return the current commit hash, suffixed by -dirty if the tree has local changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+    return commit + ("-dirty" if dirty else "")
+
+
+def config_hash(config_dir=CONFIG_DIR):
+    """Hash all of the configuration files (TOML, def and scripts)."""
+    digest = hashlib.sha256()
+    for file in sorted(Path(config_dir).rglob("*")):
+        if file.is_file() and file.suffix in (".toml", ".def", ".py"):
+            digest.update(str(file.relative_to(config_dir)).encode())
+            digest.update(file.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def case_cycles(parsed):
+    """Return the {case name: [count, min, max, total]} latencies of the parsed test cases."""
+    cycles = {}
+    for test in parsed:
+        if test.cycles[0] == 0:
+            continue
+
+        # Cases sharing a name are merged together
+        count, low, high, total = test.cycles
+        if test.name in cycles:
+            prev = cycles[test.name]
+            count, low, high, total = (
+                count + prev[0],
+                min(low, prev[1]),
+                max(high, prev[2]),
+                total + prev[3],
+            )
+        cycles[test.name] = [count, low, high, total]
+
+    return cycles
+
+
+def store(db, target, cycles, commit, config):
+    """Store the latencies of a target, as returned by case_cycles."""
+    date = datetime.datetime.now().isoformat(timespec="seconds")
+    rows = [(commit, config, target, name, *stats, date) for name, stats in cycles.items()]
+
+    db.executemany("INSERT OR REPLACE INTO latency VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    db.commit()
+    return len(rows)
+
+
+def latest_baseline(db, commit, config):
+    """Return the most recent commit stored for this config, other than the passed one."""
+    row = db.execute(
+        "SELECT commit_id FROM latency WHERE config = ? AND commit_id != ? "
+        "ORDER BY date DESC LIMIT 1",
+        (config, commit),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def compare(db, baseline, commit, config, tolerance=0.0):
+    """
+    Compare the latencies of a commit against a baseline. Return a list of
+    (target, case, metric, baseline value, current value) for each worse case.
+    """
+    rows = db.execute(
+        """
+        SELECT cur.target, cur.name,
+               base.max, cur.max,
+               CAST(base.total AS REAL) / base.count, CAST(cur.total AS REAL) / cur.count
+        FROM latency AS cur
+        JOIN latency AS base
+          ON base.target = cur.target AND base.name = cur.name AND base.config = cur.config
+        WHERE cur.commit_id = ? AND base.commit_id = ? AND cur.config = ?
+        ORDER BY cur.target, cur.name
+        """,
+        (commit, baseline, config),
+    ).fetchall()
+
+    regressions = []
+    for target, name, base_max, cur_max, base_mean, cur_mean in rows:
+        if cur_max > base_max * (1 + tolerance):
+            regressions.append((target, name, "max", base_max, cur_max))
+        if cur_mean > base_mean * (1 + tolerance):
+            regressions.append((target, name, "mean", base_mean, cur_mean))
+
+    return regressions
+
+
+def print_regressions(regressions, baseline):
+    if not regressions:
+        print(f"No latency regression against {baseline}")
+        return
+
+    print(f"Latency regressions against {baseline} :")
+    for target, name, metric, before, after in regressions:
+        print(f"    {target:10s} {name:24s} {metric:4s} : {before:.2f} -> {after:.2f} cycles")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Store the testbenches cycle counts, and compare them against a baseline",
+    )
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Database file (default: {DEFAULT_DB})")
+    parser.add_argument("--commit", default=None, help="Commit to use (default: current one)")
+    parser.add_argument("--config", default=None, help="Config key (default: hash of configs/)")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    store_parser = sub.add_parser("store", help="Store the cycle counts from a log file")
+    store_parser.add_argument("-f", "--file", required=True, help="Log file of the testbench")
+    store_parser.add_argument("-t", "--target", required=True, help="Name of the target")
+
+    compare_parser = sub.add_parser("compare", help="Compare the cycle counts to a baseline")
+    compare_parser.add_argument(
+        "-b",
+        "--baseline",
+        default=None,
+        help="Baseline commit (default: the latest stored commit for this config)",
+    )
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="Relative increase tolerated before flagging a case (default: 0.0)",
+    )
+
+    args = parser.parse_args()
+
+    db = open_db(args.db)
+    commit = args.commit or current_commit()
+    config = args.config or config_hash()
+
+    if args.command == "store":
+        parsed, _ = parse_file(args.file)
+        count = store(db, args.target, case_cycles(parsed), commit, config)
+        print(f"Stored {count} case(s) for {args.target} @ {commit}")
+        return 0
+
+    baseline = args.baseline or latest_baseline(db, commit, config)
+    if baseline is None:
+        print("No baseline available for this config")
+        return 0
+
+    regressions = compare(db, baseline, commit, config, args.tolerance)
+    print_regressions(regressions, baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
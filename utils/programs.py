@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+"""
+Programs regression : build the rv32 model once, run every program of tests/ on it, and check
+the end-of-run state they declare into their test.toml.
+
+    ./utils/programs.py
+    ./utils/programs.py test1 test3 --cycles 5000
+
+The model reads its memory images when it starts (build/rom.mif and build/ram.mif, relative to
+its working directory), thus a single binary runs all of the programs. Each program gets its
+own folder, build/programs/<test>/ : a copy of the test, its build, its images, and the outputs
+of its run (run.log, state.txt and simout/). The programs are built and run concurrently.
+
+The runs start from the post-boot checkpoint of the model (see checkpoint.py), saved once per
+model build, with the memories of their program. --from-reset runs the whole boot instead.
+
+The expectations are declared into an optional [expect] section of the test.toml :
+
+    [expect]
+    cycles = 2000                                   # simulated cycles (default: --cycles)
+    registers = { x3 = 12, a0 = 0x2D }              # x0 to x31, or their ABI names
+    memory = { 0x2000_0000 = 0xDEADBEEF }           # RAM words, as seen on the data bus
+
+The final registers and the words written by the core are dumped by the program runner
+(testbench/src/tests/tester.cpp, +dump=FILE), the other RAM words keep their initial value.
+"""
+
+import argparse
+import array
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import checkpoint
+from bench import COUNTER, COUNTERS, TESTS_DIR, discover, metrics
+from bin2mif import (
+    elf_to_images,
+    load_memory_map,
+    memory_depth,
+    to_words,
+    window_offset,
+    write_image,
+    write_words,
+)
+from generate_report import sanitize
+
+PROGRAMS_DIR = Path("build") / "programs"
+MODEL_DIR = Path("build") / "tester"
+MODEL = MODEL_DIR / "Vrv32"
+
+# Depth of the ROM image, as built by the Makefile (INIT_ROM)
+ROM_DEPTH = 1024
+
+WORD_MASK = 0xFFFF_FFFF
+
+ABI_NAMES = (
+    ["zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1"]
+    + [f"a{k}" for k in range(8)]
+    + [f"s{k}" for k in range(2, 12)]
+    + [f"t{k}" for k in range(3, 7)]
+)
+REGISTERS = {name: index for index, name in enumerate(ABI_NAMES)}
+REGISTERS |= {f"x{index}": index for index in range(32)} | {"fp": 8}
+
+
+def load_expect(program, tests_dir=TESTS_DIR):
+    """Return the [expect] section of a program test.toml (empty if none)."""
+    with open(Path(tests_dir) / program / "test.toml", "rb") as f:
+        return tomllib.load(f).get("expect", {})
+
+
+def build_model(jobs, make="make"):
+    """Build the program runner model, and return its make output (None if it succeeded)."""
+    process = subprocess.run(
+        [make, "tester", f"MDIR={MODEL_DIR}/", f"SUBMAKE_JOBS=-j{jobs}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    return None if process.returncode == 0 else process.stdout
+
+
+def build_program(program, folder, make="make", tests_dir=TESTS_DIR, ram_fill=0):
+    """
+    Build a program into its folder, and write its memory images (as MIF files for the runs from
+    reset, and raw words for the restored ones). The ROM holds the program, the RAM is filled,
+    then its .data (if any) is placed. Return the initial RAM words.
+    """
+    shutil.rmtree(folder, ignore_errors=True)
+    shutil.copytree(Path(tests_dir) / program, folder)
+
+    process = subprocess.run(
+        [make, "all"],
+        cwd=folder,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    (folder / "build.log").write_text(process.stdout)
+    if process.returncode != 0:
+        raise RuntimeError(f"build failed, see {folder / 'build.log'}")
+
+    rom, ram = elf_to_images(folder / "program.elf")
+
+    depth = memory_depth("ram")
+    data = to_words(ram, depth=depth)
+    words = array.array(data.typecode, [ram_fill & WORD_MASK]) * depth
+    words[: len(data)] = data
+
+    (folder / "build").mkdir()
+    (folder / "simout").mkdir()
+    write_image(rom, folder / "build" / "rom.mif", 32, ROM_DEPTH, fmt="mif")
+    write_words(words, folder / "build" / "ram.mif", 32, depth, "mif")
+    write_image(rom, folder / "build" / "rom.bin", 32, ROM_DEPTH, fmt="raw")
+    write_words(words, folder / "build" / "ram.bin", 32, depth, "raw")
+
+    return words
+
+
+def load_state(path):
+    """Read a +dump file : the 32 registers, and {address: (value, mask)} of the written words."""
+    registers = [0] * 32
+    stores = {}
+    with open(path, "r") as f:
+        for line in f:
+            kind, *fields = line.split()
+            if kind == "x":
+                registers[int(fields[0])] = int(fields[1], 16)
+            elif kind == "m":
+                stores[int(fields[0], 16)] = (int(fields[1], 16), int(fields[2], 16))
+
+    return registers, stores
+
+
+def final_memory(initial, stores, window):
+    """Return a lookup of the final RAM words, by address (None if outside of the RAM)."""
+    written = {}
+    for address, (value, mask) in stores.items():
+        offset = window_offset(address, window)
+        if offset is not None:
+            written[offset // 4] = (value, mask)
+
+    def read(address):
+        offset = window_offset(address, window)
+        if offset is None or offset // 4 >= len(initial):
+            return None
+        value, mask = written.get(offset // 4, (0, 0))
+        return (initial[offset // 4] & ~mask) | value
+
+    return read
+
+
+def check(expect, registers, read):
+    """Compare the final state to the expectations, and describe each mismatch."""
+    failures = []
+
+    for name, value in expect.get("registers", {}).items():
+        index = REGISTERS.get(name.lower())
+        if index is None:
+            failures.append(f"{name} : unknown register")
+        elif registers[index] != value & WORD_MASK:
+            failures.append(
+                f"{name} : expected 0x{value & WORD_MASK:08X}, got 0x{registers[index]:08X}"
+            )
+
+    for key, value in expect.get("memory", {}).items():
+        actual = read(int(key, 0))
+        if actual is None:
+            failures.append(f"[{key}] : outside of the RAM")
+        elif actual != value & WORD_MASK:
+            failures.append(f"[{key}] : expected 0x{value & WORD_MASK:08X}, got 0x{actual:08X}")
+
+    return failures
+
+
+def run_program(program, model, cycles, window, make="make", tests_dir=TESTS_DIR, ram_fill=0):
+    """
+    Build, run and check a program. The model (and its checkpoint) is waited for, since it's built
+    concurrently.
+    """
+    folder = PROGRAMS_DIR / program
+    result = {"status": "fail", "failures": [], "counters": None}
+
+    try:
+        expect = load_expect(program, tests_dir)
+        initial = build_program(program, folder, make, tests_dir, ram_fill)
+    except (OSError, RuntimeError, ValueError) as e:
+        result["status"] = "build"
+        result["failures"].append(str(e))
+        return result
+
+    if model.result() is None:
+        result["status"] = "model"
+        return result
+
+    binary, boot = model.result()
+    command = [binary, f"+cycles={expect.get('cycles', cycles)}", "+dump=state.txt"]
+    if boot is not None:
+        command += [f"+restore={boot}", "+rom=build/rom.bin", "+ram=build/ram.bin"]
+
+    process = subprocess.run(
+        command,
+        cwd=folder,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    (folder / "run.log").write_text(process.stdout)
+
+    counters = {}
+    for line in process.stdout.splitlines():
+        match = COUNTER.search(sanitize(line))
+        if match is not None:
+            counters[match.group(1)] = int(match.group(2))
+
+    if any(name not in counters for name in COUNTERS) or not (folder / "state.txt").exists():
+        result["failures"].append(f"no final state, see {folder / 'run.log'}")
+        return result
+
+    result["counters"] = counters | metrics(counters)
+
+    registers, stores = load_state(folder / "state.txt")
+    result["failures"] = check(expect, registers, final_memory(initial, stores, window))
+    result["status"] = "fail" if result["failures"] else ("pass" if expect else "run")
+    return result
+
+
+def print_results(results):
+    marks = {"pass": "✅", "run": "➖", "fail": "❌", "build": "❌", "model": "❌", "skipped": "⚠️"}
+
+    print(f"   {'Program':10s} {'Status':>7s} {'Cycles':>10s} {'Instret':>10s} {'CPI':>7s}")
+    for program, result in results.items():
+        line = f"{marks[result['status']]} {program:10s} {result['status']:>7s}"
+
+        counters = result["counters"]
+        if counters is not None:
+            cpi = "-" if counters["cpi"] is None else f"{counters['cpi']:7.3f}"
+            line += f" {counters['cycles']:10d} {counters['instret']:10d} {cpi:>7s}"
+
+        print(line)
+        for failure in result["failures"]:
+            print(f"        {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the tests/ programs on a single rv32 model, and check their final state",
+    )
+    parser.add_argument(
+        "programs",
+        nargs="*",
+        help="Programs to run (default: all of the buildable ones in tests/)",
+    )
+    parser.add_argument(
+        "-c",
+        "--cycles",
+        type=int,
+        default=1000,
+        help="Cycles simulated per program, unless set by its [expect] (default: 1000)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of programs built and run at once, and of model compilation jobs",
+    )
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Use an already built program runner, rather than building it",
+    )
+    parser.add_argument(
+        "--from-reset",
+        action="store_true",
+        help="Run the boot of each program, rather than restoring the post-boot checkpoint",
+    )
+    parser.add_argument(
+        "--ram-fill",
+        type=lambda text: int(text, 0),
+        default=0,
+        help="Initial value of the RAM words (default: 0)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to FILE")
+    parser.add_argument("--make", default=os.environ.get("MAKE", "make"), help="Make command")
+    args = parser.parse_args()
+
+    programs, skipped = (args.programs, {}) if args.programs else discover()
+    window = load_memory_map()[1]
+    PROGRAMS_DIR.mkdir(parents=True, exist_ok=True)
+
+    def model_task():
+        binary = MODEL.resolve() if args.model is None else Path(args.model).resolve()
+
+        output = None if args.model is not None else build_model(args.jobs, args.make)
+        if output is not None:
+            print(output, end="")
+            print(f"❌ Failed to build the model ({MODEL})", flush=True)
+            return None
+
+        if args.from_reset:
+            return binary, None
+
+        try:
+            return binary, checkpoint.ensure(binary).resolve()
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️ No checkpoint, the programs run from reset ({e})", flush=True)
+            return binary, None
+
+    print(f"🔧 Running {len(programs)} programs ({args.jobs} jobs) ...", flush=True)
+
+    # The model (and its checkpoint) builds while the programs do, then each program runs as soon
+    # as it's ready
+    with ThreadPoolExecutor(max_workers=1) as builder:
+        model = builder.submit(model_task)
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            runs = [
+                pool.submit(
+                    run_program,
+                    program,
+                    model,
+                    args.cycles,
+                    window,
+                    args.make,
+                    TESTS_DIR,
+                    args.ram_fill,
+                )
+                for program in programs
+            ]
+            results = {program: run.result() for program, run in zip(programs, runs)}
+
+    # The programs which can't be built are listed too, without failing the regression
+    for program, reason in skipped.items():
+        results[program] = {"status": "skipped", "failures": [reason], "counters": None}
+
+    print()
+    print_results(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\n📄 Results written to: {args.output}")
+
+    passed = ("pass", "run", "skipped")
+    return 0 if all(result["status"] in passed for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
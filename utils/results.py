@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Aggregate the binary results streams of the testbenchs (+results=FILE, see testbench.h), into
+the same reports as generate_report.py, without any console parsing.
+
+    ./build/targets/alu1/Valu1 +results=logs/alu1.res +quiet
+    ./utils/results.py logs/alu1.res -o logs/reports/alu1.md
+
+The stream is made of fixed-size records (one per check), and the names of the cases and checks
+are written once, into the FILE.names sidecar. The records are loaded as a single NumPy array,
+and counted per (case, check) by a single np.unique.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from generate_report import print_report, test_case, write_report, write_stat
+
+# Testbench::record layout (TestbenchRecord)
+RECORD_DTYPE = np.dtype(
+    [
+        ("time", "<u8"),
+        ("cycle", "<u8"),
+        ("case", "<u4"),
+        ("check", "<u2"),
+        ("failed", "u1"),
+        ("reserved", "u1"),
+    ]
+)
+assert RECORD_DTYPE.itemsize == 24
+
+
+def load_names(path):
+    """Read the names sidecar of a results stream, as {"case": [...], "check": [...]}."""
+    names = {"case": [], "check": []}
+    with open(f"{path}.names", "r", errors="replace") as f:
+        for line in f:
+            kind, index, name = line.rstrip("\n").split(" ", 2)
+            ids = names[kind]
+            ids.extend([None] * (int(index) + 1 - len(ids)))
+            ids[int(index)] = name
+
+    return names
+
+
+def load_records(path):
+    """
+    Load the records of a results stream. A truncated last record (a testbench which crashed
+    while writing) is dropped.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    usable = len(data) - len(data) % RECORD_DTYPE.itemsize
+    return data[:usable].view(RECORD_DTYPE)
+
+
+def aggregate(records, names):
+    """
+    Count the passed and failed checks, per case and check, in the order of their first
+    appearance. Return the test cases and the totals, as generate_report.parse does.
+    """
+    keys = (records["case"].astype(np.uint64) << 16) | records["check"]
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    failed = np.bincount(inverse, weights=records["failed"], minlength=len(unique))
+    total = np.bincount(inverse, minlength=len(unique))
+
+    # The cases are listed in their ids order (their first appearance), as the default one
+    cases = [test_case(name=name.lower()) for name in names["case"]] or [test_case()]
+    for k in np.argsort(first, kind="stable").tolist():
+        case = cases[int(unique[k] >> 16)]
+        check = names["check"][int(unique[k] & 0xFFFF)].strip().lower()
+        counts = case.data.setdefault(check, [0, 0])
+        counts[0] += int(total[k] - failed[k])
+        counts[1] += int(failed[k])
+
+    fails = int(records["failed"].sum())
+    return cases, [len(records) - fails, fails]
+
+
+def failures(records, names, count):
+    """Describe the first failed checks : case, check, cycle and simulation time."""
+    lines = []
+    for record in records[records["failed"] != 0][:count]:
+        case = names["case"][record["case"]]
+        check = names["check"][record["check"]]
+        lines.append(f"{case} / {check} : cycle {record['cycle']} @ {record['time']}")
+    return lines
+
+
+def parse_file(path):
+    """Load and aggregate a results stream. Defined at the module level, for the process pool."""
+    names = load_names(path)
+    records = load_records(path)
+    return aggregate(records, names)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aggregate the binary results streams of the testbenchs (+results=FILE)",
+    )
+    parser.add_argument("files", nargs="+", help="Results streams. Several are read in parallel")
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        default="CONSOLE",
+        help="Markdown report (with its .stat), or a folder with several streams "
+        "(default: CONSOLE)",
+    )
+    parser.add_argument(
+        "--failures",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Print the N first failed checks of each stream",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes used to read several streams (default: cpu count)",
+    )
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(args.files)))) as executor:
+        results = list(executor.map(parse_file, args.files))
+
+    failed = False
+    for source, (cases, totals) in zip(args.files, results):
+        failed |= totals[1] != 0
+        print(f"{source} : {totals[0]} passed, {totals[1]} failed")
+
+        if args.failures and totals[1]:
+            for line in failures(load_records(source), load_names(source), args.failures):
+                print(f"    {line}")
+
+        if args.output == "CONSOLE":
+            print_report(cases)
+            continue
+
+        output = args.output
+        if len(results) > 1:
+            os.makedirs(args.output, exist_ok=True)
+            output = os.path.join(args.output, Path(source).stem + ".md")
+
+        write_report(cases, output)
+        write_stat(totals, os.path.splitext(output)[0] + ".stat")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
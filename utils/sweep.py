@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+"""
+Sweep a grid of configuration parameters, and report the cycles measured at each point.
+
+    ./utils/sweep.py -p max_shift_per_cycle=1,3,6 -p if_latency=1,2 -t shift alu1 -r test2
+
+Each point of the grid gets its own tree, into build/sweep/<point>/ : a copy of configs/ with
+the swept values, its own build/, logs/ and simout/ folders, and links to the shared sources
+(rtl/, testbench/, tests/, utils/, Makefile...). The derived keys of each point are computed by
+the config scripts, in dependency order (see conf2header.load_folder).
+
+The points are then built and run in parallel, under a single jobserver (see tests.py) : the
+unit-tests targets report the cycles of their cases, and the programs their CPI (see bench.py).
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import latency_db
+from bench import metrics, run_program
+from conf2header import load_folder
+from def2header import write_if_changed
+from generate import find_folders
+from generate_report import report_parser
+from tests import Jobserver
+
+ROOT = Path(__file__).parent.parent
+SWEEP_DIR = Path("build") / "sweep"
+
+# Folders owned by each point, everything else in the repository is linked
+PRIVATE = {".git", "build", "configs", "logs", "simout"}
+
+# Make arguments of the builds, to share the jobserver and the Verilator runtime of the repository
+MAKE_ARGS = [
+    "VERILATOR_JOBS=1",
+    "SUBMAKE_JOBS=",
+    f"RUNTIME_BASE={(ROOT / 'build' / 'verilated').resolve()}/",
+]
+
+
+def parse_parameter(text):
+    """Parse a "key=value,value,..." grid axis."""
+    key, _, values = text.partition("=")
+    try:
+        return key.strip(), [int(value, 0) for value in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected key=value,value,..., got {text}")
+
+
+def key_pattern(key):
+    """Match the definition line of a key, keeping its trailing comment apart."""
+    return re.compile(rf"^(\s*{re.escape(key)}\s*=\s*)([^#\n]*?)(\s*(?:#.*)?)$", re.MULTILINE)
+
+
+def find_key(config_dir, key):
+    """Return the TOML file defining a key. Derived keys (from the scripts) can't be swept."""
+    for toml_file in sorted(Path(config_dir).rglob("*.toml")):
+        if key_pattern(key).search(toml_file.read_text()):
+            return toml_file
+
+    raise KeyError(f"{key} isn't defined by any TOML file of {config_dir}")
+
+
+def set_value(toml_file, key, value):
+    text = toml_file.read_text()
+    write_if_changed(toml_file, key_pattern(key).sub(rf"\g<1>{value}\g<3>", text, count=1))
+
+
+def point_name(point):
+    return "_".join(f"{key}-{value}" for key, value in point.items())
+
+
+def make_tree(point, locations):
+    """Create (or update) the tree of a point, with its own configs/ holding the swept values."""
+    tree = SWEEP_DIR / point_name(point)
+    tree.mkdir(parents=True, exist_ok=True)
+
+    for entry in ROOT.iterdir():
+        link = tree / entry.name
+        if entry.name not in PRIVATE and not link.exists():
+            link.symlink_to(entry.resolve())
+
+    # The unchanged files keep their timestamp, thus only the impacted headers are regenerated
+    configs = tree / "configs"
+    for source in sorted((ROOT / "configs").rglob("*")):
+        if source.is_dir() or "__pycache__" in source.parts:
+            continue
+        target = configs / source.relative_to(ROOT / "configs")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_if_changed(target, source.read_text())
+
+    for key, value in point.items():
+        set_value(configs / locations[key].relative_to(ROOT / "configs"), key, value)
+
+    for folder in ("build", "logs", "simout"):
+        (tree / folder).mkdir(exist_ok=True)
+
+    return tree
+
+
+def derive(tree):
+    """Compute the flattened keys of a point, as the generated packages will hold them."""
+    keys = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for folder in find_folders(tree / "configs"):
+            keys |= load_folder(folder)[0]
+    return keys
+
+
+def run_target(tree, target, jobserver, make="make"):
+    """Build and run a unit-tests target of a point, and return its cycles and results."""
+    parser = report_parser()
+
+    token = jobserver.acquire()
+    try:
+        with open(tree / "logs" / f"{target}.ans", "w") as log:
+            with subprocess.Popen(
+                [make, f"TOP={target}", f"MDIR=build/targets/{target}/", *MAKE_ARGS],
+                cwd=tree,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                errors="replace",
+                env=jobserver.env(),
+                pass_fds=jobserver.fds(),
+            ) as process:
+                for line in process.stdout:
+                    log.write(line)
+                    parser.feed(line)
+    finally:
+        jobserver.release(token)
+
+    cases = latency_db.case_cycles(parser.test_cases)
+    passed, failed = parser.totals
+    return {
+        "cycles": sum(total for _, _, _, total in cases.values()),
+        "pass": passed,
+        "fail": failed,
+        "cases": cases,
+    }
+
+
+def run_point(point, tree, targets, programs, cycles, jobserver, make="make"):
+    """Run all of the benchmarks of a point, one after the other (they share its build/)."""
+    result = {"point": point, "targets": {}, "programs": {}}
+
+    for target in targets:
+        result["targets"][target] = run_target(tree, target, jobserver, make)
+
+    for program in programs:
+        token = jobserver.acquire()
+        try:
+            counters = run_program(program, cycles, make, tree, MAKE_ARGS, jobserver)
+        finally:
+            jobserver.release(token)
+        result["programs"][program] = None if counters is None else counters | metrics(counters)
+
+    print(f"✅ {point_name(point)} done", flush=True)
+    return result
+
+
+def table(results, derived):
+    """Build the rows of the results table : parameters, derived keys, then the benchmarks."""
+    header = list(results[0]["point"]) + derived
+    header += [f"{target} cycles" for target in results[0]["targets"]]
+    header += [f"{program} CPI" for program in results[0]["programs"]]
+
+    rows = []
+    for result in results:
+        row = list(result["point"].values()) + [result["config"][key] for key in derived]
+        for target in result["targets"].values():
+            row.append(target["cycles"] if target["pass"] + target["fail"] else None)
+        for program in result["programs"].values():
+            row.append(None if program is None or program["cpi"] is None else program["cpi"])
+        rows.append(row)
+
+    return header, rows
+
+
+def cell(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_table(header, rows):
+    widths = [max(len(cell(value)) for value in column) for column in zip(header, *rows)]
+    print("  ".join(f"{name:>{width}s}" for name, width in zip(header, widths)))
+    for row in rows:
+        print("  ".join(f"{cell(value):>{width}s}" for value, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep a grid of configuration parameters, and report the measured cycles",
+    )
+    parser.add_argument(
+        "-p",
+        "--parameter",
+        action="append",
+        type=parse_parameter,
+        required=True,
+        metavar="KEY=V1,V2,...",
+        help="Grid axis, as a TOML key and its values (may be repeated)",
+    )
+    parser.add_argument(
+        "-t", "--targets", nargs="*", default=[], help="Unit-tests targets to run at each point"
+    )
+    parser.add_argument(
+        "-r", "--programs", nargs="*", default=[], help="tests/ programs to run at each point"
+    )
+    parser.add_argument(
+        "-c",
+        "--cycles",
+        type=int,
+        default=1000,
+        help="Number of cycles to simulate per program (default: 1000)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Maximal number of jobs (verilator and compilations) for the whole sweep",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to FILE")
+    parser.add_argument("--make", default=os.environ.get("MAKE", "make"), help="Make command")
+    parser.add_argument("--csv", default=None, help="Write the results table as CSV to FILE")
+    args = parser.parse_args()
+
+    axes = dict(args.parameter)
+    try:
+        locations = {key: find_key(ROOT / "configs", key) for key in axes}
+    except KeyError as e:
+        parser.error(e.args[0])
+
+    # The points whose scripts fail (out of range values...) are skipped
+    points, trees, configs = [], [], []
+    for values in itertools.product(*axes.values()):
+        point = dict(zip(axes, values))
+        tree = make_tree(point, locations)
+        try:
+            configs.append(derive(tree))
+        except Exception as e:
+            print(f"❌ {point_name(point)} : invalid configuration ({e!r})")
+            continue
+        points.append(point)
+        trees.append(tree)
+
+    if not points:
+        return 1
+
+    print(f"🔧 {len(points)} points, into {SWEEP_DIR}/ ({args.jobs} jobs)", flush=True)
+
+    # The Verilator runtime is shared by all of the points, thus built once, before them
+    subprocess.run(
+        [args.make, "runtime", f"SUBMAKE_JOBS=-j{args.jobs}"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    jobserver = Jobserver(args.jobs)
+    with ThreadPoolExecutor(max_workers=min(len(points), args.jobs)) as pool:
+        results = list(
+            pool.map(
+                lambda job: run_point(
+                    *job, args.targets, args.programs, args.cycles, jobserver, args.make
+                ),
+                zip(points, trees),
+            )
+        )
+
+    for result, config in zip(results, configs):
+        result["config"] = config
+
+    # The derived keys impacted by the swept parameters
+    derived = sorted(
+        key
+        for key in configs[0]
+        if key not in axes and any(config.get(key) != configs[0][key] for config in configs)
+    )
+
+    header, rows = table(results, derived)
+    print()
+    print_table(header, rows)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\n📄 Results written to: {args.output}")
+
+    if args.csv is not None:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"📄 Table written to: {args.csv}")
+
+    failed = any(
+        target["fail"] or not target["pass"]
+        for result in results
+        for target in result["targets"].values()
+    )
+    missing = any(program is None for result in results for program in result["programs"].values())
+    return 1 if failed or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
+import argparse
+import glob
+import hashlib
+import json
 import os
 import subprocess
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import time 
+import time
+
+from generate_report import report_parser, write_report
+import latency_db
 
 # === CONFIG ===
 targets = [
@@ -31,37 +38,148 @@ targets = [
 log_dir = "logs"
 report_dir = os.path.join(log_dir, "reports")
 summary_file = os.path.join(report_dir, "_summary.md")
+build_dir = os.path.join("build", "targets")
+cache_dir = os.path.join(log_dir, "cache")
+
+# Files that always impact the result of a target (flags, shared headers, generated files...)
+common_inputs = [
+    "Makefile",
+    "verilatorcfg.vlt",
+    "testbench/include/*.h",
+    "build/*.h",
+    "build/*.svh",
+    "build/*.sv",
+]
 
 os.makedirs(report_dir, exist_ok=True)
 
 
-def run_target(target: str):
-    """Build target, generate report, and parse .stat file."""
-    log_file = os.path.join(log_dir, f"{target}.ans")
-    report_file = os.path.join(report_dir, f"{target}.md")
-    stat_file = os.path.join(report_dir, f"{target}.stat")
+class Jobserver:
+    """
+    A GNU make jobserver, shared by all of the targets builds.
 
-    # Run Verilator build
-    with open(log_file, "w") as f:
-        subprocess.run(["make", f"TOP={target}"], stdout=f, stderr=subprocess.STDOUT)
+    The pipe is filled with one token per allowed job. The runner take a token before starting
+    a target (the implicit token of its make), and any sub-make then request additional tokens
+    from the same pipe. Thus, the whole regression never run more than [jobs] jobs at once.
+    """
 
-    # Generate the Markdown report
-    subprocess.run(
-        ["./utils/generate_report.py", "-m", "FILE", "-f", log_file, "-o", report_file],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    def __init__(self, jobs: int):
+        self.jobs = jobs
+        self.read_fd, self.write_fd = os.pipe()
+        os.write(self.write_fd, b"+" * jobs)
+
+    def acquire(self) -> bytes:
+        return os.read(self.read_fd, 1)
+
+    def release(self, token: bytes):
+        os.write(self.write_fd, token)
+
+    def env(self) -> dict:
+        env = dict(os.environ)
+        env["MAKEFLAGS"] = f"-j{self.jobs} --jobserver-auth={self.read_fd},{self.write_fd}"
+        return env
+
+    def fds(self) -> tuple:
+        return (self.read_fd, self.write_fd)
+
+
+def make_target(target: str, jobserver: Jobserver, on_line):
+    """
+    Build and run a target into its own build directory, under the shared jobserver.
+    The output is streamed, line by line, to on_line while the target is running.
+    """
+    mdir = os.path.join(build_dir, target) + "/"
+
+    token = jobserver.acquire()
+    try:
+        with subprocess.Popen(
+            [
+                "make",
+                f"TOP={target}",
+                f"MDIR={mdir}",
+                "VERILATOR_JOBS=1",
+                "SUBMAKE_JOBS=",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            env=jobserver.env(),
+            pass_fds=jobserver.fds(),
+        ) as process:
+            for line in process.stdout:
+                on_line(line)
+    finally:
+        jobserver.release(token)
+
+
+def target_inputs(target: str) -> list[str]:
+    """
+    List the files a target depends on. The RTL files are fetched from the dependency file
+    written by verilator on the previous build, or, if not existing, from the whole rtl/ folder.
+    """
+    files = set()
+    for pattern in common_inputs + [f"testbench/src/**/tb_{target}.cpp"]:
+        files.update(glob.glob(pattern, recursive=True))
+
+    depfile = os.path.join(build_dir, target, f"V{target}__ver.d")
+    if os.path.exists(depfile):
+        with open(depfile) as f:
+            deps = f.read().replace("\\\n", " ").split(":", 1)[-1].split()
+        files.update(dep for dep in deps if os.path.abspath(dep).startswith(os.getcwd()))
+    else:
+        files.update(glob.glob("rtl/**/*.*v", recursive=True))
+
+    return sorted(files)
+
+
+def target_key(target: str, salt: str) -> str | None:
+    """Hash all of the inputs of a target. Return None if one of them is missing."""
+    digest = hashlib.sha256(salt.encode())
+    for file in target_inputs(target):
+        try:
+            with open(file, "rb") as f:
+                digest.update(file.encode())
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            return None
+    return digest.hexdigest()
+
+
+def load_cached(target: str, key: str) -> dict | None:
+    """Return the cached result of a target, if its key match."""
+    cache_file = os.path.join(cache_dir, f"{target}.json")
+    if key is None or not os.path.exists(cache_file):
+        return None
+
+    with open(cache_file) as f:
+        cached = json.load(f)
+
+    return cached if cached["key"] == key else None
+
+
+def store_cached(target: str, key: str, stats: dict, cycles: dict, report_file: str):
+    """Save the result of a target, with its report and latencies."""
+    report = ""
+    if os.path.exists(report_file):
+        with open(report_file) as f:
+            report = f.read()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{target}.json"), "w") as f:
+        json.dump({"key": key, "stats": stats, "cycles": cycles, "report": report}, f)
 
-    # Parse .stat file (if available)
-    stats = {"pass": 0, "fail": 0, "percent": 0.0}
-    if os.path.exists(stat_file):
-        with open(stat_file) as f:
-            for line in f:
-                k, v = line.strip().split("=")
-                stats[k] = float(v)
-        os.remove(stat_file)
 
-    # Compute status
+def tool_salt() -> str:
+    """Identify the tools version, which also impact the results."""
+    try:
+        return subprocess.run(["verilator", "--version"], capture_output=True, text=True).stdout
+    except OSError:
+        return ""
+
+
+def result(target: str, stats: dict):
+    """Compute the status of a target."""
     status = "PASS" if stats["fail"] == 0 else "FAIL"
     return (
         target,
@@ -72,7 +190,78 @@ def run_target(target: str):
     )
 
 
+def run_target(target: str, jobserver: Jobserver, salt: str, use_cache: bool = True):
+    """Build target, and parse its output while it run, to generate the report."""
+    log_file = os.path.join(log_dir, f"{target}.ans")
+    report_file = os.path.join(report_dir, f"{target}.md")
+
+    # Look for a previous result, with the exact same inputs
+    key = target_key(target, salt)
+    cached = load_cached(target, key) if use_cache else None
+    if cached is not None:
+        with open(report_file, "w") as f:
+            f.write(cached["report"])
+        return result(target, cached["stats"]) + (True, cached.get("cycles", {}))
+
+    # Run Verilator build, and parse the output on the fly. The log is still kept, for humans.
+    parser = report_parser()
+
+    with open(log_file, "w") as f:
+
+        def on_line(line):
+            f.write(line)
+            if parser.feed(line) == "FAIL" and parser.totals[1] == 1:
+                print(f"⚠️  {target:10s} → first failure detected, still running ...", flush=True)
+
+        make_target(target, jobserver, on_line)
+
+    # Generate the Markdown report
+    write_report(parser.test_cases, report_file)
+
+    passed, failed = parser.totals
+    stats = {
+        "pass": passed,
+        "fail": failed,
+        "percent": (passed / (passed + failed)) * 100 if passed + failed else 0.0,
+    }
+
+    # Only store results of targets that actually ran (build errors shall be retried). The key
+    # is computed again, since the verilator dependency file may have been created.
+    cycles = latency_db.case_cycles(parser.test_cases)
+    if stats["pass"] + stats["fail"] > 0:
+        store_cached(target, target_key(target, salt), stats, cycles, report_file)
+
+    return result(target, stats) + (False, cycles)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Build and run all of the unit-tests targets")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Maximal number of jobs (verilator and compilations) for the whole regression",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        nargs="*",
+        metavar="TARGET",
+        default=None,
+        help="Ignore the cached results of these targets (or all of them, if none are passed)",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        default=None,
+        metavar="COMMIT",
+        help="Compare the measured latencies against this commit (default: latest stored one)",
+    )
+    args = parser.parse_args()
+
+    # Targets to be rerun, regardless of the cache
+    forced = set(targets) if args.force == [] else set(args.force or [])
 
     start = time.time()
     print(f"🔧 Preparing the build files ...")
@@ -82,20 +271,36 @@ def main():
         stderr=subprocess.DEVNULL,
     )
 
-    print(f"🔧 Running Verilator builds in parallel ({os.cpu_count()} threads)...\n")
+    # The Verilator runtime is shared by all of the targets : built once, before them
+    print(f"🔧 Building the Verilator runtime ...")
+    subprocess.run(
+        ["make", "runtime", f"SUBMAKE_JOBS=-j{args.jobs}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    print(f"🔧 Running Verilator builds in parallel ({args.jobs} jobs)...\n")
+
+    jobserver = Jobserver(args.jobs)
+    salt = tool_salt()
 
     results = []
-    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-        for res in executor.map(run_target, targets):
-            target, status, passed, failed, percent = res
+    latencies = {}
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for res in executor.map(
+            lambda target: run_target(target, jobserver, salt, target not in forced), targets
+        ):
+            target, status, passed, failed, percent, cached, cycles = res
+            latencies[target] = cycles
             emoji = "✅" if status == "PASS" and passed != 0 else "❌"
             msg = (
                 " : No tests detected, perhaps check for build errors ?"
                 if passed == 0 and failed == 0
                 else ""
             )
+            msg += " (cached)" if cached else ""
             print(f"{emoji} {target:10s} → {status:4s} ({percent:.2f}%){msg}")
-            results.append(res)
+            results.append(res[:5])
 
     # === Generate global summary ===
     total_pass = sum(r[2] for r in results)
@@ -117,6 +322,18 @@ def main():
         f.write(f"**Average success:** {avg_percent:.2f}%  \n")
         f.write(f"\n*Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
 
+    # === Store the latencies, and look for regressions ===
+    db = latency_db.open_db()
+    commit = latency_db.current_commit()
+    config = latency_db.config_hash()
+    for target, cycles in latencies.items():
+        latency_db.store(db, target, cycles, commit, config)
+
+    baseline = args.baseline or latency_db.latest_baseline(db, commit, config)
+    if baseline is not None:
+        print()
+        latency_db.print_regressions(latency_db.compare(db, baseline, commit, config), baseline)
+
     stop = time.time()
     print(f"\n📄 Summary written to: {summary_file}")
     print(f"📁 Reports directory: {report_dir}")
@@ -124,7 +341,9 @@ def main():
     print(f"Total passed: {total_pass}")
     print(f"Total failed: {total_fail}")
     print(f"Average success: {avg_percent:.2f}%")
-    print(f"Duration: {((stop - start) * 1000 if (stop - start) < 1 else (stop - start)):.3f} {"ms" if (stop - start) < 1 else "s"}")
+    print(
+        f"Duration: {((stop - start) * 1000 if (stop - start) < 1 else (stop - start)):.3f} {"ms" if (stop - start) < 1 else "s"}"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+"""
+Find the first divergence between two commit traces, for example the rv32 simulation one
+(testbench/src/tests/tester.cpp, +trace=FILE) and the reference simulator one (iss.py --trace).
+
+The traces are made of fixed-width records, one per architectural write :
+
+    x 00a 0000002d 10000010     register x10 written with 0x2d, by the instruction at 0x10000010
+    c 305 10000100 --------     CSR 0x305 written with 0x10000100, at an unknown address
+
+The RTL doesn't know the address of the committed instructions, thus its records PC are set to
+"--------", and are ignored by the comparison (see --ignore-pc).
+
+Both of the files are read by chunks, and the chunks are compared as a whole (a single memcmp)
+while they match. Only the first differing chunk is scanned record per record, thus the memory
+usage is constant, regardless of the traces length.
+"""
+
+import argparse
+import sys
+
+# Record format : kind, target (register or CSR address), value, and PC. An instruction writing
+# both a CSR and a register (CSRRW, CSRRS... with rd != x0) is traced as its "c" record, then
+# its "x" one, by both of the writers (iss.py and tester.cpp)
+RECORD = b"%c %03x %08x %08x\n"
+RECORD_SIZE = 24
+
+# The compared part of a record (kind, target and value), and the PC one
+KEY_SIZE = 14
+PC_SLICE = slice(15, 23)
+
+DEFAULT_CHUNK = 1 << 20
+
+
+def chunks_equal(a, b, ignore_pc):
+    """Compare two chunks of whole records. With ignore_pc, only the keys are compared."""
+    if a == b:
+        return True
+    if not ignore_pc or len(a) != len(b):
+        return False
+
+    # Compare the key bytes of every record at once, by strided views (one per key column)
+    va, vb = memoryview(a), memoryview(b)
+    return all(va[k::RECORD_SIZE] == vb[k::RECORD_SIZE] for k in range(KEY_SIZE))
+
+
+def records_equal(a, b, ignore_pc):
+    return a[:KEY_SIZE] == b[:KEY_SIZE] if ignore_pc else a == b
+
+
+def open_trace(path, skip=0):
+    """Open a trace, after having skipped the first records."""
+    f = open(path, "rb")
+    f.seek(skip * RECORD_SIZE)
+    return f
+
+
+def sync_pc(path, pc, chunk_size=DEFAULT_CHUNK):
+    """Return the index of the first record of a trace with the passed PC, or None."""
+    # The PC is the only field followed by a new line, thus a value can't match
+    target = b" %08x\n" % pc
+    chunk_size -= chunk_size % RECORD_SIZE
+    index = 0
+
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            position = chunk.find(target)
+            if position >= 0:
+                return index + position // RECORD_SIZE
+            index += len(chunk) // RECORD_SIZE
+
+    return None
+
+
+def first_divergence(file_a, file_b, ignore_pc=False, chunk_size=DEFAULT_CHUNK):
+    """
+    Compare two opened traces from their current position. Return (index, record_a, record_b)
+    for the first divergence (a record is b"" if its trace ended), or None if they match.
+    """
+    chunk_size -= chunk_size % RECORD_SIZE
+    index = 0
+
+    while True:
+        a = file_a.read(chunk_size)
+        b = file_b.read(chunk_size)
+
+        if not a and not b:
+            return None
+
+        if len(a) == len(b) and chunks_equal(a, b, ignore_pc):
+            index += len(a) // RECORD_SIZE
+            continue
+
+        # Scan the records of the differing chunk
+        for offset in range(0, max(len(a), len(b)), RECORD_SIZE):
+            record_a = a[offset : offset + RECORD_SIZE]
+            record_b = b[offset : offset + RECORD_SIZE]
+            if not record_a or not record_b or not records_equal(record_a, record_b, ignore_pc):
+                return index + offset // RECORD_SIZE, record_a, record_b
+
+
+def read_records(path, start, count):
+    """Read count records of a trace, from the start record index."""
+    with open(path, "rb") as f:
+        f.seek(max(start, 0) * RECORD_SIZE)
+        data = f.read(count * RECORD_SIZE)
+
+    return [data[k : k + RECORD_SIZE] for k in range(0, len(data), RECORD_SIZE)]
+
+
+def describe(record):
+    """Human readable form of a record."""
+    if not record:
+        return "<end of trace>"
+
+    kind, target, value, pc = record.decode(errors="replace").split()
+    where = "" if pc.startswith("-") else f" @ 0x{pc}"
+    if kind == "x":
+        return f"x{int(target, 16):<2d}  <- 0x{value}{where}"
+    return f"csr 0x{target} <- 0x{value}{where}"
+
+
+def print_context(trace_a, trace_b, start_a, start_b, index, context):
+    """Print the records around the divergence, from both of the traces."""
+    first = max(index - context, 0)
+    count = index - first + context + 1
+
+    records_a = read_records(trace_a, start_a + first, count)
+    records_b = read_records(trace_b, start_b + first, count)
+
+    print(f"{'':9s} {'A : ' + trace_a:40s} {'B : ' + trace_b}")
+    for k in range(count):
+        record_a = records_a[k] if k < len(records_a) else b""
+        record_b = records_b[k] if k < len(records_b) else b""
+        if not record_a and not record_b:
+            break
+
+        marker = ">>" if first + k == index else "  "
+        print(f"{marker} {first + k:6d} {describe(record_a):40s} {describe(record_b)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the first divergence between two commit traces",
+    )
+    parser.add_argument("trace_a", help="First trace (for example, the rv32 simulation one)")
+    parser.add_argument("trace_b", help="Second trace (for example, the reference one)")
+    parser.add_argument(
+        "-c",
+        "--context",
+        type=int,
+        default=5,
+        help="Number of records printed around the divergence (default: 5)",
+    )
+    parser.add_argument(
+        "--ignore-pc",
+        action="store_true",
+        help="Only compare the written targets and values (implied if a trace has no PC)",
+    )
+    parser.add_argument("--skip-a", type=int, default=0, help="Records to skip in the first trace")
+    parser.add_argument("--skip-b", type=int, default=0, help="Records to skip in the second trace")
+    parser.add_argument(
+        "--sync",
+        metavar="PC",
+        type=lambda x: int(x, 0),
+        default=None,
+        help="Start the comparison of each trace at its first record with this PC",
+    )
+    parser.add_argument(
+        "--chunk",
+        type=int,
+        default=DEFAULT_CHUNK,
+        help=f"Chunk size in bytes (default: {DEFAULT_CHUNK})",
+    )
+    args = parser.parse_args()
+
+    start_a, start_b = args.skip_a, args.skip_b
+    if args.sync is not None:
+        start_a = sync_pc(args.trace_a, args.sync, args.chunk)
+        start_b = sync_pc(args.trace_b, args.sync, args.chunk)
+        if start_a is None or start_b is None:
+            print(f"PC 0x{args.sync:08X} not found in both traces")
+            return 2
+
+    # RTL traces have no PC : compare the keys only
+    ignore_pc = args.ignore_pc
+    for trace, start in ((args.trace_a, start_a), (args.trace_b, start_b)):
+        first = read_records(trace, start, 1)
+        if first and first[0][PC_SLICE].startswith(b"-"):
+            ignore_pc = True
+
+    with open_trace(args.trace_a, start_a) as file_a, open_trace(args.trace_b, start_b) as file_b:
+        divergence = first_divergence(file_a, file_b, ignore_pc, args.chunk)
+
+    if divergence is None:
+        print("Traces are identical")
+        return 0
+
+    index, record_a, record_b = divergence
+    where = f" (A #{start_a + index}, B #{start_b + index})" if start_a or start_b else ""
+    print(f"First divergence at record {index}{where} :")
+    print(f"    A : {describe(record_a)}")
+    print(f"    B : {describe(record_b)}")
+    print()
+    print_context(args.trace_a, args.trace_b, start_a, start_b, index, args.context)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
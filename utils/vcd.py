@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+
+"""
+Streaming reader for the VCD files dumped by the testbenches into simout/.
+
+The file is memory-mapped, and only the value changes of the requested signals are parsed :
+a single regular expression, built from their identifier codes, skips everything else at C
+speed. The timestamp of a change is found by searching backwards for the previous "#time"
+line, thus the memory usage doesn't depend on the file size.
+
+On top of it, some aggregated metrics are computed per signal : the toggles count, the duty
+cycle (the share of time the signal is high, or non-null for vectors) and the number of clock
+cycles it is high (sampled on the rising edges of the clock, as a flip-flop would). The clock
+period is measured once, on its first edges, instead of streaming all of its toggles.
+
+To look at a window deep into a run, a sidecar index (<file>.vcd.idx) is built once, in a
+single pass : it holds the byte offsets of periodic "#time" markers, and the whole signals
+state at each of them (zlib compressed). A query then only scans from the closest checkpoint.
+"""
+
+import argparse
+import array
+import bisect
+import fnmatch
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+
+# Signals of interest to get pipeline statistics (see --pipeline)
+PIPELINE = [
+    "*.issuer.*busy*",
+    "*.issuer.*valid*",
+    "*.occupancy.*",
+    "*stall*",
+]
+
+
+@dataclass
+class signal:
+    name: str
+    code: bytes
+    width: int
+
+
+@dataclass
+class metrics:
+    toggles: int = 0
+    time_high: int = 0
+    cycles_high: int = 0
+
+    # Current state : value, and the time / clock edge it was set high
+    value: int | None = None
+    high_since: int = 0
+    high_since_edge: int = 0
+
+
+# Scalar values, x and z are unknown (None)
+SCALARS = {b"0": 0, b"1": 1}
+
+# Any value change line : raw value (with the b prefix and trailing space for vectors), and code
+CHANGE = re.compile(rb"\n([01xzXZ]|[bB][01xzXZ]+ )(\S+)(?=\r?\n)")
+
+# Index file : magic, then the VCD size and modification time, and the checkpoints count
+INDEX_MAGIC = b"VCDIDX01"
+INDEX_HEADER = struct.Struct("<8sQQQ")
+
+# Default distance between two checkpoints, in bytes
+INDEX_INTERVAL = 8 << 20
+
+
+def parse_value(text):
+    """Convert a scalar or vector value into an integer, None if unknown (x / z)."""
+    try:
+        return int(text, 2)
+    except ValueError:
+        return None
+
+
+def decode_raw(raw):
+    """Convert a raw value, as matched by CHANGE, into an integer (None if unknown)."""
+    if raw is None:
+        return None
+    return SCALARS.get(raw) if len(raw) == 1 else parse_value(raw[1:-1])
+
+
+class VcdFile:
+    """A memory-mapped VCD file. Shall be used as a context manager."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = self.mm.find(b"$enddefinitions")
+        if end < 0:
+            raise ValueError(f"{path} : no $enddefinitions, not a VCD file ?")
+
+        self.body = self.mm.find(b"\n", end) + 1
+        self.signals = self.parse_header(self.mm[:end].decode(errors="replace"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    @staticmethod
+    def parse_header(header):
+        """Return the {hierarchical name: signal} of the declared variables."""
+        signals = {}
+        scope = []
+        tokens = iter(header.split())
+
+        for token in tokens:
+            if token == "$scope":
+                next(tokens)
+                scope.append(next(tokens))
+            elif token == "$upscope":
+                scope.pop()
+            elif token == "$var":
+                _, width, code, name, *rest = iter(lambda: next(tokens), "$end")
+                bits = rest[0] if rest and rest[0].startswith("[") else ""
+                full = ".".join(scope + [name + bits])
+                signals[full] = signal(full, code.encode(), int(width))
+
+        return signals
+
+    def select(self, patterns):
+        """Return the signals matching any of the glob patterns (on the hierarchical names)."""
+        return [
+            sig
+            for name, sig in self.signals.items()
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+        ]
+
+    def end_time(self):
+        """Last timestamp of the file."""
+        return self.time_at(len(self.mm))
+
+    def changes(self, signals, start=None, stop=None):
+        """
+        Stream the (time, code, value) changes of the passed signals, in the file order.
+        The value is an integer, or None if unknown. The scan may be restricted to a
+        [start, stop[ range of byte offsets of the file.
+        """
+        codes = {sig.code for sig in signals}
+        if not codes:
+            return
+
+        # The changes lines of the selected codes, with their leading new line
+        alternatives = b"|".join(re.escape(code) for code in sorted(codes, key=len, reverse=True))
+        pattern = re.compile(rb"\n(?:([01xzXZ])|[bB]([01xzXZ]+) )(" + alternatives + rb")(?=\r?\n)")
+
+        mm = self.mm
+        start = self.body if start is None else start
+        stop = len(mm) if stop is None else stop
+
+        time = self.time_at(start)
+        last = start - 1
+
+        for match in pattern.finditer(mm, start - 1, stop):
+            # Timestamp of the change : the last "#time" line since the previous change
+            position = mm.rfind(b"\n#", last, match.start())
+            if position >= 0:
+                time = int(mm[position + 2 : mm.find(b"\n", position + 1)])
+            last = match.end()
+
+            scalar, vector, code = match.groups()
+            yield time, code, SCALARS.get(scalar) if vector is None else parse_value(vector)
+
+    def time_at(self, offset):
+        """Timestamp at a byte offset of the file (the previous "#time" line)."""
+        position = self.mm.rfind(b"\n#", 0, offset)
+        if position < 0:
+            return 0
+        return int(self.mm[position + 2 : self.mm.find(b"\n", position + 1)])
+
+
+def clock_edges(vcd, clock):
+    """
+    Return the (first, period) of the clock rising edges. The testbenches clocks are regular
+    (a toggle per time unit), thus they're measured on the first edges only.
+    """
+    rises = []
+    previous = None
+    for time, _, value in vcd.changes([clock]):
+        if previous == 0 and value == 1:
+            rises.append(time)
+            if len(rises) == 3:
+                break
+        previous = value
+
+    if len(rises) < 2:
+        return None, None
+
+    first, period = rises[0], rises[1] - rises[0]
+    if len(rises) == 3 and rises[2] - rises[1] != period:
+        raise ValueError(f"{clock.name} is not a regular clock")
+
+    return first, period
+
+
+def compute_metrics(vcd, signals, clock=None, changes=None, end=None):
+    """
+    Aggregate the metrics of the passed signals. The clock is used to count the cycles each
+    signal is high, sampled on its rising edges : the value before the edge is used, thus a
+    signal raised by an edge is only counted from the next one.
+
+    Return the metrics per signal name, and the number of clock cycles.
+    """
+    by_code = {}
+    for sig in signals:
+        by_code.setdefault(sig.code, []).append(sig.name)
+
+    stats = {code: metrics() for code in by_code}
+
+    first, period = clock_edges(vcd, clock) if clock is not None else (None, None)
+    if first is None:
+        # Without any clock, no edge is ever counted
+        first, period = float("inf"), 1
+
+    if changes is None:
+        changes = vcd.changes(signals)
+
+    for time, code, value in changes:
+        stat = stats[code]
+        previous = stat.value
+        if value == previous:
+            continue
+
+        if previous is not None:
+            stat.toggles += 1
+
+        if previous and not value:
+            edges = (time - first) // period + 1 if time >= first else 0
+            stat.time_high += time - stat.high_since
+            stat.cycles_high += edges - stat.high_since_edge
+        elif value and not previous:
+            stat.high_since = time
+            stat.high_since_edge = (time - first) // period + 1 if time >= first else 0
+
+        stat.value = value
+
+    # Close the signals still high at the end of the file
+    end = vcd.end_time() if end is None else end
+    edges = (end - first) // period + 1 if end >= first else 0
+    for stat in stats.values():
+        if stat.value:
+            stat.time_high += end - stat.high_since
+            stat.cycles_high += edges - stat.high_since_edge
+
+    results = {}
+    for code, names in by_code.items():
+        stat = stats[code]
+        for name in names:
+            results[name] = {
+                "toggles": stat.toggles,
+                "duty": stat.time_high / end if end else 0.0,
+                "cycles_high": stat.cycles_high,
+            }
+
+    return results, edges
+
+
+class VcdIndex:
+    """
+    Checkpoints of a VCD file : the time, byte offset (of the "#time" line) and compressed
+    signals state of each of them. The state is stored as VCD change lines.
+    """
+
+    def __init__(self, times, offsets, blobs):
+        self.times = times
+        self.offsets = offsets
+        self.blobs = blobs
+
+    @staticmethod
+    def path(vcd_path):
+        return f"{vcd_path}.idx"
+
+    @classmethod
+    def build(cls, vcd, interval=INDEX_INTERVAL):
+        """Build the index in a single pass, keeping only the last value of each signal."""
+        mm = vcd.mm
+        times, offsets, blobs = array.array("Q"), array.array("Q"), []
+        state = {}
+        position = vcd.body
+
+        while True:
+            checkpoint = mm.find(b"\n#", position + interval)
+            stop = len(mm) if checkpoint < 0 else checkpoint + 1
+
+            state.update({code: value for value, code in CHANGE.findall(mm, position - 1, stop)})
+            if checkpoint < 0:
+                break
+
+            times.append(vcd.time_at(checkpoint + 2))
+            offsets.append(checkpoint + 1)
+            blobs.append(
+                zlib.compress(
+                    b"".join(b"\n" + value + code for code, value in state.items()) + b"\n"
+                )
+            )
+            position = checkpoint + 1
+
+        return cls(times, offsets, blobs)
+
+    def save(self, path, vcd_path):
+        stat = os.stat(vcd_path)
+        sizes = array.array("Q", (len(blob) for blob in self.blobs))
+
+        with open(path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(self.times)))
+            f.write(self.times.tobytes())
+            f.write(self.offsets.tobytes())
+            f.write(sizes.tobytes())
+            for blob in self.blobs:
+                f.write(blob)
+
+    @classmethod
+    def load(cls, path, vcd_path):
+        """Load an index, None if missing or outdated (the VCD has been rewritten since)."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < INDEX_HEADER.size:
+            return None
+
+        magic, size, mtime, count = INDEX_HEADER.unpack_from(data)
+        stat = os.stat(vcd_path)
+        if magic != INDEX_MAGIC or size != stat.st_size or mtime != stat.st_mtime_ns:
+            return None
+
+        arrays = []
+        position = INDEX_HEADER.size
+        for _ in range(3):
+            values = array.array("Q")
+            values.frombytes(data[position : position + 8 * count])
+            arrays.append(values)
+            position += 8 * count
+
+        times, offsets, sizes = arrays
+        blobs = []
+        for size in sizes:
+            blobs.append(data[position : position + size])
+            position += size
+
+        return cls(times, offsets, blobs)
+
+    @classmethod
+    def open(cls, vcd, interval=INDEX_INTERVAL):
+        """Load the sidecar index of a VCD file, or build (and save) it if needed."""
+        path = cls.path(vcd.path)
+        index = cls.load(path, vcd.path)
+        if index is None:
+            index = cls.build(vcd, interval)
+            index.save(path, vcd.path)
+        return index
+
+    def state(self, k):
+        """Return the {code: raw value} state at the checkpoint k."""
+        blob = zlib.decompress(self.blobs[k])
+        return {code: value for value, code in CHANGE.findall(blob)}
+
+    def checkpoint(self, time):
+        """Index of the last checkpoint at or before time, -1 if before the first one."""
+        return bisect.bisect_right(self.times, time) - 1
+
+
+def query(vcd, index, signals, start, stop):
+    """
+    Return the values of the signals at the start time, and the list of their (time, code,
+    value) changes up to the stop time (included). Only the data after the closest checkpoint
+    before start is scanned.
+    """
+    k = index.checkpoint(start)
+    if k < 0:
+        offset, state = vcd.body, {}
+    else:
+        offset, state = index.offsets[k], index.state(k)
+
+    values = {sig.code: decode_raw(state.get(sig.code)) for sig in signals}
+
+    # The scan ends on the first checkpoint after the window
+    end = bisect.bisect_right(index.times, stop)
+    limit = index.offsets[end] if end < len(index.offsets) else None
+
+    changes = []
+    for time, code, value in vcd.changes(signals, offset, limit):
+        if time > stop:
+            break
+        if time < start:
+            values[code] = value
+        else:
+            changes.append((time, code, value))
+
+    return values, changes
+
+
+def print_window(signals, values, changes):
+    names = {}
+    for sig in signals:
+        names.setdefault(sig.code, []).append(sig.name)
+
+    def show(value):
+        return "x" if value is None else f"0x{value:X}"
+
+    print(f"{'Time':>12s}  Signal")
+    for sig in signals:
+        print(f"{'initial':>12s}  {sig.name} = {show(values[sig.code])}")
+    for time, code, value in changes:
+        for name in names[code]:
+            print(f"{time:12d}  {name} = {show(value)}")
+
+
+def print_metrics(results, cycles):
+    print(f"{'Signal':60s} {'Toggles':>10s} {'Duty':>8s} {'Cycles high':>12s}")
+    for name, result in sorted(results.items()):
+        print(
+            f"{name:60s} {result['toggles']:10d} {result['duty']:8.2%} {result['cycles_high']:12d}"
+        )
+    print(f"\n{cycles} clock cycles")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute toggles, duty cycles and cycles high of signals of a VCD file",
+    )
+    parser.add_argument("file", help="VCD file (for example simout/rv32.vcd)")
+    parser.add_argument(
+        "-s",
+        "--signal",
+        metavar="PATTERN",
+        action="append",
+        default=[],
+        help="Glob pattern of the hierarchical signals names (ex: '*.issuer.*busy'), repeatable",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help=f"Add the pipeline signals ({', '.join(PIPELINE)})",
+    )
+    parser.add_argument(
+        "-c",
+        "--clock",
+        default="*.clk",
+        help="Glob pattern of the clock, the first match is used (default: *.clk)",
+    )
+    parser.add_argument("-l", "--list", action="store_true", help="List the matching signals")
+    parser.add_argument(
+        "--time",
+        nargs=2,
+        type=int,
+        metavar=("START", "STOP"),
+        default=None,
+        help="Show the signals changes within this time window (uses the sidecar index)",
+    )
+    parser.add_argument(
+        "--cycles",
+        nargs=2,
+        type=int,
+        metavar=("START", "STOP"),
+        default=None,
+        help="Show the signals changes within this clock cycles window (uses the sidecar index)",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="(Re)build the sidecar index of the file",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=INDEX_INTERVAL,
+        help=f"Distance between two index checkpoints, in bytes (default: {INDEX_INTERVAL})",
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write the metrics as JSON to FILE")
+    args = parser.parse_args()
+
+    patterns = args.signal + (PIPELINE if args.pipeline else [])
+
+    with VcdFile(args.file) as vcd:
+        if args.index:
+            index = VcdIndex.build(vcd, args.interval)
+            index.save(VcdIndex.path(args.file), args.file)
+            print(f"Index written to {VcdIndex.path(args.file)} ({len(index.times)} checkpoints)")
+
+        if args.list:
+            for sig in vcd.select(patterns or ["*"]):
+                print(f"{sig.name:60s} {sig.width:4d}")
+            return 0
+
+        signals = vcd.select(patterns)
+        if not signals:
+            if args.index:
+                return 0
+            print("No signal matching the patterns", file=sys.stderr)
+            return 1
+
+        clocks = vcd.select([args.clock])
+        clock = min(clocks, key=lambda sig: sig.name.count(".")) if clocks else None
+
+        window = args.time
+        if args.cycles is not None:
+            first, period = clock_edges(vcd, clock) if clock is not None else (None, None)
+            if first is None:
+                print("No clock found, cycles can't be converted to times", file=sys.stderr)
+                return 1
+            window = [first + cycle * period for cycle in args.cycles]
+
+        if window is not None:
+            index = VcdIndex.open(vcd, args.interval)
+            values, changes = query(vcd, index, signals, *window)
+            print_window(signals, values, changes)
+            return 0
+
+        results, cycles = compute_metrics(vcd, signals, clock)
+
+    print_metrics(results, cycles)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"cycles": cycles, "signals": results}, f, indent=4)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+"""
+File-driven test vectors of the arithmetic units : the booth multiplier, the SRT divider and the
+shifter (testbench/src/core/alu/modules/tb_*.cpp).
+
+    ./utils/vectors.py generate booth srt shift -n 1000000
+    make TOP=booth TB_ARGS="+vectors=build/vectors/booth.vec +mismatches=logs/booth.mis +quiet"
+    ./utils/vectors.py summary logs/booth.mis
+
+Each file holds the corner cases of each mode of its unit (every pair of CORNERS, or every shift
+amount of them), then constrained-random operands (see operands). Their expected results are
+computed by NumPy, in 64 bits, and written as fixed-size records (see testbench/include/vectors.h),
+streamed by the testbenchs (+vectors=FILE). The failed vectors are written by them into a
+mismatches file (+mismatches=FILE), with the same header, summarized here.
+
+    booth   MUL, MULH, MULHSU and MULHU (the low and high words of the product), per signedness
+    srt     DIVU, REMU, DIV and REM, and the division by zero flag (quotient of all ones, and a
+            null remainder, as the unit returns them)
+    shift   SRL, SRA and SLL, for every shift amount
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+VECTORS_DIR = Path("build") / "vectors"
+
+# testbench/include/vectors.h layouts
+MAGIC = b"RVTV"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype([("magic", "S4"), ("version", "<u2"), ("unit", "<u2"), ("count", "<u8")])
+VECTOR_DTYPE = np.dtype(
+    [("a", "<u4"), ("b", "<u4"), ("mode", "<u2"), ("reserved", "<u2"), ("expected", "<u4", 3)]
+)
+MISMATCH_DTYPE = np.dtype(
+    [
+        ("index", "<u8"),
+        ("a", "<u4"),
+        ("b", "<u4"),
+        ("mode", "<u2"),
+        ("fields", "<u2"),
+        ("expected", "<u4", 3),
+        ("got", "<u4", 3),
+        ("cycles", "<u4"),
+    ]
+)
+assert HEADER_DTYPE.itemsize == 16
+assert VECTOR_DTYPE.itemsize == 24
+assert MISMATCH_DTYPE.itemsize == 48
+
+# MismatchRecord::fields bit of the latency, after the results ones
+LATENCY = 1 << 3
+
+UNITS = {"booth": 0, "srt": 1, "shift": 2}
+
+# Modes of each unit, and the names of their results (the instructions they implement)
+MODES = {
+    "booth": {
+        0: ("U x U", ("MUL", "MULHU")),
+        1: ("S x U", ("MUL", "MULHSU")),
+        2: ("U x S", ("MUL", "MULH (U x S)")),
+        3: ("S x S", ("MUL", "MULH")),
+    },
+    "srt": {
+        0: ("U / U", ("DIVU", "REMU", "div_by_zero")),
+        3: ("S / S", ("DIV", "REM", "div_by_zero")),
+    },
+    "shift": {
+        0: ("right", ("SRL",)),
+        1: ("arithmetic", ("SRA",)),
+        2: ("left", ("SLL",)),
+    },
+}
+
+WORD_MASK = 0xFFFF_FFFF
+
+# Operands of the corner cases : the extremes of both signedness, the powers of two and their
+# neighbours, and alternating patterns
+CORNERS = np.unique(
+    np.array(
+        [0, 1, 2, 3, 0x7FFF_FFFE, 0x7FFF_FFFF, 0x8000_0000, 0x8000_0001, 0xFFFF_FFFE, WORD_MASK]
+        + [0x5555_5555, 0xAAAA_AAAA, 0x0000_FFFF, 0xFFFF_0000, 0x00FF_00FF, 0xFF00_FF00]
+        + [1 << k for k in range(32)]
+        + [(1 << k) - 1 for k in range(2, 32)]
+        + [WORD_MASK ^ (1 << k) for k in range(32)],
+        dtype=np.uint64,
+    )
+).astype(np.uint32)
+
+# Vectors generated (and written) at once
+CHUNK = 1 << 20
+
+
+def signed(words):
+    """Sign-extend 32 bits words to int64."""
+    return words.astype(np.uint32).view(np.int32).astype(np.int64)
+
+
+def operands(rng, count):
+    """
+    Constrained-random operands, evenly drawn from : uniform words, small magnitudes (of a random
+    width, and random sign), the neighbours of the powers of two, and sparse or dense bit patterns.
+    """
+    uniform = rng.integers(0, 1 << 32, count, dtype=np.uint64)
+
+    widths = rng.integers(0, 33, count, dtype=np.uint64)
+    small = rng.integers(0, 1 << 32, count, dtype=np.uint64) & ((np.uint64(1) << widths) - 1)
+    small = np.where(rng.integers(0, 2, count).astype(bool), (1 << 32) - small, small)
+
+    powers = np.uint64(1) << rng.integers(0, 32, count, dtype=np.uint64)
+    powers = powers + rng.integers(-2, 3, count).astype(np.uint64)
+
+    draws = rng.integers(0, 1 << 32, (3, count), dtype=np.uint64)
+    patterns = np.where(
+        rng.integers(0, 2, count).astype(bool),
+        draws[0] & draws[1] & draws[2],
+        draws[0] | draws[1] | draws[2],
+    )
+
+    kind = rng.integers(0, 4, count)
+    words = np.choose(kind, [uniform, small, powers, patterns])
+    return (words & WORD_MASK).astype(np.uint32)
+
+
+def expected(unit, a, b, mode):
+    """Expected results of the vectors of a unit, as a (count, 3) array of words."""
+    results = np.zeros((len(a), 3), dtype=np.uint64)
+    a64, b64 = a.astype(np.uint64), b.astype(np.uint64)
+
+    if unit == "booth":
+        # Both operands extended to 64 bits, the wrapped product then holds the exact one
+        x = np.where(mode & 1, signed(a), a64.astype(np.int64)).view(np.uint64)
+        y = np.where(mode & 2, signed(b), b64.astype(np.int64)).view(np.uint64)
+        product = x * y
+        results[:, 0] = product & WORD_MASK
+        results[:, 1] = product >> np.uint64(32)
+
+    elif unit == "srt":
+        zero = b64 == 0
+        divisor = np.where(zero, np.uint64(1), b64)
+
+        # Signed divisions truncate toward zero, and the overflow (-2^31 / -1) wraps to -2^31
+        x, y = signed(a), signed(divisor)
+        magnitude = np.abs(x) // np.abs(y)
+        quotient = np.where((x < 0) ^ (y < 0), -magnitude, magnitude)
+        remainder = x - quotient * y
+
+        is_signed = (mode & 1).astype(bool)
+        quotient = np.where(is_signed, quotient.view(np.uint64), a64 // divisor)
+        remainder = np.where(is_signed, remainder.view(np.uint64), a64 % divisor)
+
+        results[:, 0] = np.where(zero, WORD_MASK, quotient & WORD_MASK)
+        results[:, 1] = np.where(zero, 0, remainder & WORD_MASK)
+        results[:, 2] = zero
+
+    elif unit == "shift":
+        amount = b64 & np.uint64(31)
+        left = (a64 << amount) & WORD_MASK
+        right = a64 >> amount
+        arithmetic = (signed(a) >> amount.astype(np.int64)).view(np.uint64) & WORD_MASK
+        results[:, 0] = np.where(mode & 2, left, np.where(mode & 1, arithmetic, right))
+
+    else:
+        raise ValueError(f"unknown unit {unit}")
+
+    return results.astype(np.uint32)
+
+
+def corners(unit):
+    """The corner cases of every mode of a unit, as (a, b, mode)."""
+    modes = np.array(list(MODES[unit]), dtype=np.uint16)
+    second = np.arange(32, dtype=np.uint32) if unit == "shift" else CORNERS
+
+    mode, a, b = (grid.ravel() for grid in np.meshgrid(modes, CORNERS, second, indexing="ij"))
+    return a, b, mode
+
+
+def records(unit, a, b, mode):
+    vectors = np.zeros(len(a), dtype=VECTOR_DTYPE)
+    vectors["a"], vectors["b"], vectors["mode"] = a, b, mode
+    vectors["expected"] = expected(unit, a, b, mode)
+    return vectors
+
+
+def generate(unit, path, count, seed=0):
+    """
+    Write the vectors file of a unit : its corner cases, then count random vectors (generated by
+    chunks, thus in a bounded memory). Return the number of vectors written.
+    """
+    rng = np.random.default_rng([seed, UNITS[unit]])
+    fixed = records(unit, *corners(unit))
+    modes = np.array(list(MODES[unit]), dtype=np.uint16)
+
+    header = np.array([(MAGIC, VERSION, UNITS[unit], len(fixed) + count)], dtype=HEADER_DTYPE)
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        header.tofile(f)
+        fixed.tofile(f)
+
+        for start in range(0, count, CHUNK):
+            size = min(CHUNK, count - start)
+            a = operands(rng, size)
+            b = (
+                rng.integers(0, 32, size, dtype=np.uint32)
+                if unit == "shift"
+                else operands(rng, size)
+            )
+            records(unit, a, b, rng.choice(modes, size)).tofile(f)
+
+    return len(fixed) + count
+
+
+def load(path, dtype):
+    """
+    Read a vectors or mismatches file, as its unit name and records. A truncated last record (a
+    testbench which crashed while writing) is dropped.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    if len(data) < HEADER_DTYPE.itemsize:
+        raise ValueError(f"{path} : truncated header")
+
+    header = data[: HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header["magic"] != MAGIC or header["version"] != VERSION:
+        raise ValueError(f"{path} : not a vectors file (or of another version)")
+
+    units = {number: name for name, number in UNITS.items()}
+    body = data[HEADER_DTYPE.itemsize :]
+    usable = len(body) - len(body) % dtype.itemsize
+    return units[int(header["unit"])], body[:usable].view(dtype)
+
+
+def summary(unit, mismatches):
+    """Count the mismatches per mode and result (and the latency ones), as {(mode, name): count}."""
+    counts = {}
+    for mode, (mode_name, names) in MODES[unit].items():
+        selected = mismatches["fields"][mismatches["mode"] == mode]
+        for k, name in enumerate(names):
+            counts[(mode_name, name)] = int(np.count_nonzero(selected & (1 << k)))
+        counts[(mode_name, "latency")] = int(np.count_nonzero(selected & LATENCY))
+
+    return {key: count for key, count in counts.items() if count}
+
+
+def describe(unit, mismatch):
+    """Describe a failed vector : its operands, and each result which differs."""
+    mode_name, names = MODES[unit].get(int(mismatch["mode"]), (f"mode {mismatch['mode']}", ()))
+    line = f"#{mismatch['index']} {mode_name} a=0x{mismatch['a']:08X} b=0x{mismatch['b']:08X}"
+
+    for k, name in enumerate(names):
+        if mismatch["fields"] & (1 << k):
+            line += f" | {name} expected 0x{mismatch['expected'][k]:08X}"
+            line += f" got 0x{mismatch['got'][k]:08X}"
+    if mismatch["fields"] & LATENCY:
+        line += f" | {mismatch['cycles']} cycles"
+
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the test vectors of the arithmetic units, and summarize their "
+        "mismatches",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = sub.add_parser("generate", help="Write the vectors files of units")
+    generate_parser.add_argument("units", nargs="+", choices=list(UNITS), help="Units")
+    generate_parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=1_000_000,
+        help="Random vectors per unit, after the corner cases (default: 1000000)",
+    )
+    generate_parser.add_argument("-s", "--seed", type=int, default=0, help="Seed (default: 0)")
+    generate_parser.add_argument(
+        "-d",
+        "--dir",
+        default=VECTORS_DIR,
+        help=f"Output folder, holding a <unit>.vec per unit (default: {VECTORS_DIR})",
+    )
+    generate_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of units generated at once (default: cpu count)",
+    )
+
+    summary_parser = sub.add_parser("summary", help="Summarize mismatches files (+mismatches)")
+    summary_parser.add_argument("files", nargs="+", help="Mismatches files")
+    summary_parser.add_argument(
+        "--failures",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Print the N first failed vectors of each file (default: 10)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        paths = [Path(args.dir) / f"{unit}.vec" for unit in args.units]
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(paths)))) as executor:
+            counts = executor.map(
+                generate, args.units, paths, [args.count] * len(paths), [args.seed] * len(paths)
+            )
+            for path, count in zip(paths, counts):
+                print(f"📄 {count} vectors written to: {path}")
+        return 0
+
+    failed = False
+    for path in args.files:
+        try:
+            unit, mismatches = load(path, MISMATCH_DTYPE)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            failed = True
+            continue
+
+        failed |= len(mismatches) != 0
+        print(f"{path} : {unit}, {len(mismatches)} failed vectors")
+        for (mode_name, name), count in summary(unit, mismatches).items():
+            print(f"    {mode_name:10s} {name:14s} {count:10d}")
+        for mismatch in mismatches[: args.failures]:
+            print(f"    {describe(unit, mismatch)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())